@@ -0,0 +1,104 @@
+"""Распределение расходов по покупкам абонементов (FIFO по сроку действия).
+
+Каждый расход (`subscription_expenses.purchase_id`) списывается с покупки, которая действует в день
+расхода (дата покупки ≤ день расхода ≤ дата завершения, сравниваются даты без времени) и у которой
+остались занятия; из таких — с самой ранней датой завершения (затем по дате покупки и id).
+Расход без подходящей покупки остаётся без неё (purchase_id = NULL) — это долг клиента.
+
+Расходы обходятся по (expense_date, id). Выбор для расхода зависит только от покупок, начавшихся
+не позже его дня, и от более ранних расходов, поэтому изменение в день D затрагивает только расходы
+с этого дня: `reallocate(db, client_id, since=D)` берёт остатки покупок по уже распределённым более
+ранним расходам (одна группировка) и заново распределяет только суффикс истории, обновляя лишь
+расходы, у которых покупка сменилась.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, func, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from . import models
+
+
+def day(iso: str) -> str:
+    """День (YYYY-MM-DD) из ISO-8601 даты или даты-времени."""
+    return iso[:10]
+
+
+def today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def reallocate(db: Session, client_id: int, since: str | None = None) -> int:
+    """Распределить расходы клиента с дня since (None — всю историю); возвращает число изменённых расходов.
+
+    Вызывать после изменения покупки или расхода в сессии (сессия сбрасывается). Не коммитит.
+    """
+    db.flush()
+    p = models.SubscriptionPurchase
+    e = models.SubscriptionExpense
+    purchases = db.execute(
+        select(p.id, p.lessons_count, p.purchase_date, p.expiry_date)
+        .where(p.client_id == client_id)
+        .order_by(p.expiry_date, p.purchase_date, p.id)
+    ).all()
+    remaining = {pid: lessons for pid, lessons, _, _ in purchases}
+    expenses = select(e.id, e.expense_date, e.purchase_id).where(e.client_id == client_id)
+    if since is not None:
+        # Занятия, списанные расходами до since, не пересчитываются
+        used = db.execute(
+            select(e.purchase_id, func.count())
+            .where(e.client_id == client_id, e.expense_date < since, e.purchase_id.is_not(None))
+            .group_by(e.purchase_id)
+        )
+        for pid, count in used:
+            if pid in remaining:
+                remaining[pid] -= count
+        expenses = expenses.where(e.expense_date >= since)
+    windows = [(pid, day(purchase_date), day(expiry_date)) for pid, _, purchase_date, expiry_date in purchases]
+
+    changes = []
+    for eid, expense_date, current in db.execute(expenses.order_by(e.expense_date, e.id)):
+        d = day(expense_date)
+        # Покупок у клиента единицы — линейный просмотр в порядке срока действия
+        chosen = next((pid for pid, start, end in windows if remaining[pid] > 0 and start <= d <= end), None)
+        if chosen is not None:
+            remaining[chosen] -= 1
+        if chosen != current:
+            changes.append({"eid": eid, "pid": chosen})
+    if changes:
+        t = e.__table__
+        db.execute(update(t).where(t.c.id == bindparam("eid")).values(purchase_id=bindparam("pid")), changes)
+    return len(changes)
+
+
+def used_counts(db: Session, purchase_ids: list[int]) -> dict[int, int]:
+    """Число расходов, списанных с каждой из покупок."""
+    if not purchase_ids:
+        return {}
+    e = models.SubscriptionExpense
+    return dict(db.execute(
+        select(e.purchase_id, func.count()).where(e.purchase_id.in_(purchase_ids)).group_by(e.purchase_id)
+    ).all())
+
+
+def migrate(engine: Engine) -> None:
+    """Мягкая миграция: колонка purchase_id с индексами; при её добавлении — распределение всей истории."""
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE subscription_expenses ADD COLUMN purchase_id INTEGER NULL REFERENCES subscription_purchases(id) ON DELETE SET NULL"))
+        added = True
+    except Exception:
+        added = False
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_expenses_purchase ON subscription_expenses(purchase_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_expenses_client_date ON subscription_expenses(client_id, expense_date)"))
+    if not added:
+        return
+    with Session(engine) as db:
+        e = models.SubscriptionExpense
+        for client_id in db.scalars(select(e.client_id).distinct()).all():
+            reallocate(db, client_id)
+        db.commit()
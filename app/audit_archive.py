@@ -0,0 +1,164 @@
+"""Архив журнала аудита: старые записи вне основной БД.
+
+Записи старше срока хранения переносятся (scripts/archive_audit.py) в файлы
+`var/audit_archive/audit-YYYY-MM.ndjson.gz` — по месяцу `ts`, одна JSON-строка на запись.
+Перенос идёт пачками: пачка дописывается в файл отдельным gzip-членом с fsync и только затем
+удаляется из БД короткой транзакцией, так что блокировка записи не держится дольше одной пачки.
+При сбое между записью файла и удалением пачка есть и в БД, и в архиве (а следующий перенос допишет её
+в архив повторно) — чтение архива и слияние с БД (`merge`) отбрасывают дубли по id.
+
+GET /api/audit читает архив сам, когда запрошенный период заходит в заархивированные месяцы.
+"""
+
+from __future__ import annotations
+
+import gzip
+import heapq
+import json
+import os
+import re
+import time
+from itertools import islice
+from typing import Any, Iterator
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from . import models
+from .db import DB_DIR
+
+
+ARCHIVE_DIR = os.path.join(DB_DIR, "audit_archive")
+
+_FIELDS = ("id", "ts", "username", "action", "entity", "entity_id", "details")
+_FILE = re.compile(r"^audit-(\d{4}-\d{2})\.ndjson\.gz$")
+
+
+def _path(archive_dir: str, month: str) -> str:
+    return os.path.join(archive_dir, f"audit-{month}.ndjson.gz")
+
+
+def archived_months(archive_dir: str = ARCHIVE_DIR) -> list[str]:
+    """Месяцы (YYYY-MM), за которые есть архивные файлы, по возрастанию."""
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted(m.group(1) for m in map(_FILE.match, os.listdir(archive_dir)) if m)
+
+
+def _append(archive_dir: str, month: str, rows: list[dict[str, Any]]) -> None:
+    data = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+    # Каждая пачка — отдельный gzip-член: файл дописывается без перепаковки, gzip читает члены подряд
+    with open(_path(archive_dir, month), "ab") as f:
+        f.write(gzip.compress(data))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def archive_before(
+    db: Session,
+    cutoff_ts: str,
+    archive_dir: str = ARCHIVE_DIR,
+    batch_size: int = 5000,
+    pause: float = 0.0,
+) -> dict[str, int]:
+    """Перенести записи с ts < cutoff_ts в архив; возвращает число записей по месяцам."""
+    os.makedirs(archive_dir, exist_ok=True)
+    a = models.AuditLog
+    moved: dict[str, int] = {}
+    while True:
+        rows = db.execute(
+            select(*(getattr(a, f) for f in _FIELDS)).where(a.ts < cutoff_ts).order_by(a.ts, a.id).limit(batch_size)
+        ).all()
+        db.rollback()  # не держим транзакцию чтения, пока пишем файлы
+        if not rows:
+            return moved
+        by_month: dict[str, list[dict[str, Any]]] = {}
+        for row in rows:
+            by_month.setdefault(row.ts[:7], []).append(dict(zip(_FIELDS, row)))
+        for month, items in by_month.items():
+            _append(archive_dir, month, items)
+            moved[month] = moved.get(month, 0) + len(items)
+        db.execute(delete(a).where(a.id.in_([row.id for row in rows])))
+        db.commit()
+        if len(rows) < batch_size:
+            return moved
+        if pause:
+            # Пауза между пачками — окно для записей работающего сервиса
+            time.sleep(pause)
+
+
+def _read_month(archive_dir: str, month: str) -> Iterator[dict[str, Any]]:
+    try:
+        with gzip.open(_path(archive_dir, month), "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except FileNotFoundError:
+        return
+    except EOFError:
+        # Недописанный последний член (перенос идёт прямо сейчас) — эти записи ещё в БД
+        return
+
+
+def covers(ts_from: str | None, archive_dir: str = ARCHIVE_DIR) -> bool:
+    """Заходит ли период, начинающийся с ts_from (None — без нижней границы), в архив."""
+    months = archived_months(archive_dir)
+    return bool(months) and (ts_from is None or ts_from[:7] <= months[-1])
+
+
+def read(
+    ts_from: str | None = None,
+    ts_to: str | None = None,
+    filters: dict[str, Any] | None = None,
+    before: tuple[str, int] | None = None,
+    limit: int | None = None,
+    archive_dir: str = ARCHIVE_DIR,
+) -> list[dict[str, Any]]:
+    """Архивные записи периода [ts_from, ts_to), равные filters по полям, строго до before=(ts, id).
+
+    Порядок — новые сверху, как в ленте; limit — не больше стольких первых записей.
+    Месяцы читаются от новых к старым и чтение останавливается, как только набран limit.
+    """
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    upper = min((b for b in (ts_to, before[0] if before else None) if b is not None), default=None)
+    months = [
+        m for m in reversed(archived_months(archive_dir))
+        if (ts_from is None or m >= ts_from[:7]) and (upper is None or m <= upper[:7])
+    ]
+    found: list[dict[str, Any]] = []
+    for month in months:
+        seen: set[int] = set()
+        matched: list[dict[str, Any]] = []
+        for row in _read_month(archive_dir, month):
+            if row["id"] in seen:
+                continue
+            ts = row["ts"]
+            if (ts_from is not None and ts < ts_from) or (ts_to is not None and ts >= ts_to):
+                continue
+            if before is not None and (ts, row["id"]) >= tuple(before):
+                continue
+            if any(row.get(k) != v for k, v in filters.items()):
+                continue
+            seen.add(row["id"])
+            matched.append(row)
+        found.extend(sorted(matched, key=lambda r: (r["ts"], r["id"]), reverse=True))
+        # Месяцы не пересекаются по времени: более старые файлы дадут только более старые записи
+        if limit is not None and len(found) >= limit:
+            return found[:limit]
+    return found
+
+
+def merge(live: list, archived: list, key, limit: int | None) -> list:
+    """Слить две ленты, упорядоченные по key (ts, id) по убыванию, с обрезкой до limit.
+
+    Запись, которая после сбоя переноса есть и в БД, и в архиве, попадает в ленту один раз:
+    её копии идут в слиянии подряд с одинаковым key.
+    """
+    def unique() -> Iterator:
+        last = None
+        for item in heapq.merge(live, archived, key=key, reverse=True):
+            k = key(item)
+            if k != last:
+                last = k
+                yield item
+
+    return list(islice(unique(), limit))
@@ -0,0 +1,290 @@
+"""Запись журнала аудита.
+
+Роутеры вызывают `add_audit_log(db, ...)` (utils.py) до `db.commit()` изменения. Режим задаётся
+переменной окружения AUDIT_MODE:
+
+- `inline` (по умолчанию) — запись добавляется в ту же транзакцию: один commit на изменение,
+  аудит не теряется и не появляется без самого изменения;
+- `background` — после успешного коммита изменения записи ставятся в очередь, фоновый поток пишет их
+  пачками (не реже раза в AUDIT_FLUSH_INTERVAL_MS). Неудачная пачка повторяется с нарастающей паузой;
+  после AUDIT_RETRY_LIMIT попыток (и при переполнении очереди) записи дописываются в
+  var/audit_spool.ndjson с fsync и переносятся в БД при следующем запуске сервиса (в любом режиме).
+
+Спул общий для всех процессов сервиса: дозапись и перенос идут под блокировкой
+var/audit_spool.ndjson.lock (flock), поэтому перенос одного процесса не теряет строки, дописанные другим.
+
+Метрики (глубина очереди, время записи) — GET /api/health/audit.
+"""
+
+from __future__ import annotations
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+from . import models
+from .db import DB_DIR, SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+INLINE = "inline"
+BACKGROUND = "background"
+
+_PENDING = "audit_pending"
+_STARTED = "audit_started"
+_FIELDS = ("ts", "username", "action", "entity", "entity_id", "details")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class AuditWriter:
+    def __init__(
+        self,
+        mode: str = INLINE,
+        flush_interval_ms: int = 200,
+        batch_size: int = 500,
+        max_queue: int = 10_000,
+        retry_limit: int = 5,
+        spool_path: str = os.path.join(DB_DIR, "audit_spool.ndjson"),
+    ):
+        self.mode = mode if mode in (INLINE, BACKGROUND) else INLINE
+        self._interval = flush_interval_ms / 1000
+        self._batch_size = batch_size
+        self._max_queue = max_queue
+        self._retry_limit = retry_limit
+        self._spool_path = spool_path
+        self._cond = threading.Condition()
+        self._queue: deque[dict[str, Any]] = deque()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._in_flight = 0
+        self._stats = {
+            "written": 0,
+            "batches": 0,
+            "failedAttempts": 0,
+            "spooled": 0,
+            "lastFlushMs": None,
+            "maxFlushMs": 0.0,
+            "totalFlushMs": 0.0,
+        }
+
+    # --- запись из роутеров -------------------------------------------------
+
+    def add(self, db: Session, entry: models.AuditLog) -> None:
+        """Записать entry вместе с текущей транзакцией db."""
+        if self.mode == INLINE:
+            db.add(entry)
+        db.info.setdefault(_PENDING, []).append(entry)
+
+    def _before_commit(self, db: Session) -> None:
+        if db.info.get(_PENDING):
+            db.info[_STARTED] = time.perf_counter()
+
+    def _after_commit(self, db: Session) -> None:
+        entries = db.info.pop(_PENDING, None)
+        started = db.info.pop(_STARTED, None)
+        if not entries:
+            return
+        if self.mode == INLINE:
+            # Записи ушли тем же коммитом — учитываем его как «запись аудита»
+            self._record(len(entries), (time.perf_counter() - started) * 1000 if started else 0.0)
+            return
+        self.enqueue([{f: getattr(e, f) for f in _FIELDS} for e in entries])
+
+    def _after_rollback(self, db: Session) -> None:
+        db.info.pop(_PENDING, None)
+        db.info.pop(_STARTED, None)
+
+    # --- фоновый режим ------------------------------------------------------
+
+    def enqueue(self, rows: list[dict[str, Any]]) -> None:
+        overflow: list[dict[str, Any]] = []
+        with self._cond:
+            self._ensure_started()
+            free = max(self._max_queue - len(self._queue), 0)
+            self._queue.extend(rows[:free])
+            overflow = rows[free:]
+            if len(self._queue) >= self._batch_size:
+                self._cond.notify()
+        if overflow:
+            # Очередь переполнена (БД долго недоступна) — не теряем записи, а откладываем на диск
+            self._spool(overflow)
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def start(self) -> None:
+        if self.mode != BACKGROUND:
+            # Спул мог остаться от запуска в фоновом режиме — переносим сразу
+            self._replay_spool()
+            return
+        with self._cond:
+            self._ensure_started()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Дописать очередь и остановить поток (при завершении процесса)."""
+        thread = self._thread
+        if thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        self._replay_spool()
+        while True:
+            with self._cond:
+                # Копим пачку не дольше интервала: задержка записи ограничена AUDIT_FLUSH_INTERVAL_MS
+                deadline = time.monotonic() + self._interval
+                while len(self._queue) < self._batch_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    if self._stopping:
+                        return
+                    continue
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self._batch_size))]
+                self._in_flight = len(batch)
+            self._flush(batch)
+            with self._cond:
+                self._in_flight = 0
+
+    def _write(self, rows: list[dict[str, Any]]) -> None:
+        with SessionLocal() as db:
+            db.execute(insert(models.AuditLog), rows)
+            db.commit()
+
+    def _flush(self, batch: list[dict[str, Any]], spool: bool = True) -> bool:
+        """Записать пачку с повторами; False — не удалось (при spool=True пачка отложена на диск)."""
+        delay = 0.1
+        for attempt in range(1, self._retry_limit + 1):
+            started = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception:
+                logger.warning("audit batch of %d rows failed (attempt %d)", len(batch), attempt, exc_info=True)
+                with self._cond:
+                    self._stats["failedAttempts"] += 1
+                if attempt < self._retry_limit and not self._stopping:
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5.0)
+                continue
+            self._record(len(batch), (time.perf_counter() - started) * 1000)
+            return True
+        if spool:
+            self._spool(batch)
+        return False
+
+    def _record(self, rows: int, elapsed_ms: float) -> None:
+        with self._cond:
+            s = self._stats
+            s["written"] += rows
+            s["batches"] += 1
+            s["lastFlushMs"] = round(elapsed_ms, 3)
+            s["maxFlushMs"] = max(s["maxFlushMs"], round(elapsed_ms, 3))
+            s["totalFlushMs"] += elapsed_ms
+
+    @contextmanager
+    def _spool_lock(self):
+        """Блокировка файлов спула между процессами и потоками (flock на отдельном открытии файла)."""
+        with open(self._spool_path + ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_rows(path: str, rows: list[dict[str, Any]], mode: str = "a") -> None:
+        with open(path, mode, encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _spool(self, rows: list[dict[str, Any]]) -> None:
+        # Сначала flock, затем _cond: перенос держит flock и берёт _cond для метрик
+        with self._spool_lock():
+            self._write_rows(self._spool_path, rows)
+        with self._cond:
+            self._stats["spooled"] += len(rows)
+        logger.error("audit: %d rows spooled to %s", len(rows), self._spool_path)
+
+    def _replay_spool(self) -> None:
+        """Перенести в БД записи, отложенные на диск прошлыми запусками (и другими процессами)."""
+        replaying = self._spool_path + ".replay"
+        with self._spool_lock():
+            try:
+                if os.path.exists(replaying):
+                    # Прошлый перенос прервался — дописываем к нему
+                    with open(self._spool_path, encoding="utf-8") as src, open(replaying, "a", encoding="utf-8") as dst:
+                        dst.write(src.read())
+                    os.remove(self._spool_path)
+                else:
+                    os.replace(self._spool_path, replaying)
+            except FileNotFoundError:
+                pass  # нового спула нет
+            try:
+                with open(replaying, encoding="utf-8") as f:
+                    rows = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                return
+            failed: list[dict[str, Any]] = []
+            for start in range(0, len(rows), self._batch_size):
+                batch = rows[start:start + self._batch_size]
+                if not self._flush(batch, spool=False):
+                    failed.extend(batch)
+            if not failed:
+                os.remove(replaying)
+                return
+            # Неперенесённое остаётся в .replay до следующего запуска (замена файла целиком — без дублей)
+            self._write_rows(replaying + ".tmp", failed, mode="w")
+            os.replace(replaying + ".tmp", replaying)
+        logger.error("audit: %d spooled rows not replayed, kept in %s", len(failed), replaying)
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            s = dict(self._stats)
+            total_ms = s.pop("totalFlushMs")
+            s["avgFlushMs"] = round(total_ms / s["batches"], 3) if s["batches"] else None
+            return {
+                "mode": self.mode,
+                "queueDepth": len(self._queue) + self._in_flight,
+                "running": self._thread is not None and self._thread.is_alive(),
+                **s,
+            }
+
+
+audit_writer = AuditWriter(
+    mode=os.environ.get("AUDIT_MODE", INLINE),
+    flush_interval_ms=_env_int("AUDIT_FLUSH_INTERVAL_MS", 200),
+    batch_size=_env_int("AUDIT_BATCH_SIZE", 500),
+    retry_limit=_env_int("AUDIT_RETRY_LIMIT", 5),
+)
+
+event.listen(Session, "before_commit", audit_writer._before_commit)
+event.listen(Session, "after_commit", audit_writer._after_commit)
+event.listen(Session, "after_rollback", audit_writer._after_rollback)
+atexit.register(audit_writer.stop)
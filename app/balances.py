@@ -0,0 +1,163 @@
+"""Остатки занятий клиентов: таблица client_balances.
+
+Строка на клиента с суммой купленных занятий, числом расходов и последними датами (завершения покупок,
+расхода). Роутер абонементов обновляет её в той же транзакции, что и саму покупку или расход:
+прибавление — одним UPSERT с арифметикой на стороне SQLite, так что параллельные изменения не теряются.
+Чтение остатка — поиск по первичному ключу вместо SUM/COUNT по всей истории клиента.
+
+Последняя дата при удалении пересчитывается (MAX по индексу клиента), только если удалили именно её.
+Нет строки — у клиента нет ни покупок, ни расходов (остаток 0).
+
+Расхождение с покупками и расходами (правка БД в обход API) находит `verify`, исправляет `rebuild`
+(scripts/rebuild_balances.py).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from . import models
+
+
+_FIELDS = ("total_purchased", "total_spent", "last_expiry_date", "last_expense_date")
+
+
+def _later(current, new):
+    """Большая из двух ISO-дат, NULL — меньше любой (max() в SQLite с NULL даёт NULL)."""
+    return func.nullif(func.max(func.coalesce(current, ""), func.coalesce(new, "")), "")
+
+
+def _add(db: Session, client_id: int, purchased: int = 0, spent: int = 0,
+         expiry: str | None = None, expense_date: str | None = None) -> None:
+    t = models.ClientBalance.__table__
+    stmt = sqlite_insert(t).values(
+        client_id=client_id,
+        total_purchased=purchased,
+        total_spent=spent,
+        last_expiry_date=expiry,
+        last_expense_date=expense_date,
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[t.c.client_id],
+        set_={
+            "total_purchased": t.c.total_purchased + stmt.excluded.total_purchased,
+            "total_spent": t.c.total_spent + stmt.excluded.total_spent,
+            "last_expiry_date": _later(t.c.last_expiry_date, stmt.excluded.last_expiry_date),
+            "last_expense_date": _later(t.c.last_expense_date, stmt.excluded.last_expense_date),
+        },
+    ))
+
+
+def purchase_added(db: Session, client_id: int, lessons: int, expiry_date: str) -> None:
+    _add(db, client_id, purchased=lessons, expiry=expiry_date)
+
+
+def expense_added(db: Session, client_id: int, expense_date: str) -> None:
+    _add(db, client_id, spent=1, expense_date=expense_date)
+
+
+def purchase_removed(db: Session, client_id: int, lessons: int, expiry_date: str) -> None:
+    """Вызывать после удаления (изменения) покупки в сессии: сессия сбрасывается перед пересчётом даты."""
+    db.flush()
+    t = models.ClientBalance
+    p = models.SubscriptionPurchase
+    latest = select(func.max(p.expiry_date)).where(p.client_id == client_id).scalar_subquery()
+    db.execute(
+        update(t)
+        .where(t.client_id == client_id)
+        .values(
+            total_purchased=t.total_purchased - lessons,
+            # CASE в SQLite ленивый: MAX считается, только если удалили последнюю дату
+            last_expiry_date=case((t.last_expiry_date == expiry_date, latest), else_=t.last_expiry_date),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def expense_removed(db: Session, client_id: int, expense_date: str) -> None:
+    """Вызывать после удаления расхода в сессии: сессия сбрасывается перед пересчётом даты."""
+    db.flush()
+    t = models.ClientBalance
+    e = models.SubscriptionExpense
+    latest = select(func.max(e.expense_date)).where(e.client_id == client_id).scalar_subquery()
+    db.execute(
+        update(t)
+        .where(t.client_id == client_id)
+        .values(
+            total_spent=t.total_spent - 1,
+            last_expense_date=case((t.last_expense_date == expense_date, latest), else_=t.last_expense_date),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _computed():
+    """Остатки, посчитанные заново по покупкам и расходам: (client_id, *_FIELDS) для клиентов с историей."""
+    c = models.Client
+    p = models.SubscriptionPurchase
+    e = models.SubscriptionExpense
+    purchased = select(
+        p.client_id,
+        func.sum(p.lessons_count).label("total"),
+        func.max(p.expiry_date).label("last_date"),
+    ).group_by(p.client_id).subquery()
+    spent = select(
+        e.client_id,
+        func.count().label("total"),
+        func.max(e.expense_date).label("last_date"),
+    ).group_by(e.client_id).subquery()
+    return (
+        select(
+            c.id,
+            func.coalesce(purchased.c.total, 0),
+            func.coalesce(spent.c.total, 0),
+            purchased.c.last_date,
+            spent.c.last_date,
+        )
+        .outerjoin(purchased, purchased.c.client_id == c.id)
+        .outerjoin(spent, spent.c.client_id == c.id)
+        .where((purchased.c.client_id.is_not(None)) | (spent.c.client_id.is_not(None)))
+    )
+
+
+def rebuild(db: Session) -> int:
+    """Пересчитать таблицу целиком (INSERT … SELECT); возвращает число строк. Не коммитит."""
+    t = models.ClientBalance.__table__
+    db.execute(delete(t))
+    db.execute(insert(t).from_select(["client_id", *_FIELDS], _computed()))
+    return db.scalar(select(func.count()).select_from(t))
+
+
+def needs_rebuild(db: Session) -> bool:
+    """Таблица пуста, а покупки или расходы есть (таблица добавлена в существующую БД)."""
+    if db.scalar(select(models.ClientBalance.client_id).limit(1)) is not None:
+        return False
+    return any(
+        db.scalar(select(model.id).limit(1)) is not None
+        for model in (models.SubscriptionPurchase, models.SubscriptionExpense)
+    )
+
+
+@dataclass(frozen=True)
+class Drift:
+    client_id: int
+    stored: tuple | None  # значения _FIELDS в client_balances (None — строки нет)
+    expected: tuple | None  # значения по покупкам и расходам (None — истории нет)
+
+
+def verify(db: Session) -> list[Drift]:
+    """Клиенты, у которых client_balances расходится с покупками и расходами."""
+    t = models.ClientBalance
+    empty = (0, 0, None, None)
+    stored = {row[0]: tuple(row[1:]) for row in db.execute(select(t.client_id, *(getattr(t, f) for f in _FIELDS)))}
+    expected = {row[0]: tuple(row[1:]) for row in db.execute(_computed())}
+    drift = []
+    for client_id in sorted(stored.keys() | expected.keys()):
+        have, want = stored.get(client_id), expected.get(client_id)
+        # Строка с нулями после удаления всей истории равносильна её отсутствию
+        if (have or empty) != (want or empty):
+            drift.append(Drift(client_id, have, want))
+    return drift
@@ -0,0 +1,66 @@
+"""Лента изменений расписаний для подписчиков SSE (GET /api/schedules/stream).
+
+Роутеры публикуют событие после коммита; каждому подписчику (открытой вкладке календаря) событие кладётся
+в его asyncio-очередь потокобезопасно — обработчики записи выполняются в пуле потоков, а поток SSE
+живёт в event loop.
+
+Лента — в памяти процесса. Изменения, сделанные другим воркером или скриптом, поток замечает по версиям
+в data_versions (см. versions.py) и присылает подписчику событие `resync` — «перезапроси окно».
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any
+
+
+# Событие-маркер: подписчик отстал (переполнена очередь) или изменения пришли не через эту ленту
+RESYNC = "resync"
+
+_QUEUE_SIZE = 256
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+
+    def subscribe(self) -> asyncio.Queue:
+        """Вызывается из корутины потока SSE."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def publish(self, event: dict[str, Any]) -> None:
+        """Отправить событие всем подписчикам (из любого потока)."""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Цикл подписчика уже закрыт — он отпишется сам
+                pass
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def _offer(queue: asyncio.Queue, event: dict[str, Any]) -> None:
+    if queue.full():
+        # Медленный клиент: вместо накопления — сбросить очередь и попросить полный перезапрос
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({"action": RESYNC, "version": event.get("version")})
+        return
+    queue.put_nowait(event)
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,142 @@
+"""Поиск клиентов по имени (GET /api/clients?search=).
+
+SQLite `lower()`/`LIKE` не сворачивают регистр кириллицы, поэтому у clients есть теневая колонка
+`name_search` — имя, нормализованное в Python (`normalize`: NFKC, casefold, ё→е, одиночные пробелы).
+Она заполняется при каждом присваивании `Client.name` и индексируется:
+
+- начало имени — диапазон по индексу ix_clients_name_search;
+- подстрока от 3 символов — FTS5 с токенизатором trigram (`clients_fts`, external content),
+  синхронизируется триггерами на clients при создании, изменении и удалении;
+- подстрока из 1–2 символов (и без FTS5) — просмотр индекса по порядку имени до набора limit.
+
+Ранжирование: совпадение с начала имени, с начала слова, остальные вхождения; внутри ранга — по имени.
+"""
+
+from __future__ import annotations
+
+import unicodedata
+
+from sqlalchemy import bindparam, case, event, func, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from . import models
+
+
+_TRIGRAM = 3
+# Больше любого символа в UTF-8: [q, q + _HIGH) — все строки с префиксом q
+_HIGH = "\U0010ffff"
+
+
+def normalize(value: str | None) -> str:
+    """Ключ поиска: регистр и ё не различаются, пробелы схлопнуты."""
+    if not value:
+        return ""
+    folded = unicodedata.normalize("NFKC", value).casefold().replace("ё", "е")
+    return " ".join(folded.split())
+
+
+@event.listens_for(models.Client.name, "set")
+def _sync_name_search(target: models.Client, value, oldvalue, initiator) -> None:
+    target.name_search = normalize(value)
+
+
+_fts = False  # clients_fts создан (migrate)
+
+
+def fts_available() -> bool:
+    return _fts
+
+
+def migrate(engine: Engine) -> None:
+    """Мягкая миграция: теневая колонка, её индекс и FTS5-индекс с триггерами."""
+    global _fts
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE clients ADD COLUMN name_search TEXT NULL"))
+    except Exception:
+        pass
+    table = models.Client.__table__
+    with engine.begin() as conn:
+        rows = conn.execute(select(table.c.id, table.c.name).where(table.c.name_search.is_(None))).all()
+        if rows:
+            conn.execute(
+                update(table).where(table.c.id == bindparam("cid")).values(name_search=bindparam("norm")),
+                [{"cid": cid, "norm": normalize(name)} for cid, name in rows],
+            )
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_clients_name_search ON clients (name_search)"))
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'clients_fts'")).first()
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5("
+                "name_search, content='clients', content_rowid='id', tokenize='trigram')"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS clients_fts_ai AFTER INSERT ON clients BEGIN "
+                "INSERT INTO clients_fts(rowid, name_search) VALUES (new.id, new.name_search); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS clients_fts_ad AFTER DELETE ON clients BEGIN "
+                "INSERT INTO clients_fts(clients_fts, rowid, name_search) VALUES ('delete', old.id, old.name_search); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS clients_fts_au AFTER UPDATE OF name_search ON clients BEGIN "
+                "INSERT INTO clients_fts(clients_fts, rowid, name_search) VALUES ('delete', old.id, old.name_search); "
+                "INSERT INTO clients_fts(rowid, name_search) VALUES (new.id, new.name_search); END"
+            ))
+            if not exists:
+                conn.execute(text("INSERT INTO clients_fts(clients_fts) VALUES ('rebuild')"))
+        _fts = True
+    except Exception:
+        # SQLite без FTS5/trigram (< 3.34): поиск подстроки просмотром индекса
+        pass
+
+
+def _statements():
+    """Запросы поиска собираются один раз: на коротких запросах сборка выражений дороже самого SQL."""
+    c = models.Client
+    q, high, limit = bindparam("q"), bindparam("high"), bindparam("limit")
+    order = (c.name_search, c.id)
+    is_prefix = (c.name_search >= q) & (c.name_search < high)
+    word_start = func.instr(" " + c.name_search, " " + q) > 0
+    matched = select(text("rowid")).select_from(text("clients_fts")).where(text("clients_fts MATCH :phrase"))
+    return {
+        "prefix": select(c).where(is_prefix).order_by(*order).limit(limit),
+        # Кандидаты — из триграммного индекса, ранжируются только они
+        "fts": (
+            select(c)
+            .where(c.id.in_(matched), ~is_prefix)
+            .order_by(case((word_start, 1), else_=2), *order)
+            .limit(limit)
+        ),
+        # Без FTS (или запрос короче триграммы): просмотр индекса по порядку имени до набора limit
+        "word": select(c).where(~is_prefix, word_start).order_by(*order).limit(limit),
+        "inner": select(c).where(~is_prefix, ~word_start, func.instr(c.name_search, q) > 0).order_by(*order).limit(limit),
+    }
+
+
+_STATEMENTS = _statements()
+
+
+def search(db: Session, query: str, limit: int | None = None) -> list[models.Client]:
+    """Клиенты, в имени которых есть query: с начала имени, с начала слова, прочие; внутри — по имени.
+
+    limit=None — все совпадения.
+    """
+    q = normalize(query)
+    if not q:
+        return []
+    # LIMIT -1 в SQLite — без ограничения
+    params = {"q": q, "high": q + _HIGH, "limit": -1 if limit is None else limit}
+    found = list(db.scalars(_STATEMENTS["prefix"], params))
+    stages = ("fts",) if len(q) >= _TRIGRAM and fts_available() else ("word", "inner")
+    for stage in stages:
+        if limit is not None and len(found) >= limit:
+            break
+        if limit is not None:
+            params["limit"] = limit - len(found)
+        if stage == "fts":
+            params["phrase"] = '"' + q.replace('"', '""') + '"'
+        found += db.scalars(_STATEMENTS[stage], params)
+    return found
@@ -0,0 +1,170 @@
+"""Интервальный индекс расписаний.
+
+Границы событий хранятся в schedules.ts_from / ts_to (epoch, мс UTC). Для поиска пересечений
+используется виртуальная таблица SQLite R*Tree `schedules_rtree`, которую триггеры держат
+в синхронизации с `schedules` при любой записи (в том числе из скриптов с «сырым» SQL).
+
+R*Tree хранит координаты как float32 и округляет их наружу, поэтому выборка из него — надмножество;
+точная проверка по целым ts_from / ts_to выполняется в основном запросе.
+Если модуль rtree в сборке SQLite недоступен — работаем по составному индексу (ts_from, ts_to).
+"""
+
+from __future__ import annotations
+
+from heapq import heappop, heappush
+from typing import Iterable
+
+from sqlalchemy import and_, column, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from . import models
+
+
+schedules_rtree = table("schedules_rtree", column("id"), column("ts_from"), column("ts_to"))
+
+# Выставляется при старте (setup_interval_index)
+rtree_enabled = False
+
+# ISO-строка → epoch мс средствами SQLite (для бэкфилла строк, записанных без ts_*)
+_SQL_EPOCH_MS = "CAST(ROUND((julianday({col}) - 2440587.5) * 86400000) AS INTEGER)"
+
+_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_schedules_rtree_insert AFTER INSERT ON schedules
+    WHEN NEW.ts_from IS NOT NULL AND NEW.ts_to IS NOT NULL
+    BEGIN
+      INSERT OR REPLACE INTO schedules_rtree (id, ts_from, ts_to)
+      VALUES (NEW.id, MIN(NEW.ts_from, NEW.ts_to), MAX(NEW.ts_from, NEW.ts_to));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_schedules_rtree_update AFTER UPDATE OF ts_from, ts_to ON schedules
+    BEGIN
+      DELETE FROM schedules_rtree WHERE id = OLD.id;
+      INSERT INTO schedules_rtree (id, ts_from, ts_to)
+      SELECT NEW.id, MIN(NEW.ts_from, NEW.ts_to), MAX(NEW.ts_from, NEW.ts_to)
+      WHERE NEW.ts_from IS NOT NULL AND NEW.ts_to IS NOT NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_schedules_rtree_delete AFTER DELETE ON schedules
+    BEGIN
+      DELETE FROM schedules_rtree WHERE id = OLD.id;
+    END
+    """,
+)
+
+
+def setup_interval_index(engine: Engine) -> None:
+    """Бэкфилл ts_*, составной индекс, R*Tree и триггеры (идемпотентно)."""
+    global rtree_enabled
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE schedules SET "
+            f"ts_from = {_SQL_EPOCH_MS.format(col='date_from')}, "
+            f"ts_to = {_SQL_EPOCH_MS.format(col='date_to')} "
+            "WHERE ts_from IS NULL OR ts_to IS NULL"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_schedules_ts ON schedules (ts_from, ts_to)"))
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS schedules_rtree USING rtree(id, ts_from, ts_to)"))
+            for ddl in _TRIGGERS:
+                conn.execute(text(ddl))
+            # Пересобрать индекс, если он разошёлся с таблицей (первый запуск, ручные правки)
+            indexed = conn.execute(text("SELECT COUNT(*) FROM schedules_rtree")).scalar()
+            expected = conn.execute(
+                text("SELECT COUNT(*) FROM schedules WHERE ts_from IS NOT NULL AND ts_to IS NOT NULL")
+            ).scalar()
+            if indexed != expected:
+                conn.execute(text("DELETE FROM schedules_rtree"))
+                conn.execute(text(
+                    "INSERT INTO schedules_rtree (id, ts_from, ts_to) "
+                    "SELECT id, MIN(ts_from, ts_to), MAX(ts_from, ts_to) FROM schedules "
+                    "WHERE ts_from IS NOT NULL AND ts_to IS NOT NULL"
+                ))
+        rtree_enabled = True
+    except OperationalError:
+        rtree_enabled = False
+
+
+def overlaps(from_ms: int, to_ms: int):
+    """Условие пересечения события с [from_ms, to_ms) по полуоткрытым интервалам."""
+    exact = and_(models.Schedule.ts_from < to_ms, models.Schedule.ts_to > from_ms)
+    if not rtree_enabled:
+        return exact
+    candidates = select(schedules_rtree.c.id).where(
+        schedules_rtree.c.ts_from < to_ms,
+        schedules_rtree.c.ts_to > from_ms,
+    )
+    return and_(models.Schedule.id.in_(candidates), exact)
+
+
+def sweep_overlaps(
+    existing: list[tuple[int, int, int]],
+    candidates: list[tuple[int, int, int]],
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """Все пересечения на одной оси времени за один проход сортированной «заметающей прямой».
+
+    existing / candidates — (start, end, key). Возвращает пары (candidate_key, existing_key) и
+    пары кандидатов между собой (key1, key2). Интервалы полуоткрытые [start, end): пересекаются, если
+    a.start < b.end и b.start < a.end, т. е. окончание одного в момент начала другого — не пересечение;
+    при равных началах короткие интервалы идут первыми, закончившиеся к моменту start снимаются.
+    """
+    items = sorted(
+        [(s, e, 0, k) for s, e, k in existing] + [(s, e, 1, k) for s, e, k in candidates],
+        key=lambda x: (x[0], x[1], x[2]),
+    )
+    heap: list[tuple[int, int, int]] = []
+    active: tuple[set[int], set[int]] = (set(), set())
+    with_existing: list[tuple[int, int]] = []
+    between: list[tuple[int, int]] = []
+    for start, end, kind, key in items:
+        while heap and heap[0][0] <= start:
+            _, k_kind, k_key = heappop(heap)
+            active[k_kind].discard(k_key)
+        if kind == 1:
+            with_existing.extend((key, other) for other in active[0])
+            between.extend((other, key) for other in active[1])
+        else:
+            with_existing.extend((other, key) for other in active[1])
+        if end > start:
+            active[kind].add(key)
+            heappush(heap, (end, kind, key))
+    return with_existing, between
+
+
+def free_slots(
+    busy: Iterable[tuple[int, int]],
+    allowed: Iterable[tuple[int, int]],
+    min_length: int,
+) -> list[tuple[int, int]]:
+    """Свободные промежутки длиной не меньше min_length внутри allowed — один проход заметающей прямой.
+
+    busy — интервалы занятости (в любом порядке, могут пересекаться), allowed — непересекающиеся
+    отрезки по возрастанию (окно, часы работы). Интервалы полуоткрытые [start, end): слот может
+    начинаться в момент окончания события; событие нулевой длины внутри слота делит его.
+    """
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(busy):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    slots: list[tuple[int, int]] = []
+    i = 0
+    for a_from, a_to in allowed:
+        while i < len(merged) and merged[i][1] <= a_from:
+            i += 1
+        cursor = a_from
+        j = i
+        while j < len(merged) and merged[j][0] < a_to:
+            start, end = merged[j]
+            if start - cursor >= min_length:
+                slots.append((cursor, start))
+            cursor = max(cursor, end)
+            j += 1
+        if a_to - cursor >= min_length:
+            slots.append((cursor, a_to))
+    return slots
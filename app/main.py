@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
-from .routers import health, tags, tag_values, schedules, audit, clients, subscription_types, subscriptions
+from .routers import health, tags, tag_values, schedules, series, availability, reports, audit, clients, subscription_types, subscriptions
 
 app = FastAPI(title="Web Scheduler")
 
@@ -12,12 +12,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Курсор следующей страницы и ETag должны быть видны фронтенду с другого origin
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 app.include_router(health.router, prefix="/api")
 app.include_router(tags.router, prefix="/api")
 app.include_router(tag_values.router, prefix="/api")
 app.include_router(schedules.router, prefix="/api")
+app.include_router(series.router, prefix="/api")
+app.include_router(availability.router, prefix="/api")
+app.include_router(reports.router, prefix="/api")
 app.include_router(audit.router, prefix="/api")
 app.include_router(clients.router, prefix="/api")
 app.include_router(subscription_types.router, prefix="/api")
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from sqlalchemy import Integer, String, ForeignKey, UniqueConstraint, Boolean
+from sqlalchemy import Integer, String, ForeignKey, UniqueConstraint, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
 
@@ -36,6 +36,10 @@ class TagValue(Base):
 
 class Schedule(Base):
     __tablename__ = "schedules"
+    __table_args__ = (
+        Index("ix_schedules_ts", "ts_from", "ts_to"),
+        Index("ix_schedules_row_version", "row_version"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String, nullable=False)
@@ -43,6 +47,11 @@ class Schedule(Base):
     date_to: Mapped[str] = mapped_column(String, nullable=False)
     is_canceled: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
     contact: Mapped[str | None] = mapped_column(String, nullable=True)
+    # Нормализованные границы интервала (epoch, миллисекунды UTC) — для сравнений и индекса
+    ts_from: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    ts_to: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Версия данных schedules (data_versions), в которой строка последний раз изменялась — для дельта-синхронизации
+    row_version: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     tag_values: Mapped[list[TagValue]] = relationship(
         secondary="schedule_tag_values",
@@ -50,6 +59,16 @@ class Schedule(Base):
     )
 
 
+class ScheduleTombstone(Base):
+    """След удалённого расписания: клиенты с дельта-синхронизацией узнают об удалении."""
+    __tablename__ = "schedule_tombstones"
+
+    schedule_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    date_from: Mapped[str] = mapped_column(String, nullable=False)
+    date_to: Mapped[str] = mapped_column(String, nullable=False)
+
+
 class ScheduleTagValue(Base):
     __tablename__ = "schedule_tag_values"
 
@@ -57,8 +76,67 @@ class ScheduleTagValue(Base):
     tag_value_id: Mapped[int] = mapped_column(ForeignKey("tag_values.id", ondelete="CASCADE"), primary_key=True)
 
 
+class ScheduleSeries(Base):
+    """Повторяющееся событие: первое вхождение + правило повторения (RRULE-подобное)."""
+    __tablename__ = "schedule_series"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    title: Mapped[str] = mapped_column(String, nullable=False)
+    date_from: Mapped[str] = mapped_column(String, nullable=False)  # начало первого вхождения (ISO-8601)
+    date_to: Mapped[str] = mapped_column(String, nullable=False)  # окончание первого вхождения
+    ts_from: Mapped[int] = mapped_column(Integer, nullable=False)  # epoch мс
+    ts_to: Mapped[int] = mapped_column(Integer, nullable=False)
+    rrule: Mapped[str] = mapped_column(String, nullable=False)  # FREQ=WEEKLY;BYDAY=MO,WE;COUNT=10
+    until_ts: Mapped[int | None] = mapped_column(Integer, nullable=True)  # окончание последнего вхождения (NULL — бесконечно)
+    is_canceled: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    contact: Mapped[str | None] = mapped_column(String, nullable=True)
+    row_version: Mapped[int | None] = mapped_column(Integer, nullable=True)  # см. Schedule.row_version
+
+    tag_values: Mapped[list[TagValue]] = relationship(secondary="schedule_series_tag_values")
+    exceptions: Mapped[list[ScheduleSeriesException]] = relationship(
+        "ScheduleSeriesException", cascade="all, delete-orphan", order_by="ScheduleSeriesException.occurrence_ts"
+    )
+
+
+class ScheduleSeriesTagValue(Base):
+    __tablename__ = "schedule_series_tag_values"
+
+    series_id: Mapped[int] = mapped_column(ForeignKey("schedule_series.id", ondelete="CASCADE"), primary_key=True)
+    tag_value_id: Mapped[int] = mapped_column(ForeignKey("tag_values.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class ScheduleSeriesException(Base):
+    """Исключение из серии для одного вхождения: skip (вхождения нет) или cancel (отменено)."""
+    __tablename__ = "schedule_series_exceptions"
+
+    series_id: Mapped[int] = mapped_column(ForeignKey("schedule_series.id", ondelete="CASCADE"), primary_key=True)
+    occurrence_ts: Mapped[int] = mapped_column(Integer, primary_key=True)  # начало вхождения по правилу, epoch мс
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+
+
+class ScheduleSeriesTombstone(Base):
+    __tablename__ = "schedule_series_tombstones"
+
+    series_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+
+
+class DataVersion(Base):
+    """Монотонный счётчик версии данных по области (scope), увеличивается каждой записью."""
+    __tablename__ = "data_versions"
+
+    scope: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # Лента журнала: диапазон по времени, новые сверху, keyset-пагинация по (ts, id)
+        Index("ix_audit_logs_ts_id", "ts", "id"),
+        # История одной записи: точный поиск по (entity, entity_id), уже в порядке ленты
+        Index("ix_audit_logs_entity", "entity", "entity_id", "ts", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     ts: Mapped[str] = mapped_column(String, nullable=False)  # ISO-8601 UTC timestamp
@@ -71,12 +149,19 @@ class AuditLog(Base):
 
 class Client(Base):
     __tablename__ = "clients"
+    __table_args__ = (
+        # Порядок и keyset-пагинация GET /api/clients — (name, id)
+        Index("ix_clients_name_id", "name", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
+    # Нормализованное имя для поиска (client_search.normalize), заполняется при присваивании name
+    name_search: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
 
     purchases: Mapped[list[SubscriptionPurchase]] = relationship("SubscriptionPurchase", back_populates="client", cascade="all, delete-orphan")
     expenses: Mapped[list[SubscriptionExpense]] = relationship("SubscriptionExpense", back_populates="client", cascade="all, delete-orphan")
+    balance: Mapped[ClientBalance | None] = relationship("ClientBalance", cascade="all, delete-orphan", uselist=False)
 
 
 class SubscriptionType(Base):
@@ -92,6 +177,9 @@ class SubscriptionType(Base):
 class SubscriptionPurchase(Base):
     """Покупка (приход) абонемента"""
     __tablename__ = "subscription_purchases"
+    __table_args__ = (
+        Index("idx_purchases_client", "client_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     client_id: Mapped[int] = mapped_column(ForeignKey("clients.id", ondelete="CASCADE"), nullable=False)
@@ -106,11 +194,29 @@ class SubscriptionPurchase(Base):
 class SubscriptionExpense(Base):
     """Расход (трата) занятия из абонемента"""
     __tablename__ = "subscription_expenses"
+    __table_args__ = (
+        Index("idx_expenses_client", "client_id"),
+        Index("idx_expenses_client_date", "client_id", "expense_date"),
+        Index("idx_expenses_purchase", "purchase_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     client_id: Mapped[int] = mapped_column(ForeignKey("clients.id", ondelete="CASCADE"), nullable=False)
     expense_date: Mapped[str] = mapped_column(String, nullable=False)  # Дата расхода (ISO-8601)
     comment: Mapped[str | None] = mapped_column(String, nullable=True)  # Комментарий
+    # Покупка, с которой списано занятие (app/allocation.py); NULL — подходящей покупки нет (долг)
+    purchase_id: Mapped[int | None] = mapped_column(ForeignKey("subscription_purchases.id", ondelete="SET NULL"), nullable=True)
 
     client: Mapped[Client] = relationship("Client", back_populates="expenses")
 
+
+class ClientBalance(Base):
+    """Остаток занятий клиента, поддерживается вместе с покупками и расходами (app/balances.py)"""
+    __tablename__ = "client_balances"
+
+    client_id: Mapped[int] = mapped_column(ForeignKey("clients.id", ondelete="CASCADE"), primary_key=True)
+    total_purchased: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # Сумма купленных занятий
+    total_spent: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # Количество расходов
+    last_expiry_date: Mapped[str | None] = mapped_column(String, nullable=True)  # Самая поздняя дата завершения покупок
+    last_expense_date: Mapped[str | None] = mapped_column(String, nullable=True)  # Дата последнего расхода
+
@@ -0,0 +1,75 @@
+"""Keyset-пагинация списков (limit + непрозрачный cursor).
+
+Курсор — base64url от JSON со значениями ключа сортировки последней отданной строки; следующая страница
+выбирается условием `(k1, k2) > (v1, v2)` (или `<` при убывающей сортировке) по индексу, без OFFSET.
+Без `limit` эндпоинты отдают весь список, как раньше; курсор следующей страницы — в заголовке X-Next-Cursor
+(отсутствует на последней странице).
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Any, Callable, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def after(columns: Sequence[Any], values: Sequence[Any], descending: bool = False):
+    """Условие «строго после курсора» в порядке сортировки по columns."""
+    if len(columns) == 1:
+        return columns[0] < values[0] if descending else columns[0] > values[0]
+    key = tuple_(*columns)
+    bound = tuple_(*values)
+    return key < bound if descending else key > bound
+
+
+def order(columns: Sequence[Any], descending: bool = False) -> list[Any]:
+    return [c.desc() if descending else c.asc() for c in columns]
+
+
+def page_limit(limit: int | None, cursor: str | None) -> int | None:
+    # Курсор без limit — продолжение постраничного обхода с размером по умолчанию
+    if limit is None and cursor:
+        return DEFAULT_LIMIT
+    return limit
+
+
+def keyset_page(
+    query,
+    columns: Sequence[Any],
+    key: Callable[[Any], Sequence[Any]],
+    limit: int,
+    cursor: str | None,
+    descending: bool = False,
+) -> tuple[list[Any], str | None]:
+    """Страница ORM-запроса и курсор следующей (None — страница последняя)."""
+    if cursor:
+        query = query.filter(after(columns, decode_cursor(cursor, len(columns)), descending))
+    rows = query.order_by(*order(columns, descending)).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(key(rows[limit - 1]))
+    return rows, None
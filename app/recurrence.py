@@ -0,0 +1,403 @@
+"""Повторяющиеся события (серии): правило RRULE-подобного вида и ленивое развёртывание вхождений.
+
+Поддерживаемое подмножество RFC 5545: FREQ=DAILY|WEEKLY, INTERVAL, BYDAY (для WEEKLY), COUNT, UNTIL.
+Время — UTC-метки студии (как и у обычных расписаний), поэтому арифметика ведётся в epoch мс без поясов.
+
+Вхождения не хранятся: начало n-го вхождения вычисляется как anchor + k * period + offsets[j],
+поэтому вхождения в окне [from, to) находятся без перебора истории серии.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from math import gcd
+from typing import Collection, Iterable, Iterator
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+from . import models
+from .intervals import overlaps
+from .utils import conflict_detail, iso_to_epoch_ms
+
+
+DAY_MS = 86_400_000
+WEEK_MS = 7 * DAY_MS
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+MAX_INTERVAL = 52
+
+EXCEPTION_SKIP = "skip"  # вхождения нет (EXDATE)
+EXCEPTION_CANCEL = "cancel"  # вхождение показывается отменённым и не занимает ресурсы
+
+
+def _weekday(ms: int) -> int:
+    # 1970-01-01 — четверг
+    return (ms // DAY_MS + 3) % 7
+
+
+def _parse_until(value: str) -> int:
+    for fmt in ("%Y%m%dT%H%M%SZ", "%Y%m%d"):
+        try:
+            dt = datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
+            return iso_to_epoch_ms(dt.isoformat())
+        except ValueError:
+            pass
+    return iso_to_epoch_ms(value)
+
+
+@dataclass(frozen=True)
+class Rule:
+    freq: str
+    interval: int = 1
+    byday: tuple[int, ...] = ()
+    count: int | None = None
+    until: int | None = None
+
+
+def parse_rrule(value: str) -> Rule:
+    """Разобрать строку вида FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;COUNT=10. Бросает ValueError."""
+    parts: dict[str, str] = {}
+    for chunk in value.strip().removeprefix("RRULE:").split(";"):
+        if not chunk:
+            continue
+        key, sep, val = chunk.partition("=")
+        if not sep or not val:
+            raise ValueError(f"bad RRULE part: {chunk}")
+        parts[key.strip().upper()] = val.strip()
+    unknown = parts.keys() - {"FREQ", "INTERVAL", "BYDAY", "COUNT", "UNTIL", "WKST"}
+    if unknown:
+        raise ValueError(f"unsupported RRULE parts: {', '.join(sorted(unknown))}")
+    freq = parts.get("FREQ", "").upper()
+    if freq not in ("DAILY", "WEEKLY"):
+        raise ValueError("FREQ must be DAILY or WEEKLY")
+    interval = int(parts.get("INTERVAL", "1"))
+    if not 1 <= interval <= MAX_INTERVAL:
+        raise ValueError(f"INTERVAL must be in 1..{MAX_INTERVAL}")
+    byday: tuple[int, ...] = ()
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise ValueError("BYDAY is supported only with FREQ=WEEKLY")
+        try:
+            byday = tuple(sorted({WEEKDAYS.index(d.strip().upper()) for d in parts["BYDAY"].split(",")}))
+        except ValueError:
+            raise ValueError("BYDAY must list MO,TU,WE,TH,FR,SA,SU")
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise ValueError("COUNT and UNTIL are mutually exclusive")
+    count = int(parts["COUNT"]) if "COUNT" in parts else None
+    if count is not None and count < 1:
+        raise ValueError("COUNT must be >= 1")
+    until = _parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+    return Rule(freq=freq, interval=interval, byday=byday, count=count, until=until)
+
+
+class Pattern:
+    """Развёртка правила относительно первого вхождения [start, start + duration)."""
+
+    __slots__ = ("start", "duration", "count", "until", "period", "anchor", "offsets", "_skip")
+
+    def __init__(self, rule: Rule, start: int, duration: int):
+        self.start = start
+        self.duration = duration
+        self.count = rule.count
+        self.until = rule.until
+        if rule.freq == "DAILY":
+            self.period = rule.interval * DAY_MS
+            self.anchor = start
+            self.offsets: tuple[int, ...] = (0,)
+        else:
+            self.period = rule.interval * WEEK_MS
+            # Понедельник недели первого вхождения, то же время суток
+            self.anchor = start - _weekday(start) * DAY_MS
+            days = rule.byday or (_weekday(start),)
+            self.offsets = tuple(d * DAY_MS for d in days)
+        # Сколько позиций нулевого периода лежит раньше первого вхождения
+        self._skip = sum(1 for off in self.offsets if self.anchor + off < start)
+
+    def _nth(self, n: int) -> int:
+        g = n + self._skip
+        k, j = divmod(g, len(self.offsets))
+        return self.anchor + k * self.period + self.offsets[j]
+
+    def _index(self, k: int, j: int) -> int:
+        return k * len(self.offsets) + j - self._skip
+
+    def last_start(self) -> int | None:
+        """Начало последнего вхождения (None — серия бесконечна)."""
+        if self.count is not None:
+            return self._nth(self.count - 1)
+        if self.until is None:
+            return None
+        k = max(0, (self.until - self.anchor) // self.period)
+        while k >= 0:
+            for off in reversed(self.offsets):
+                s = self.anchor + k * self.period + off
+                if self.start <= s <= self.until:
+                    return s
+            k -= 1
+        return self.start
+
+    def end_bound(self) -> int | None:
+        last = self.last_start()
+        return None if last is None else last + self.duration
+
+    def occurrences(self, window_from: int, window_to: int) -> Iterator[int]:
+        """Начала вхождений, пересекающихся с [window_from, window_to) (полуоткрытые интервалы)."""
+        max_off = self.offsets[-1]
+        k = max(0, (window_from - self.duration - self.anchor - max_off) // self.period)
+        while True:
+            base = self.anchor + k * self.period
+            if base >= window_to:
+                return
+            for j, off in enumerate(self.offsets):
+                s = base + off
+                if s < self.start:
+                    continue
+                if s >= window_to:
+                    return
+                if self.until is not None and s > self.until:
+                    return
+                if self.count is not None and self._index(k, j) >= self.count:
+                    return
+                if s + self.duration > window_from:
+                    yield s
+            k += 1
+
+    def is_occurrence(self, start: int) -> bool:
+        if start < self.start or (self.until is not None and start > self.until):
+            return False
+        k, off = divmod(start - self.anchor, self.period)
+        if off not in self.offsets:
+            return False
+        return self.count is None or self._index(k, self.offsets.index(off)) < self.count
+
+
+def pattern_of(series: models.ScheduleSeries) -> Pattern:
+    return Pattern(parse_rrule(series.rrule), series.ts_from, series.ts_to - series.ts_from)
+
+
+def hyperperiod(a: Pattern, b: Pattern) -> int:
+    return a.period * b.period // gcd(a.period, b.period)
+
+
+def patterns_overlap(
+    a: Pattern,
+    b: Pattern,
+    a_excepted: Collection[int] = (),
+    b_excepted: Collection[int] = (),
+) -> tuple[int, int] | None:
+    """Первая пара пересекающихся вхождений двух серий (начало a, начало b) или None.
+
+    Расположение вхождений повторяется с периодом НОК(period_a, period_b), поэтому достаточно
+    проверить один такой период от момента, когда обе серии уже начались. a_excepted / b_excepted —
+    начала вхождений, не занимающих ресурсы (skip/cancel): такая пара сдвигается на следующие периоды
+    НОК, пока одно из вхождений не окажется без исключения или за концом серии; исключений конечное
+    число, поэтому и сдвигов не больше, чем исключений.
+    """
+    h = hyperperiod(a, b)
+    lo = max(a.start, b.start) - max(a.duration, b.duration)
+    hi = lo + h + a.period + b.period + a.duration + b.duration
+    for bound in (a.end_bound(), b.end_bound()):
+        if bound is not None:
+            hi = min(hi, bound)
+    if hi <= lo:
+        return None
+    for s in a.occurrences(lo, hi):
+        for t in b.occurrences(s, s + a.duration):
+            while s in a_excepted or t in b_excepted:
+                s, t = s + h, t + h
+                if not (a.is_occurrence(s) and b.is_occurrence(t)):
+                    break
+            else:
+                return s, t
+    return None
+
+
+@dataclass(frozen=True)
+class SeriesOccurrence:
+    series_id: int
+    title: str
+    start: int
+    end: int
+    tag_value_ids: frozenset[int]
+    is_canceled: bool
+    contact: str | None
+
+
+def _series_tag_ids(db: Session, series_ids: Iterable[int]) -> dict[int, frozenset[int]]:
+    stv = models.ScheduleSeriesTagValue
+    result: dict[int, set[int]] = {}
+    ids = list(series_ids)
+    if ids:
+        for sid, value_id in db.execute(select(stv.series_id, stv.tag_value_id).where(stv.series_id.in_(ids))):
+            result.setdefault(sid, set()).add(value_id)
+    return {sid: frozenset(result.get(sid, ())) for sid in ids}
+
+
+def _exceptions(db: Session, series_ids: list[int], window_from: int, window_to: int, max_duration: int) -> dict[tuple[int, int], str]:
+    if not series_ids:
+        return {}
+    exc = models.ScheduleSeriesException
+    rows = db.execute(
+        select(exc.series_id, exc.occurrence_ts, exc.kind).where(
+            exc.series_id.in_(series_ids),
+            exc.occurrence_ts < window_to,
+            exc.occurrence_ts >= window_from - max_duration,
+        )
+    )
+    return {(sid, ts): kind for sid, ts, kind in rows}
+
+
+def _excepted_starts(db: Session, series_ids: list[int]) -> dict[int, set[int]]:
+    """Начала вхождений с исключением (skip или cancel — ресурсы не заняты) по сериям."""
+    if not series_ids:
+        return {}
+    exc = models.ScheduleSeriesException
+    result: dict[int, set[int]] = {sid: set() for sid in series_ids}
+    for sid, ts in db.execute(select(exc.series_id, exc.occurrence_ts).where(exc.series_id.in_(series_ids))):
+        result[sid].add(ts)
+    return result
+
+
+def _series_in_window(window_from: int, window_to: int):
+    s = models.ScheduleSeries
+    return (
+        s.ts_from < window_to,
+        or_(s.until_ts.is_(None), s.until_ts > window_from),
+    )
+
+
+def expand(
+    db: Session,
+    window_from: int,
+    window_to: int,
+    tag_value_ids: Iterable[int] | None = None,
+    include_canceled: bool = True,
+    exclude_series_id: int | None = None,
+) -> list[SeriesOccurrence]:
+    """Вхождения серий в окне [window_from, window_to) с учётом исключений.
+
+    tag_value_ids — только серии, у которых есть хотя бы одно из этих значений тегов.
+    include_canceled=False — без отменённых серий и вхождений (для проверки занятости ресурсов).
+    """
+    s = models.ScheduleSeries
+    q = select(s).where(*_series_in_window(window_from, window_to))
+    if tag_value_ids is not None:
+        stv = models.ScheduleSeriesTagValue
+        q = q.where(s.id.in_(select(stv.series_id).where(stv.tag_value_id.in_(list(tag_value_ids)))))
+    if not include_canceled:
+        q = q.where(s.is_canceled == False)
+    if exclude_series_id is not None:
+        q = q.where(s.id != exclude_series_id)
+    series = list(db.execute(q).scalars())
+    if not series:
+        return []
+    tags = _series_tag_ids(db, (x.id for x in series))
+    max_duration = max(x.ts_to - x.ts_from for x in series)
+    exceptions = _exceptions(db, [x.id for x in series], window_from, window_to, max_duration)
+    result: list[SeriesOccurrence] = []
+    for x in series:
+        pattern = pattern_of(x)
+        for start in pattern.occurrences(window_from, window_to):
+            kind = exceptions.get((x.id, start))
+            if kind == EXCEPTION_SKIP:
+                continue
+            canceled = x.is_canceled or kind == EXCEPTION_CANCEL
+            if canceled and not include_canceled:
+                continue
+            result.append(
+                SeriesOccurrence(x.id, x.title, start, start + pattern.duration, tags[x.id], canceled, x.contact)
+            )
+    result.sort(key=lambda o: (o.start, o.series_id))
+    return result
+
+
+def find_occurrence_conflict(
+    db: Session,
+    tag_value_ids: list[int],
+    ts_from: int,
+    ts_to: int,
+    exclude_series_id: int | None = None,
+) -> SeriesOccurrence | None:
+    """Неотменённое вхождение серии, занимающее один из ресурсов в [ts_from, ts_to)."""
+    if not tag_value_ids:
+        return None
+    # Нулевая длина окна: расширяем на 1 мс, фильтр пересечения ниже — точный
+    occurrences = expand(db, ts_from, max(ts_to, ts_from + 1), tag_value_ids, include_canceled=False, exclude_series_id=exclude_series_id)
+    wanted = set(tag_value_ids)
+    for occ in occurrences:
+        if occ.tag_value_ids & wanted and not (occ.end <= ts_from or occ.start >= ts_to):
+            return occ
+    return None
+
+
+def _grid_overlap(pattern: Pattern):
+    """SQL-условие: событие пересекает вхождение по сетке правила (начало серии, COUNT/UNTIL и исключения
+    не учитываются — их проверяет pattern.occurrences).
+
+    Ближайшее начало по сетке не позже ts_to - 1 отстоит от него на r = (ts_to - 1 - начало) mod period;
+    пересечение есть, если оно заканчивается позже ts_from: r < ts_to - 1 - ts_from + duration.
+    """
+    sched = models.Schedule
+    p = pattern.period
+    return or_(*(
+        ((sched.ts_to - 1 - (pattern.anchor + off)) % p + p) % p < sched.ts_to - 1 - sched.ts_from + pattern.duration
+        for off in pattern.offsets
+    ))
+
+
+def find_series_conflict(
+    db: Session,
+    pattern: Pattern,
+    tag_value_ids: list[int],
+    exclude_series_id: int | None = None,
+) -> str | None:
+    """Проверка новой/изменённой серии на всём её протяжении без материализации вхождений.
+
+    exclude_series_id — изменяемая серия: её исключения (skip/cancel) освобождают вхождения, и занятые
+    после этого слоты конфликтом не считаются. Возвращает текст ошибки или None.
+
+    События отбираются SQLite по сетке правила (`_grid_overlap`), так что в Python приходят только
+    пересекающие вхождения, и проверка останавливается на первом подтверждённом. У бесконечной серии
+    верхней границы нет: SQLite просматривает все события ресурсов после её начала — по одной
+    арифметической проверке на строку, без выборки непересекающихся.
+    """
+    if not tag_value_ids:
+        return None
+    own_excepted = _excepted_starts(db, [exclude_series_id]).get(exclude_series_id, set()) if exclude_series_id is not None else set()
+    end_bound = pattern.end_bound()
+    stv = models.ScheduleTagValue
+    q = (
+        select(models.Schedule.title, models.Schedule.date_from, models.Schedule.date_to, models.Schedule.ts_from, models.Schedule.ts_to)
+        .join(stv, stv.schedule_id == models.Schedule.id)
+        .where(
+            stv.tag_value_id.in_(tag_value_ids),
+            models.Schedule.is_canceled == False,
+            models.Schedule.ts_to > pattern.start,
+            _grid_overlap(pattern),
+        )
+        .order_by(models.Schedule.ts_from)
+    )
+    if end_bound is not None:
+        q = q.where(overlaps(pattern.start, end_bound))
+    # Кандидат подтверждается точно: вхождение в интервале события в пределах серии и без исключения
+    for title, date_from, date_to, ts_from, ts_to in db.execute(q):
+        if any(start not in own_excepted for start in pattern.occurrences(ts_from, ts_to)):
+            return conflict_detail(title, date_from, date_to)
+    sstv = models.ScheduleSeriesTagValue
+    s = models.ScheduleSeries
+    q = select(s).where(
+        s.is_canceled == False,
+        s.id.in_(select(sstv.series_id).where(sstv.tag_value_id.in_(tag_value_ids))),
+        or_(s.until_ts.is_(None), s.until_ts > pattern.start),
+    )
+    if exclude_series_id is not None:
+        q = q.where(s.id != exclude_series_id)
+    if end_bound is not None:
+        q = q.where(s.ts_from < end_bound)
+    others = list(db.execute(q).scalars())
+    excepted = _excepted_starts(db, [other.id for other in others])
+    for other in others:
+        if patterns_overlap(pattern, pattern_of(other), own_excepted, excepted[other.id]) is not None:
+            return f"Пересечение с повторяющимся событием \"{other.title}\" ({other.rrule})"
+    return None
+
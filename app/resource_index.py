@@ -0,0 +1,227 @@
+"""Индекс занятости уникальных ресурсов в памяти процесса.
+
+Для каждого значения тега (зал, тренер) хранится отсортированный по началу список интервалов
+неотменённых событий. Индекс строится лениво из БД при первом обращении к ресурсу и обновляется
+роутером расписаний после каждого create/update/delete/отмены.
+
+Свежесть проверяется по версии области `schedules` (см. versions.py): если версия в БД ушла вперёд
+не нашими изменениями (другой воркер, bulk-операция), все деревья сбрасываются и перестраиваются.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import models
+from .versions import SCHEDULES, get_version
+
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalIndex:
+    """Интервалы одного ресурса: поиск пересечений за O(log n + k).
+
+    Записи (start, end, schedule_id) отсортированы по началу. Пересекающиеся с [a, b) записи имеют
+    start < b и start > a - max_len, где max_len — наибольшая длина интервала в индексе, поэтому
+    кандидаты находятся двумя бинарными поисками.
+
+    У события не больше одной записи: add и remove идемпотентны по schedule_id. Дерево загружается
+    из БД отдельным запросом после чтения версии, и в него уже может попасть изменение, которое
+    затем придёт ещё раз через apply — повторное добавление лишь заменяет запись.
+    """
+
+    __slots__ = ("_items", "_spans", "_max_len")
+
+    def __init__(self, items: Iterable[tuple[int, int, int]] = ()):
+        self._spans: dict[int, tuple[int, int]] = {sid: (start, end) for start, end, sid in items}
+        self._items: list[tuple[int, int, int]] = sorted((s, e, sid) for sid, (s, e) in self._spans.items())
+        self._max_len = max((end - start for start, end, _ in self._items), default=0)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, schedule_id: int, start: int, end: int) -> None:
+        self.remove(schedule_id)
+        self._spans[schedule_id] = (start, end)
+        insort(self._items, (start, end, schedule_id))
+        self._max_len = max(self._max_len, end - start)
+
+    def remove(self, schedule_id: int) -> None:
+        span = self._spans.pop(schedule_id, None)
+        if span is None:
+            return
+        pos = bisect_left(self._items, (*span, schedule_id))
+        del self._items[pos]
+
+    def _candidates(self, start: int, end: int) -> list[tuple[int, int, int]]:
+        lo = bisect_right(self._items, (start - self._max_len, float("inf")))
+        hi = bisect_left(self._items, (end,))
+        return self._items[lo:hi]
+
+    def overlapping(self, start: int, end: int, exclude_id: int | None = None) -> list[int]:
+        # Полуоткрытые интервалы [start, end): касание границами не считается пересечением
+        return [
+            sid
+            for s, e, sid in self._candidates(start, end)
+            if s < end and e > start and sid != exclude_id
+        ]
+
+    def spans(self, start: int, end: int) -> list[tuple[int, int]]:
+        """Интервалы (start, end), пересекающиеся с [start, end), в порядке начала."""
+        return [(s, e) for s, e, _ in self._candidates(start, end) if s < end and e > start]
+
+    def snapshot(self) -> list[tuple[int, int, int]]:
+        return list(self._items)
+
+
+@dataclass(frozen=True)
+class Occupancy:
+    """Состояние события, влияющее на занятость ресурсов."""
+    ts_from: int
+    ts_to: int
+    tag_value_ids: frozenset[int]
+    is_canceled: bool
+
+    @property
+    def active(self) -> bool:
+        return not self.is_canceled and self.ts_from is not None and self.ts_to is not None
+
+
+class ResourceIndex:
+    """Реестр IntervalIndex по id значения тега (один на процесс)."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._trees: dict[int, IntervalIndex] = {}
+        self._version: int | None = None
+
+    def _load(self, db: Session, tag_value_id: int) -> IntervalIndex:
+        stv = models.ScheduleTagValue
+        rows = db.execute(
+            select(models.Schedule.ts_from, models.Schedule.ts_to, models.Schedule.id)
+            .join(stv, stv.schedule_id == models.Schedule.id)
+            .where(
+                stv.tag_value_id == tag_value_id,
+                models.Schedule.is_canceled == False,
+                models.Schedule.ts_from.is_not(None),
+                models.Schedule.ts_to.is_not(None),
+            )
+        ).all()
+        return IntervalIndex(tuple(r) for r in rows)
+
+    def _sync(self, db: Session) -> None:
+        version = get_version(db, SCHEDULES)
+        if version != self._version:
+            self._trees.clear()
+            self._version = version
+
+    def _tree(self, db: Session, tag_value_id: int) -> IntervalIndex:
+        tree = self._trees.get(tag_value_id)
+        if tree is None:
+            tree = self._trees[tag_value_id] = self._load(db, tag_value_id)
+        return tree
+
+    def find_conflict(
+        self,
+        db: Session,
+        tag_value_ids: Iterable[int],
+        ts_from: int,
+        ts_to: int,
+        exclude_id: int | None = None,
+    ) -> int | None:
+        """id любого неотменённого события, занимающего один из ресурсов в [ts_from, ts_to)."""
+        with self._lock:
+            self._sync(db)
+            for value_id in tag_value_ids:
+                found = self._tree(db, value_id).overlapping(ts_from, ts_to, exclude_id)
+                if found:
+                    return min(found)
+        return None
+
+    def busy(self, db: Session, tag_value_ids: Iterable[int], ts_from: int, ts_to: int) -> list[tuple[int, int]]:
+        """Занятость любого из ресурсов неотменёнными событиями в [ts_from, ts_to), интервалы по ресурсам подряд."""
+        with self._lock:
+            self._sync(db)
+            result: list[tuple[int, int]] = []
+            for value_id in tag_value_ids:
+                result.extend(self._tree(db, value_id).spans(ts_from, ts_to))
+            return result
+
+    def warm_up(self, db: Session, tag_value_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._sync(db)
+            for value_id in tag_value_ids:
+                self._tree(db, value_id)
+
+    def apply(
+        self,
+        version: int,
+        changes: Iterable[tuple[int, Occupancy | None, Occupancy | None]],
+    ) -> None:
+        """Учесть закоммиченные изменения событий (schedule_id, было, стало), получившие версию `version`."""
+        with self._lock:
+            if self._version is None or version != self._version + 1:
+                # Пропущены чужие изменения — проще перестроить лениво
+                self._trees.clear()
+                self._version = None
+                return
+            self._version = version
+            for schedule_id, old, new in changes:
+                if old is not None and old.active:
+                    for value_id in old.tag_value_ids:
+                        tree = self._trees.get(value_id)
+                        if tree is not None:
+                            tree.remove(schedule_id)
+                if new is not None and new.active:
+                    for value_id in new.tag_value_ids:
+                        tree = self._trees.get(value_id)
+                        if tree is not None:
+                            tree.add(schedule_id, new.ts_from, new.ts_to)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._trees.clear()
+            self._version = None
+
+    def check_consistency(self, db: Session) -> list[int]:
+        """Сверить построенные деревья с БД; вернуть id ресурсов с расхождениями (и сбросить индекс)."""
+        with self._lock:
+            self._sync(db)
+            mismatched = [
+                value_id
+                for value_id, tree in self._trees.items()
+                if tree.snapshot() != self._load(db, value_id).snapshot()
+            ]
+            if mismatched:
+                logger.warning("resource index mismatch for tag values %s; rebuilding", mismatched)
+                self._trees.clear()
+                self._version = None
+            return mismatched
+
+    def stats(self) -> dict[str, int | None]:
+        with self._lock:
+            return {
+                "version": self._version,
+                "resources": len(self._trees),
+                "intervals": sum(len(t) for t in self._trees.values()),
+            }
+
+
+resource_index = ResourceIndex()
+
+
+def unique_tag_value_ids(db: Session) -> list[int]:
+    return list(
+        db.execute(
+            select(models.TagValue.id)
+            .join(models.Tag, models.Tag.id == models.TagValue.tag_id)
+            .where(models.Tag.unique_resource == True)
+        ).scalars()
+    )
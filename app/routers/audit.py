@@ -1,37 +1,150 @@
 from datetime import datetime, timedelta, timezone
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from ..db import get_db
-from .. import models, schemas
+from ..db import engine, get_db
+from .. import audit_archive, models, schemas
+from ..audit_writer import audit_writer
+from ..pagination import (
+    MAX_LIMIT,
+    NEXT_CURSOR_HEADER,
+    after,
+    decode_cursor,
+    encode_cursor,
+    keyset_page,
+    order,
+    page_limit,
+)
+from ..utils import parse_iso_or_400
 
 
 router = APIRouter(prefix="/audit", tags=["audit"])
 
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_DEFAULT_DAYS = 2
+
+
+@router.on_event("startup")
+def _migrate_audit_logs():
+    # Мягкая миграция: индексы ленты и истории записи для уже созданных БД
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_audit_logs_ts_id ON audit_logs (ts, id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_audit_logs_entity ON audit_logs (entity, entity_id, ts, id)"))
+        # Прежние одноколоночные индексы из db-schema.sql — префиксы новых, только замедляют запись
+        conn.execute(text("DROP INDEX IF EXISTS idx_audit_logs_ts"))
+        conn.execute(text("DROP INDEX IF EXISTS idx_audit_logs_entity"))
+
+
+@router.on_event("startup")
+def _start_audit_writer():
+    # Перенести отложенные на диск записи (в любом режиме), не дожидаясь первого изменения
+    audit_writer.start()
+
+
+@router.on_event("shutdown")
+def _stop_audit_writer():
+    audit_writer.stop()
+
+
+def _to_ts(value: str, field: str) -> str:
+    """ISO-8601 от клиента → формат колонки ts (UTC без долей секунды), чтобы сравнение строк совпадало с временем."""
+    ms = parse_iso_or_400(value, field)
+    return (_EPOCH + timedelta(milliseconds=ms)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
 @router.get("", response_model=list[schemas.AuditEntryOut])
-def list_audit(days: int = Query(2, ge=1, le=365), db: Session = Depends(get_db)):
-    threshold = (datetime.now(timezone.utc) - timedelta(days=days)).replace(microsecond=0)
-    # Store and compare as ISO strings in UTC
-    threshold_iso = threshold.isoformat().replace("+00:00", "Z")
-    rows = (
-        db.query(models.AuditLog)
-        .filter(models.AuditLog.ts >= threshold_iso)
-        .order_by(models.AuditLog.ts.desc(), models.AuditLog.id.desc())
-        .all()
-    )
-    result: list[schemas.AuditEntryOut] = []
-    for r in rows:
-        result.append(
-            schemas.AuditEntryOut(
-                id=r.id,
-                ts=r.ts,
-                username=r.username,
-                action=r.action,
-                entity=r.entity,
-                entityId=r.entity_id,
-                details=r.details,
-            )
-        )
-    return result
+def list_audit(
+    response: Response,
+    days: int | None = Query(None, ge=1, le=365, description="Записи за последние N дней (по умолчанию 2, если не задан from и entity_id)"),
+    from_: str | None = Query(None, alias="from", description="Начало периода (ISO-8601, включительно)"),
+    to: str | None = Query(None, description="Конец периода (ISO-8601, не включительно)"),
+    username: str | None = Query(None, description="Пользователь"),
+    action: str | None = Query(None, description="CREATE / UPDATE / DELETE"),
+    entity: str | None = Query(None, description="Сущность (имя таблицы)"),
+    entity_id: int | None = Query(None, description="ID записи; вместе с entity — вся её история"),
+    limit: int | None = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Журнал действий, новые сверху.
+
+    Период: from/to, иначе последние days дней. История одной записи (entity + entity_id) без
+    периода отдаётся целиком — это поиск по индексу (entity, entity_id, ts, id).
+    Записи, перенесённые в архив (audit_archive.py), подмешиваются, если период заходит в архивные месяцы.
+    """
+    if entity_id is not None and entity is None:
+        raise HTTPException(status_code=400, detail="entity_id requires entity")
+    ts_from: str | None = None
+    if from_ is not None:
+        ts_from = _to_ts(from_, "from")
+    elif days is not None or entity_id is None:
+        threshold = datetime.now(timezone.utc) - timedelta(days=days or _DEFAULT_DAYS)
+        ts_from = threshold.strftime("%Y-%m-%dT%H:%M:%SZ")
+    ts_to = _to_ts(to, "to") if to is not None else None
+    filters = {
+        "username": username,
+        "action": action.upper() if action is not None else None,
+        "entity": entity,
+        "entity_id": entity_id,
+    }
 
+    q = db.query(models.AuditLog)
+    if ts_from is not None:
+        q = q.filter(models.AuditLog.ts >= ts_from)
+    if ts_to is not None:
+        q = q.filter(models.AuditLog.ts < ts_to)
+    for field, value in filters.items():
+        if value is not None:
+            q = q.filter(getattr(models.AuditLog, field) == value)
+    columns = (models.AuditLog.ts, models.AuditLog.id)
+    limit = page_limit(limit, cursor)
 
+    if not audit_archive.covers(ts_from):
+        if limit is None:
+            rows = q.order_by(*order(columns, descending=True)).all()
+        else:
+            rows, next_cursor = keyset_page(q, columns, lambda r: (r.ts, r.id), limit, cursor, descending=True)
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return [_entry_out(r.id, r.ts, r.username, r.action, r.entity, r.entity_id, r.details) for r in rows]
+
+    # Период заходит в заархивированные месяцы: та же страница из БД и из архива, слияние по (ts, id)
+    before = decode_cursor(cursor, len(columns)) if cursor else None
+    if before is not None:
+        q = q.filter(after(columns, before, descending=True))
+    q = q.order_by(*order(columns, descending=True))
+    fetch = limit + 1 if limit is not None else None
+    live = [
+        _entry_out(r.id, r.ts, r.username, r.action, r.entity, r.entity_id, r.details)
+        for r in (q.limit(fetch) if fetch else q).all()
+    ]
+    archived = [
+        _entry_out(**row)
+        for row in audit_archive.read(ts_from, ts_to, filters, before=tuple(before) if before else None, limit=fetch)
+    ]
+    entries = audit_archive.merge(live, archived, key=lambda e: (e.ts, e.id), limit=fetch)
+    if limit is not None and len(entries) > limit:
+        entries = entries[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor((entries[-1].ts, entries[-1].id))
+    return entries
+
+
+def _entry_out(
+    id: int,
+    ts: str,
+    username: str | None,
+    action: str,
+    entity: str,
+    entity_id: int | None,
+    details: str | None,
+) -> schemas.AuditEntryOut:
+    return schemas.AuditEntryOut(
+        id=id,
+        ts=ts,
+        username=username,
+        action=action,
+        entity=entity,
+        entityId=entity_id,
+        details=details,
+    )
@@ -0,0 +1,83 @@
+import re
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from ..db import get_db
+from .. import schemas
+from ..intervals import free_slots
+from ..recurrence import expand
+from ..resource_index import resource_index
+from ..tag_rules import tag_rules
+from ..utils import epoch_ms_to_iso, parse_id_list, parse_iso_or_400
+
+
+router = APIRouter(prefix="/availability", tags=["availability"])
+
+
+_MS_PER_MINUTE = 60_000
+_MS_PER_DAY = 86_400_000
+# Окно поиска не больше года — ответ остаётся компактным
+_MAX_WINDOW_DAYS = 366
+
+_HHMM = re.compile(r"^([01]\d|2[0-3]):([0-5]\d)$")
+
+
+def _minute_of_day(value: str, field: str) -> int:
+    m = _HHMM.match(value)
+    if not m:
+        raise HTTPException(status_code=400, detail=f"{field}: expected HH:MM")
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def _opening_segments(window: tuple[int, int], open_from: str | None, open_to: str | None) -> list[tuple[int, int]]:
+    """Часы работы студии по дням окна (время «на стене» хранится как UTC), обрезанные окном."""
+    if open_from is None and open_to is None:
+        return [window]
+    start = _minute_of_day(open_from or "00:00", "open_from") * _MS_PER_MINUTE
+    end = _minute_of_day(open_to, "open_to") * _MS_PER_MINUTE if open_to else _MS_PER_DAY
+    if end <= start:
+        raise HTTPException(status_code=400, detail="open_to must be later than open_from")
+    segments: list[tuple[int, int]] = []
+    day = window[0] - window[0] % _MS_PER_DAY
+    while day < window[1]:
+        seg_from, seg_to = max(day + start, window[0]), min(day + end, window[1])
+        if seg_from < seg_to:
+            segments.append((seg_from, seg_to))
+        day += _MS_PER_DAY
+    return segments
+
+
+@router.get("", response_model=schemas.AvailabilityOut)
+def find_free_slots(
+    tag_value_ids: str = Query(..., description="Ресурсы (значения тегов), которые должны быть свободны одновременно"),
+    duration: int = Query(..., ge=1, le=24 * 60, description="Минимальная длина слота, минуты"),
+    from_: str = Query(..., alias="from"),
+    to: str = Query(...),
+    open_from: str | None = Query(None, description="Начало рабочего дня, HH:MM"),
+    open_to: str | None = Query(None, description="Конец рабочего дня, HH:MM"),
+    db: Session = Depends(get_db),
+):
+    """Свободные промежутки, когда все ресурсы доступны одновременно.
+
+    Занятость — неотменённые события (индекс занятости в памяти) и вхождения серий; объединение
+    по всем ресурсам вычитается из окна (и часов работы) одним проходом заметающей прямой.
+    Возвращаются максимальные промежутки не короче duration.
+    """
+    window = (parse_iso_or_400(from_, "from"), parse_iso_or_400(to, "to"))
+    if window[1] <= window[0]:
+        raise HTTPException(status_code=400, detail="to must be later than from")
+    if window[1] - window[0] > _MAX_WINDOW_DAYS * _MS_PER_DAY:
+        raise HTTPException(status_code=400, detail=f"Window must not exceed {_MAX_WINDOW_DAYS} days")
+    ids = sorted(set(parse_id_list(tag_value_ids)))
+    if not ids:
+        raise HTTPException(status_code=400, detail="tag_value_ids must not be empty")
+    if tag_rules.get(db).unknown_values(ids):
+        raise HTTPException(status_code=400, detail="Some tagValueIds not found")
+
+    busy = resource_index.busy(db, ids, *window)
+    busy.extend((occ.start, occ.end) for occ in expand(db, *window, tag_value_ids=ids, include_canceled=False))
+    slots = free_slots(busy, _opening_segments(window, open_from, open_to), duration * _MS_PER_MINUTE)
+    return schemas.AvailabilityOut(
+        tagValueIds=ids,
+        duration=duration,
+        slots=[schemas.AvailabilitySlotOut(dateFrom=epoch_ms_to_iso(a), dateTo=epoch_ms_to_iso(b)) for a, b in slots],
+    )
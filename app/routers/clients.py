@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import csv
+import io
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
 from sqlalchemy.orm import Session
 from ..db import get_db, engine, Base
-from .. import models, schemas
-from ..utils import get_remote_user, write_audit_log
+from .. import client_search, models, schemas
+from ..pagination import MAX_LIMIT, NEXT_CURSOR_HEADER, keyset_page, page_limit
+from ..utils import add_audit_log, get_remote_user
 
 
 router = APIRouter(prefix="/clients", tags=["clients"])
@@ -12,19 +19,37 @@ router = APIRouter(prefix="/clients", tags=["clients"])
 def _create_clients_table():
     """Создание таблицы clients при запуске (мягкая миграция)."""
     Base.metadata.create_all(bind=engine)
+    # create_all не добавляет индексы к уже существующей таблице
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_clients_name_id ON clients (name, id)"))
+    # Теневая колонка и индексы поиска по имени
+    client_search.migrate(engine)
 
 
 @router.get("", response_model=list[schemas.ClientOut])
 def list_clients(
-    search: str | None = Query(default=None, description="Поиск по имени"),
+    response: Response,
+    search: str | None = Query(default=None, description="Поиск по имени (подстрока без учёта регистра и ё)"),
+    limit: int | None = Query(default=None, ge=1, le=MAX_LIMIT, description="Размер страницы (без него — весь список)"),
+    cursor: str | None = Query(default=None, description="Курсор из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
-    """Получить список клиентов с опциональным поиском по имени."""
-    clients = db.query(models.Client).order_by(models.Client.name).all()
-    if search:
-        # Регистронезависимый поиск в Python (SQLite lower() не работает с кириллицей)
-        search_lower = search.lower()
-        clients = [c for c in clients if search_lower in c.name.lower()]
+    """Получить список клиентов с опциональным поиском по имени.
+
+    С search — до limit лучших совпадений (client_search.py): сначала с начала имени, затем с начала
+    слова, затем остальные вхождения. Курсор к поиску не применяется.
+    """
+    if search and search.strip():
+        if cursor:
+            raise HTTPException(status_code=400, detail="cursor is not supported with search")
+        return client_search.search(db, search, limit)
+    limit = page_limit(limit, cursor)
+    columns = (models.Client.name, models.Client.id)
+    if limit is None:
+        return db.query(models.Client).order_by(*columns).all()
+    clients, next_cursor = keyset_page(db.query(models.Client), columns, lambda c: (c.name, c.id), limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return clients
 
 
@@ -46,15 +71,110 @@ def create_client(
     """Создать нового клиента."""
     client = models.Client(name=data.name)
     db.add(client)
+    db.flush()
+    add_audit_log(db, user, "CREATE", "clients", client.id, details=f"name={client.name}")
     db.commit()
     db.refresh(client)
-    try:
-        write_audit_log(db, user, "CREATE", "clients", client.id, details=f"name={client.name}")
-    except Exception:
-        pass
     return client
 
 
+_MAX_BULK_NAMES = 10_000
+_MAX_CSV_BYTES = 5 * 1024 * 1024
+_CSV_HEADERS = {"name", "имя", "фио", "клиент"}
+
+
+def _names_from_csv(data: bytes) -> list[str]:
+    """Имена из первой колонки CSV (разделитель , ; или табуляция; UTF-8 или cp1251 из Excel)."""
+    try:
+        content = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        content = data.decode("cp1251")
+    try:
+        dialect = csv.Sniffer().sniff(content[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    rows = [row for row in csv.reader(io.StringIO(content), dialect) if row and row[0].strip()]
+    if rows and rows[0][0].strip().casefold() in _CSV_HEADERS:
+        rows = rows[1:]
+    return [row[0] for row in rows]
+
+
+def _bulk_create(db: Session, names: list[str], dry_run: bool, source: str, user: str | None) -> schemas.ClientBulkOut:
+    """Добавить новых клиентов одним executemany; совпадения по нормализованному имени пропускаются."""
+    pending: dict[str, str] = {}
+    duplicates: list[str] = []
+    for raw in names:
+        name = " ".join(raw.split())
+        key = client_search.normalize(name)
+        if not key:
+            continue
+        if key in pending:
+            duplicates.append(name)
+        else:
+            pending[key] = name
+    existing_keys: set[str] = set()
+    keys = list(pending)
+    for start in range(0, len(keys), 500):
+        existing_keys.update(
+            db.execute(select(models.Client.name_search).where(models.Client.name_search.in_(keys[start:start + 500]))).scalars()
+        )
+    rows = [{"name": name, "name_search": key} for key, name in pending.items() if key not in existing_keys]
+    existing = [name for key, name in pending.items() if key in existing_keys]
+    if rows and not dry_run:
+        db.execute(insert(models.Client.__table__), rows)
+        add_audit_log(
+            db, user, "CREATE", "clients", None,
+            details=f"bulk import ({source}): created={len(rows)}; existing={len(existing)}; duplicates={len(duplicates)}",
+        )
+        db.commit()
+    return schemas.ClientBulkOut(
+        dryRun=dry_run,
+        received=len(names),
+        created=len(rows),
+        skipped=len(existing) + len(duplicates),
+        existing=existing,
+        duplicates=duplicates,
+    )
+
+
+@router.post("/bulk", response_model=schemas.ClientBulkOut)
+async def create_clients_bulk(
+    request: Request,
+    dry_run: bool = Query(default=False, description="Только посчитать (для CSV; в JSON — поле dryRun)"),
+    db: Session = Depends(get_db),
+    user: str | None = Depends(get_remote_user),
+):
+    """Массовое добавление клиентов одной транзакцией.
+
+    Тело — JSON `{"names": [...], "dryRun": false}` или multipart/form-data с CSV-файлом в поле `file`
+    (имя — первая колонка, строка заголовка пропускается). Имена, совпадающие с существующими клиентами
+    или друг с другом после нормализации (регистр, ё, пробелы), пропускаются. В журнал — одна сводная запись.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="CSV file is expected in the 'file' field")
+        data = await upload.read(_MAX_CSV_BYTES + 1)
+        if len(data) > _MAX_CSV_BYTES:
+            raise HTTPException(status_code=400, detail=f"CSV file must not exceed {_MAX_CSV_BYTES // (1024 * 1024)} MB")
+        names, source = _names_from_csv(data), "csv"
+    else:
+        try:
+            payload = schemas.ClientBulkCreate.model_validate_json(await request.body())
+        except ValidationError as e:
+            # Тот же ответ 422, что и при обычной валидации тела
+            raise RequestValidationError(e.errors(include_url=False))
+        names, source, dry_run = payload.names, "json", payload.dryRun
+    if not names:
+        raise HTTPException(status_code=400, detail="No client names found")
+    if len(names) > _MAX_BULK_NAMES:
+        raise HTTPException(status_code=400, detail=f"At most {_MAX_BULK_NAMES} names per request")
+    # Работа с БД синхронная — вне цикла событий
+    return await run_in_threadpool(_bulk_create, db, names, dry_run, source, user)
+
+
 @router.put("/{client_id}", response_model=schemas.ClientOut)
 def update_client(
     client_id: int,
@@ -69,16 +189,13 @@ def update_client(
     old_name = client.name
     if data.name is not None:
         client.name = data.name
-    db.commit()
-    db.refresh(client)
     changes = []
     if client.name != old_name:
         changes.append(f"name: {old_name} -> {client.name}")
     details = "; ".join(changes) if changes else None
-    try:
-        write_audit_log(db, user, "UPDATE", "clients", client.id, details=details)
-    except Exception:
-        pass
+    add_audit_log(db, user, "UPDATE", "clients", client.id, details=details)
+    db.commit()
+    db.refresh(client)
     return client
 
 
@@ -94,10 +211,7 @@ def delete_client(
         raise HTTPException(status_code=404, detail="Client not found")
     del_details = f"name={client.name}"
     db.delete(client)
+    add_audit_log(db, user, "DELETE", "clients", client_id, details=del_details)
     db.commit()
-    try:
-        write_audit_log(db, user, "DELETE", "clients", client_id, details=del_details)
-    except Exception:
-        pass
     return None
 
@@ -1,7 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from sqlalchemy import text
 from sqlalchemy.exc import OperationalError
-from ..db import engine
+from sqlalchemy.orm import Session
+from ..audit_writer import audit_writer
+from ..db import engine, get_db
+from ..resource_index import resource_index, unique_tag_value_ids
 
 router = APIRouter()
 
@@ -16,3 +19,20 @@ def health():
         return {"status": "degraded"}
 
 
+@router.get("/health/resource-index")
+def resource_index_health(db: Session = Depends(get_db)):
+    # Сверка индекса занятости уникальных ресурсов с БД (при расхождении индекс перестраивается)
+    resource_index.warm_up(db, unique_tag_value_ids(db))
+    mismatched = resource_index.check_consistency(db)
+    return {
+        "status": "ok" if not mismatched else "rebuilt",
+        "mismatchedTagValueIds": mismatched,
+        **resource_index.stats(),
+    }
+
+
+@router.get("/health/audit")
+def audit_writer_health():
+    # Очередь фоновой записи аудита и время записи пачек
+    stats = audit_writer.stats()
+    return {"status": "ok" if not stats["spooled"] else "spooled", **stats}
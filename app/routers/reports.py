@@ -0,0 +1,200 @@
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ..db import get_db
+from .. import models, schemas
+from ..intervals import overlaps
+from ..recurrence import expand
+from ..resource_index import unique_tag_value_ids
+from ..tag_rules import tag_rules
+from ..utilization import BINS, MAX_BINS, Binning, compute, utilization_cache
+from ..versions import SCHEDULES, TAGS, get_versions
+from ..utils import etag_matches, json_response, make_etag, parse_id_list, parse_iso_or_400, tag_filter_groups
+
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+
+# Измерение → имя колонки в ответе
+DIMENSIONS = {"day": "day", "week": "week", "tag": "tagId", "tagValue": "tagValueId"}
+
+_MS_PER_HOUR = 3_600_000
+
+
+def _parse_group_by(raw: str) -> list[str]:
+    dims = [d for d in (x.strip() for x in raw.split(",")) if d]
+    unknown = [d for d in dims if d not in DIMENSIONS]
+    if unknown or not dims:
+        raise HTTPException(status_code=400, detail=f"group_by: expected comma-separated {', '.join(DIMENSIONS)}")
+    if "tag" in dims and "tagValue" in dims:
+        raise HTTPException(status_code=400, detail="group_by: use either tag or tagValue")
+    # Порядок колонок фиксированный, независимо от порядка в запросе
+    return [d for d in DIMENSIONS if d in dims]
+
+
+def _day_key(ms: int) -> str:
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=ms)).date().isoformat()
+
+
+def _week_key(ms: int) -> str:
+    # Понедельник недели (время студии хранится как UTC «на стене»)
+    day = (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=ms)).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+@router.get("/summary", response_model=schemas.ReportSummaryOut)
+def report_summary(
+    from_: str = Query(..., alias="from"),
+    to: str = Query(...),
+    tag_value_ids: str | None = None,
+    group_by: str = "day",
+    tag_ids: str | None = Query(None, description="Для tag/tagValue: только эти теги"),
+    include_canceled: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Число событий и сумма часов в окне [from, to), сгруппированные в SQLite (GROUP BY).
+
+    Фильтр tag_value_ids — как в GET /api/schedules (И между тегами, ИЛИ внутри тега). Событие
+    относится к дню/неделе своего начала; при группировке по тегу/значению событие без значений
+    выбранных тегов в строки не попадает, но учитывается в totalCount/totalHours.
+    """
+    window = (parse_iso_or_400(from_, "from"), parse_iso_or_400(to, "to"))
+    dims = _parse_group_by(group_by)
+    ids = parse_id_list(tag_value_ids)
+    groups = tag_filter_groups(db, ids) if ids else []
+    only_tag_ids = parse_id_list(tag_ids)
+
+    s = models.Schedule
+    stv = models.ScheduleTagValue
+    conditions = [overlaps(*window)]
+    if not include_canceled:
+        conditions.append(s.is_canceled == False)
+    for value_ids in groups:
+        conditions.append(s.id.in_(select(stv.schedule_id).where(stv.tag_value_id.in_(value_ids))))
+
+    duration = s.ts_to - s.ts_from
+    totals = db.execute(select(func.count(s.id), func.coalesce(func.sum(duration), 0)).where(*conditions)).one()
+
+    columns = []
+    for dim in dims:
+        if dim == "day":
+            columns.append(func.date(s.ts_from / 1000, "unixepoch"))
+        elif dim == "week":
+            columns.append(func.date(s.ts_from / 1000, "unixepoch", "weekday 0", "-6 days"))
+    q = select(*columns).select_from(s)
+    if "tag" in dims or "tagValue" in dims:
+        # Пары (событие, тег/значение) без повторов — чтобы событие с двумя значениями одного тега
+        # учитывалось в группе тега один раз
+        if "tagValue" in dims:
+            pairs = select(stv.schedule_id, stv.tag_value_id.label("key")).join(
+                models.TagValue, models.TagValue.id == stv.tag_value_id
+            )
+        else:
+            pairs = select(stv.schedule_id, models.TagValue.tag_id.label("key")).join(
+                models.TagValue, models.TagValue.id == stv.tag_value_id
+            ).distinct()
+        if only_tag_ids:
+            pairs = pairs.where(models.TagValue.tag_id.in_(only_tag_ids))
+        pairs = pairs.subquery()
+        q = q.add_columns(pairs.c.key).join(pairs, pairs.c.schedule_id == s.id)
+        columns.append(pairs.c.key)
+    q = q.add_columns(func.count(s.id), func.sum(duration)).where(*conditions).group_by(*columns)
+
+    agg: dict[tuple, list[int]] = {}
+    for *key, count, total_ms in db.execute(q):
+        agg[tuple(key)] = [count, total_ms or 0]
+    total_count, total_ms = int(totals[0]), int(totals[1])
+
+    # Вхождения серий вычисляются, а не хранятся — добавляем их к агрегату в Python
+    tag_of_value: dict[int, int] = {}
+    if "tag" in dims or "tagValue" in dims:
+        tag_of_value = tag_rules.get(db).tag_of_value
+    for occ in expand(db, *window, include_canceled=include_canceled):
+        if not all(occ.tag_value_ids.intersection(value_ids) for value_ids in groups):
+            continue
+        length = occ.end - occ.start
+        total_count += 1
+        total_ms += length
+        base: list = []
+        for dim in dims:
+            if dim == "day":
+                base.append(_day_key(occ.start))
+            elif dim == "week":
+                base.append(_week_key(occ.start))
+        keys: list[tuple] = [tuple(base)]
+        if "tagValue" in dims:
+            keys = [
+                (*base, v) for v in occ.tag_value_ids if not only_tag_ids or tag_of_value.get(v) in only_tag_ids
+            ]
+        elif "tag" in dims:
+            tags = {tag_of_value.get(v) for v in occ.tag_value_ids} - {None}
+            keys = [(*base, t) for t in tags if not only_tag_ids or t in only_tag_ids]
+        for key in keys:
+            acc = agg.setdefault(key, [0, 0])
+            acc[0] += 1
+            acc[1] += length
+
+    return schemas.ReportSummaryOut(
+        groupBy=dims,
+        columns=[DIMENSIONS[d] for d in dims] + ["count", "hours"],
+        rows=[[*key, count, round(ms / _MS_PER_HOUR, 2)] for key, (count, ms) in sorted(agg.items())],
+        totalCount=total_count,
+        totalHours=round(total_ms / _MS_PER_HOUR, 2),
+    )
+
+
+_MS_PER_MINUTE = 60_000
+
+
+@router.get("/utilization", response_model=schemas.UtilizationOut)
+def report_utilization(
+    from_: str = Query(..., alias="from"),
+    to: str = Query(...),
+    tag_value_ids: str | None = Query(None, description="Ресурсы; по умолчанию — все значения уникальных тегов"),
+    bin: str = Query("hourOfWeek", description="hourOfWeek (168 корзин, окно сворачивается по неделям), hour или day"),
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+):
+    """Занятость ресурсов по корзинам времени: матрица минут «ресурс × корзина» и ёмкость корзин.
+
+    Отменённые события не учитываются, вхождения серий — учитываются. Результат кэшируется
+    до следующей записи расписаний или тегов; повторный запрос получает 304 по ETag.
+    """
+    window = (parse_iso_or_400(from_, "from"), parse_iso_or_400(to, "to"))
+    if window[1] <= window[0]:
+        raise HTTPException(status_code=400, detail="to must be later than from")
+    if bin not in BINS:
+        raise HTTPException(status_code=400, detail=f"bin: expected one of {', '.join(BINS)}")
+    binning = Binning(bin, *window)
+    if binning.size > MAX_BINS:
+        raise HTTPException(status_code=400, detail=f"Too many bins ({binning.size} > {MAX_BINS}); use a coarser bin")
+    versions = get_versions(db, [SCHEDULES, TAGS])
+    ids = sorted(set(parse_id_list(tag_value_ids)))
+    etag = make_etag(versions[SCHEDULES], versions[TAGS], window, bin, ids)
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    key = (window, bin, tuple(ids))
+    cache_versions = (versions[SCHEDULES], versions[TAGS])
+    body = utilization_cache.get(cache_versions, key)
+    if body is None:
+        if ids:
+            if tag_rules.get(db).unknown_values(ids):
+                raise HTTPException(status_code=400, detail="Some tagValueIds not found")
+        else:
+            ids = sorted(unique_tag_value_ids(db))
+        capacity, occupied = compute(db, binning, ids)
+        body = {
+            "bin": bin,
+            "from": from_,
+            "to": to,
+            "binCount": binning.size,
+            "tagValueIds": ids,
+            "capacityMinutes": [ms // _MS_PER_MINUTE for ms in capacity],
+            "occupiedMinutes": [[ms // _MS_PER_MINUTE for ms in occupied[value_id]] for value_id in ids],
+        }
+        utilization_cache.put(cache_versions, key, body)
+    return json_response(body, headers=cache_headers)
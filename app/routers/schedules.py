@@ -1,18 +1,233 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import or_, and_, text
+import asyncio
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterator
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Session
-from ..db import get_db
+from ..db import get_db, engine, SessionLocal
 from .. import models, schemas
-from ..utils import get_remote_user, write_audit_log
+from ..change_feed import RESYNC, change_feed
+from ..intervals import overlaps, setup_interval_index, sweep_overlaps
+from ..pagination import MAX_LIMIT, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, page_limit
+from ..recurrence import SeriesOccurrence, expand, find_occurrence_conflict
+from ..resource_index import IntervalIndex, Occupancy, resource_index, unique_tag_value_ids
+from ..schedule_ops import MoveResult, clone_schedules, ids_summary, shift_schedules
+from ..tag_rules import tag_rules
+from ..versions import SCHEDULES, TAGS, bump_version, get_version, get_versions
+from ..utils import (
+    add_audit_log,
+    conflict_detail,
+    epoch_ms_to_iso,
+    etag_matches,
+    get_remote_user,
+    json_response,
+    make_etag,
+    parse_id_list,
+    parse_iso_or_400,
+    tag_filter_groups,
+)
 
 
 router = APIRouter(prefix="/schedules", tags=["schedules"])
 
 
-def _intersects(a_from: str, a_to: str, b_from: str, b_to: str) -> bool:
-    # Пересечение по полуоткрытым интервалам: [from, to)
-    # Не пересекаются, если один заканчивается в момент начала другого
-    return not (a_to <= b_from or a_from >= b_to)
+@router.on_event("startup")
+def _migrate_schedules():
+    # Мягкая миграция: нормализованные границы интервала (epoch мс) + интервальный индекс
+    for col in ("ts_from", "ts_to"):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE schedules ADD COLUMN {col} INTEGER NULL"))
+        except Exception:
+            pass
+    # Версии строк для дельта-синхронизации (GET /schedules/changes)
+    for table in ("schedules", "schedule_series"):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN row_version INTEGER NULL"))
+        except Exception:
+            pass
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_schedules_row_version ON schedules (row_version)"))
+    setup_interval_index(engine)
+    # Прогрев индекса занятости уникальных ресурсов
+    with SessionLocal() as db:
+        resource_index.warm_up(db, unique_tag_value_ids(db))
+
+
+def _occupancy(sched: models.Schedule) -> Occupancy:
+    return Occupancy(
+        ts_from=sched.ts_from,
+        ts_to=sched.ts_to,
+        tag_value_ids=frozenset(tv.id for tv in sched.tag_values),
+        is_canceled=sched.is_canceled,
+    )
+
+
+def _conflict_detail(db: Session, conflict_id: int) -> str:
+    existing = db.get(models.Schedule, conflict_id)
+    return conflict_detail(existing.title, existing.date_from, existing.date_to)
+
+
+def _occurrence_conflict_detail(occ: SeriesOccurrence) -> str:
+    return conflict_detail(occ.title, epoch_ms_to_iso(occ.start), epoch_ms_to_iso(occ.end), recurring=True)
+
+
+def _raise_conflict(db: Session, conflict_id: int) -> None:
+    raise HTTPException(status_code=400, detail=_conflict_detail(db, conflict_id))
+
+
+def _schedule_out(sched: models.Schedule) -> schemas.ScheduleOut:
+    return schemas.ScheduleOut(
+        id=sched.id,
+        title=sched.title,
+        dateFrom=sched.date_from,
+        dateTo=sched.date_to,
+        tagValueIds=[tv.id for tv in sched.tag_values],
+        isCanceled=sched.is_canceled,
+        contact=sched.contact,
+    )
+
+
+def _publish(
+    version: int,
+    action: str,
+    schedules: list[schemas.ScheduleOut] = (),
+    removed: list[tuple[int, str, str]] = (),
+) -> None:
+    """Событие ленты изменений: затронутые id, интервалы (старые и новые) и актуальные строки."""
+    current = [out.model_dump() for out in schedules]
+    ids = sorted({sid for sid, _, _ in removed} | {r["id"] for r in current})
+    change_feed.publish({
+        "version": version,
+        "action": action,
+        "ids": ids,
+        "ranges": [{"id": sid, "dateFrom": f, "dateTo": t} for sid, f, t in removed]
+        + [{"id": r["id"], "dateFrom": r["dateFrom"], "dateTo": r["dateTo"]} for r in current],
+        "schedules": current,
+    })
+
+
+def _schedule_rows(
+    db: Session,
+    window: tuple[int, int] | None,
+    groups: list[list[int]],
+    after_id: int | None = None,
+    limit: int | None = None,
+    changed_since: int | None = None,
+) -> list[dict]:
+    """Расписания вместе с id значений тегов одним агрегирующим запросом (без ORM-объектов)."""
+    stv = models.ScheduleTagValue
+    q = (
+        select(
+            models.Schedule.id,
+            models.Schedule.title,
+            models.Schedule.date_from,
+            models.Schedule.date_to,
+            models.Schedule.is_canceled,
+            models.Schedule.contact,
+            func.group_concat(stv.tag_value_id),
+        )
+        .outerjoin(stv, stv.schedule_id == models.Schedule.id)
+        .group_by(models.Schedule.id)
+        .order_by(models.Schedule.id)
+    )
+    if window is not None:
+        # Пересечение диапазонов (полуоткрытые интервалы) по нормализованным границам через интервальный индекс
+        q = q.where(overlaps(*window))
+    for value_ids in groups:
+        q = q.where(models.Schedule.id.in_(select(stv.schedule_id).where(stv.tag_value_id.in_(value_ids))))
+    if after_id is not None:
+        q = q.where(models.Schedule.id > after_id)
+    if changed_since is not None:
+        q = q.where(models.Schedule.row_version > changed_since)
+    if limit is not None:
+        q = q.limit(limit)
+    return [
+        {
+            "id": sid,
+            "title": title,
+            "dateFrom": date_from,
+            "dateTo": date_to,
+            "tagValueIds": [int(x) for x in tv_ids.split(",")] if tv_ids else [],
+            "isCanceled": bool(is_canceled),
+            "contact": contact,
+            "seriesId": None,
+        }
+        for sid, title, date_from, date_to, is_canceled, contact, tv_ids in db.execute(q)
+    ]
+
+
+def _occurrence_rows(db: Session, window: tuple[int, int], groups: list[list[int]]) -> list[dict]:
+    """Вхождения серий в окне — разворачиваются на лету, в БД не хранятся. Порядок — по (seriesId, dateFrom)."""
+    rows: list[dict] = []
+    for occ in sorted(expand(db, *window), key=lambda o: (o.series_id, o.start)):
+        if not all(occ.tag_value_ids.intersection(value_ids) for value_ids in groups):
+            continue
+        rows.append({
+            "id": None,
+            "title": occ.title,
+            "dateFrom": epoch_ms_to_iso(occ.start),
+            "dateTo": epoch_ms_to_iso(occ.end),
+            "tagValueIds": sorted(occ.tag_value_ids),
+            "isCanceled": occ.is_canceled,
+            "contact": occ.contact,
+            "seriesId": occ.series_id,
+        })
+    return rows
+
+
+# Ключ порядка строк списка: события — (0, id, ""), за ними вхождения серий — (1, seriesId, dateFrom).
+# Курсор — ключ последней отданной строки.
+_FIRST_PAGE = (0, 0, "")
+
+
+def _row_key(row: dict) -> tuple[int, int, str]:
+    if row["id"] is not None:
+        return (0, row["id"], "")
+    return (1, row["seriesId"], row["dateFrom"])
+
+
+def _decode_list_cursor(cursor: str) -> tuple[int, int, str]:
+    kind, key_id, date_from = decode_cursor(cursor, 3)
+    if kind not in (0, 1) or not isinstance(key_id, int) or not isinstance(date_from, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return kind, key_id, date_from
+
+
+def schedule_page(
+    db: Session,
+    window: tuple[int, int] | None,
+    groups: list[list[int]],
+    limit: int | None = None,
+    after: tuple[int, int, str] = _FIRST_PAGE,
+) -> tuple[list[dict], str | None]:
+    """Строки GET /api/schedules (события и вхождения серий окна) и курсор следующей страницы.
+
+    Строки идут в порядке _row_key: события по id, затем вхождения по (seriesId, dateFrom); страница —
+    не больше limit строк после ключа after. Тело ответа без разбора параметров и условного GET —
+    его же вызывает scripts/bench_list_schedules.py.
+    """
+    rows: list[dict] = []
+    if after[0] == 0:
+        # На одну строку больше, чтобы узнать, есть ли следующая
+        rows = _schedule_rows(db, window, groups, after[1] or None, limit + 1 if limit is not None else None)
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(_row_key(rows[-1]))
+    if window is not None:
+        # Серии разворачиваются только для запрошенного окна; вхождения страницы — после курсора
+        occurrences = [r for r in _occurrence_rows(db, window, groups) if _row_key(r) > after]
+        room = None if limit is None else limit - len(rows)
+        if room is not None and len(occurrences) > room:
+            rows.extend(occurrences[:room])
+            return rows, encode_cursor(_row_key(rows[-1]))
+        rows.extend(occurrences)
+    return rows, None
 
 
 @router.get("", response_model=list[schemas.ScheduleOut])
@@ -20,113 +235,622 @@ def list_schedules(
     from_: str | None = Query(None, alias="from"),
     to: str | None = None,
     tag_value_ids: str | None = None,
+    limit: int | None = Query(None, ge=1, le=MAX_LIMIT),
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
     db: Session = Depends(get_db),
 ):
-    q = db.query(models.Schedule)
-    if from_ and to:
-        # Храним как строки ISO; фильтруем по пересечению диапазонов (полуоткрытые интервалы)
-        q = q.filter(~(models.Schedule.date_to <= from_), ~(models.Schedule.date_from >= to))
-    if tag_value_ids:
-        ids = [int(x) for x in tag_value_ids.split(",") if x]
-        if ids:
-            # Группируем выбранные значения по тегу и требуем наличие хотя бы одного
-            # значения из каждой группы (И между группами, ИЛИ внутри группы)
-            selected_values = (
-                db.query(models.TagValue)
-                .filter(models.TagValue.id.in_(ids))
-                .all()
-            )
-            tag_id_to_value_ids: dict[int, list[int]] = {}
-            for tv in selected_values:
-                tag_id_to_value_ids.setdefault(tv.tag_id, []).append(tv.id)
-            for value_ids in tag_id_to_value_ids.values():
-                q = q.filter(models.Schedule.tag_values.any(models.TagValue.id.in_(value_ids)))
-    rows = q.all()
-    result: list[schemas.ScheduleOut] = []
-    for s in rows:
-        result.append(
-            schemas.ScheduleOut(
-                id=s.id,
-                title=s.title,
-                dateFrom=s.date_from,
-                dateTo=s.date_to,
-                tagValueIds=[tv.id for tv in s.tag_values],
-                isCanceled=s.is_canceled,
-                contact=s.contact,
+    window = (parse_iso_or_400(from_, "from"), parse_iso_or_400(to, "to")) if from_ and to else None
+    ids = parse_id_list(tag_value_ids)
+    limit = page_limit(limit, cursor)
+    after = _decode_list_cursor(cursor) if cursor else _FIRST_PAGE
+    # Условный GET: ETag зависит только от версий данных и параметров — без обращения к таблицам расписаний
+    versions = get_versions(db, [SCHEDULES, TAGS])
+    etag = make_etag(versions[SCHEDULES], versions[TAGS], window, sorted(set(ids)), limit, cursor)
+    cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+    groups = tag_filter_groups(db, ids) if ids else []
+    rows, next_cursor = schedule_page(db, window, groups, limit, after)
+    if next_cursor:
+        cache_headers[NEXT_CURSOR_HEADER] = next_cursor
+    # Отдаём JSON напрямую: строки уже имеют форму ScheduleOut, повторная валидация не нужна
+    return json_response(rows, headers=cache_headers)
+
+
+_EXPORT_CHUNK = 500
+_EXPORT_COLUMNS = ["id", "seriesId", "title", "dateFrom", "dateTo", "isCanceled", "contact", "tags"]
+
+
+def _finish_export_record(record: dict) -> dict:
+    pairs = sorted(zip(record["tags"], record["tagValueIds"]), key=lambda p: (p[0]["tag"], p[0]["value"]))
+    record["tags"] = [t for t, _ in pairs]
+    record["tagValueIds"] = [i for _, i in pairs]
+    return record
+
+
+def _export_records(db: Session, window: tuple[int, int] | None, groups: list[list[int]]) -> Iterator[list[dict]]:
+    """Пачки записей экспорта: одно соединение schedules → значения → теги, курсор читается по частям.
+
+    Строки упорядочены по id события, поэтому значения тегов одного события идут подряд и
+    склеиваются без накопления всей выборки; внутри события теги сортируются по имени.
+    """
+    s = models.Schedule
+    stv = models.ScheduleTagValue
+    q = (
+        select(
+            s.id, s.title, s.date_from, s.date_to, s.is_canceled, s.contact,
+            models.TagValue.id, models.Tag.name, models.TagValue.value,
+        )
+        .outerjoin(stv, stv.schedule_id == s.id)
+        .outerjoin(models.TagValue, models.TagValue.id == stv.tag_value_id)
+        .outerjoin(models.Tag, models.Tag.id == models.TagValue.tag_id)
+        # Только по id (порядок rowid) — без сортировки всей выборки во временном B-дереве
+        .order_by(s.id)
+        .execution_options(yield_per=_EXPORT_CHUNK)
+    )
+    if window is not None:
+        q = q.where(overlaps(*window))
+    for value_ids in groups:
+        q = q.where(s.id.in_(select(stv.schedule_id).where(stv.tag_value_id.in_(value_ids))))
+
+    current: dict | None = None
+    chunk: list[dict] = []
+    for partition in db.execute(q).partitions():
+        for sid, title, date_from, date_to, is_canceled, contact, tv_id, tag_name, value in partition:
+            if current is None or current["id"] != sid:
+                if current is not None:
+                    chunk.append(_finish_export_record(current))
+                current = {
+                    "id": sid,
+                    "seriesId": None,
+                    "title": title,
+                    "dateFrom": date_from,
+                    "dateTo": date_to,
+                    "isCanceled": bool(is_canceled),
+                    "contact": contact,
+                    "tagValueIds": [],
+                    "tags": [],
+                }
+            if tv_id is not None:
+                current["tagValueIds"].append(tv_id)
+                current["tags"].append({"tag": tag_name, "value": value})
+        if chunk:
+            yield chunk
+            chunk = []
+    if current is not None:
+        yield [_finish_export_record(current)]
+
+    if window is not None:
+        # Вхождения серий окна (их немного: по одному на шаг правила) — отдельной пачкой в конце
+        names = {
+            tv_id: {"tag": tag_name, "value": value}
+            for tv_id, tag_name, value in db.execute(
+                select(models.TagValue.id, models.Tag.name, models.TagValue.value)
+                .join(models.Tag, models.Tag.id == models.TagValue.tag_id)
+                .order_by(models.Tag.name, models.TagValue.value)
             )
+        }
+        rows = [
+            {
+                "id": None,
+                "seriesId": row["seriesId"],
+                "title": row["title"],
+                "dateFrom": row["dateFrom"],
+                "dateTo": row["dateTo"],
+                "isCanceled": row["isCanceled"],
+                "contact": row["contact"],
+                "tagValueIds": [i for i in names if i in row["tagValueIds"]],
+                "tags": [names[i] for i in names if i in row["tagValueIds"]],
+            }
+            for row in _occurrence_rows(db, window, groups)
+        ]
+        for start in range(0, len(rows), _EXPORT_CHUNK):
+            yield rows[start:start + _EXPORT_CHUNK]
+
+
+def _export_csv(chunks: Iterator[list[dict]]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM — чтобы Excel открыл UTF-8 с кириллицей без мастера импорта
+    buf.write("\ufeff")
+    writer.writerow(_EXPORT_COLUMNS)
+    for chunk in chunks:
+        for r in chunk:
+            writer.writerow([
+                r["id"] if r["id"] is not None else "",
+                r["seriesId"] if r["seriesId"] is not None else "",
+                r["title"],
+                r["dateFrom"],
+                r["dateTo"],
+                int(r["isCanceled"]),
+                r["contact"] or "",
+                "; ".join(f"{t['tag']}: {t['value']}" for t in r["tags"]),
+            ])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    tail = buf.getvalue()
+    if tail:
+        yield tail
+
+
+def _export_ndjson(chunks: Iterator[list[dict]]) -> Iterator[str]:
+    for chunk in chunks:
+        yield "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in chunk)
+
+
+@router.get("/export")
+def export_schedules(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    from_: str | None = Query(None, alias="from"),
+    to: str | None = None,
+    tag_value_ids: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """Потоковая выгрузка расписаний (CSV или NDJSON) с именами тегов; память не зависит от размера окна."""
+    window = (parse_iso_or_400(from_, "from"), parse_iso_or_400(to, "to")) if from_ and to else None
+    ids = parse_id_list(tag_value_ids)
+    groups = tag_filter_groups(db, ids) if ids else []
+
+    def body() -> Iterator[str]:
+        # Сессия запроса закрывается до отправки ответа — для потока открываем свою
+        stream_db = SessionLocal()
+        try:
+            chunks = _export_records(stream_db, window, groups)
+            yield from (_export_csv(chunks) if format == "csv" else _export_ndjson(chunks))
+        finally:
+            stream_db.close()
+
+    if format == "csv":
+        media_type, filename = "text/csv; charset=utf-8", "schedules.csv"
+    else:
+        media_type, filename = "application/x-ndjson", "schedules.ndjson"
+    return StreamingResponse(
+        body(), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+_STREAM_POLL_SECONDS = 2.0
+_STREAM_HEARTBEAT_SECONDS = 15.0
+
+
+def _current_versions() -> dict[str, int]:
+    db = SessionLocal()
+    try:
+        return get_versions(db, [SCHEDULES, TAGS])
+    finally:
+        db.close()
+
+
+def _sse(event: dict) -> str:
+    head = f"id: {event['version']}\n" if event.get("version") is not None else ""
+    return head + "data: " + json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n\n"
+
+
+@router.get("/stream")
+async def stream_schedule_changes(request: Request):
+    """Server-Sent Events: изменения расписаний по мере коммита (create/update/cancel/delete, series, resync)."""
+    queue = change_feed.subscribe()
+    seen = await run_in_threadpool(_current_versions)
+
+    async def events() -> AsyncIterator[str]:
+        nonlocal seen
+        ahead: dict[str, int] | None = None
+        idle = 0.0
+        try:
+            # Начальная версия — отправная точка для GET /schedules/changes после переподключения
+            yield "retry: 3000\n" + _sse({"action": "hello", "version": seen[SCHEDULES]})
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=_STREAM_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    # Изменения не через эту ленту (другой воркер, скрипт, теги) видны только по версиям.
+                    # Ждём два опроса подряд: локальная публикация идёт чуть позже коммита.
+                    current = await run_in_threadpool(_current_versions)
+                    if any(current[k] > seen[k] for k in current):
+                        if ahead == current:
+                            seen, ahead = current, None
+                            yield _sse({"action": RESYNC, "version": current[SCHEDULES]})
+                        else:
+                            ahead = current
+                    else:
+                        ahead = None
+                    idle += _STREAM_POLL_SECONDS
+                    if idle >= _STREAM_HEARTBEAT_SECONDS:
+                        idle = 0.0
+                        yield ": ping\n\n"
+                    continue
+                idle = 0.0
+                version = event.get("version")
+                yield _sse(event)
+                if version is not None:
+                    if version > seen[SCHEDULES] + 1 and event["action"] != RESYNC:
+                        # Между нашими публикациями были чужие изменения
+                        yield _sse({"action": RESYNC, "version": version})
+                    seen[SCHEDULES] = max(seen[SCHEDULES], version)
+        finally:
+            change_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+_CHANGES_LIMIT = 1000
+
+
+@router.get("/changes", response_model=schemas.ScheduleChangesOut)
+def schedule_changes(since: int = Query(..., ge=0), db: Session = Depends(get_db)):
+    """Дельта-синхронизация: события, созданные/изменённые и удалённые после версии since.
+
+    Клиент применяет сначала deleted, затем schedules (id удалённого события SQLite может выдать повторно).
+    """
+    version = get_version(db, SCHEDULES)
+    if since > version:
+        # Версия не из этой БД (восстановление из копии и т.п.)
+        return schemas.ScheduleChangesOut(version=version, resync=True)
+    if since == version:
+        return schemas.ScheduleChangesOut(version=version)
+    rows = _schedule_rows(db, None, [], limit=_CHANGES_LIMIT + 1, changed_since=since)
+    tomb = models.ScheduleTombstone
+    deleted = db.execute(
+        select(tomb.schedule_id, tomb.date_from, tomb.date_to, tomb.version)
+        .where(tomb.version > since, ~select(models.Schedule.id).where(models.Schedule.id == tomb.schedule_id).exists())
+        .order_by(tomb.version)
+        .limit(_CHANGES_LIMIT + 1)
+    ).all()
+    if len(rows) + len(deleted) > _CHANGES_LIMIT:
+        return schemas.ScheduleChangesOut(version=version, resync=True)
+    series_changed = db.scalar(
+        select(
+            select(models.ScheduleSeries.id).where(models.ScheduleSeries.row_version > since).exists()
+            | select(models.ScheduleSeriesTombstone.series_id).where(models.ScheduleSeriesTombstone.version > since).exists()
         )
-    return result
+    )
+    return schemas.ScheduleChangesOut(
+        version=version,
+        schedules=rows,
+        deleted=[
+            schemas.ScheduleDeletedOut(id=sid, dateFrom=date_from, dateTo=date_to, version=v)
+            for sid, date_from, date_to, v in deleted
+        ],
+        seriesChanged=bool(series_changed),
+    )
 
 
 @router.post("", response_model=schemas.ScheduleOut)
 def create_schedule(data: schemas.ScheduleCreate, db: Session = Depends(get_db), user: str | None = Depends(get_remote_user)):
-    if data.dateTo < data.dateFrom:
+    ts_from = parse_iso_or_400(data.dateFrom, "dateFrom")
+    ts_to = parse_iso_or_400(data.dateTo, "dateTo")
+    if ts_to < ts_from:
         raise HTTPException(status_code=400, detail="dateTo must be >= dateFrom")
-    sched = models.Schedule(title=data.title, date_from=data.dateFrom, date_to=data.dateTo, contact=data.contact)
-    selected_tag_values: list[models.TagValue] = []
-    if data.tagValueIds:
-        selected_tag_values = db.query(models.TagValue).filter(models.TagValue.id.in_(data.tagValueIds)).all()
-        if len(selected_tag_values) != len(set(data.tagValueIds)):
-            raise HTTPException(status_code=400, detail="Some tagValueIds not found")
+    sched = models.Schedule(
+        title=data.title,
+        date_from=data.dateFrom,
+        date_to=data.dateTo,
+        ts_from=ts_from,
+        ts_to=ts_to,
+        contact=data.contact,
+    )
+    # Правила тегов — из кэша (версия сверяется с БД), без запросов к tags
+    rules = tag_rules.get(db)
+    value_ids = set(data.tagValueIds or [])
+    if rules.unknown_values(value_ids):
+        raise HTTPException(status_code=400, detail="Some tagValueIds not found")
 
     # 1) Проверка: указаны все required теги
-    required_tags = db.query(models.Tag).filter(models.Tag.required == True).all()
-    if required_tags:
-        tag_id_to_selected_value_ids: dict[int, list[int]] = {}
-        for tv in selected_tag_values:
-            tag_id_to_selected_value_ids.setdefault(tv.tag_id, []).append(tv.id)
-        missing_tag_names = [t.name for t in required_tags if t.id not in tag_id_to_selected_value_ids]
-        if missing_tag_names:
-            raise HTTPException(status_code=400, detail=f"Missing required tags: {', '.join(missing_tag_names)}")
+    missing_tag_names = rules.missing_required(value_ids)
+    if missing_tag_names:
+        raise HTTPException(status_code=400, detail=f"Missing required tags: {', '.join(missing_tag_names)}")
 
     # 2) Проверка: уникальные ресурсы не пересекаются по времени (игнорируя отменённые события)
-    unique_tags = db.query(models.Tag).filter(models.Tag.unique_resource == True).all()
-    if unique_tags and selected_tag_values:
-        # сгруппировать выбранные значения по тегу
-        tag_id_to_values: dict[int, list[models.TagValue]] = {}
-        for tv in selected_tag_values:
-            tag_id_to_values.setdefault(tv.tag_id, []).append(tv)
-        unique_tag_ids = {t.id for t in unique_tags}
-        for tag_id in unique_tag_ids:
-            t_values = tag_id_to_values.get(tag_id, [])
-            if not t_values:
-                continue
-            # для каждого значения проверяем пересечения с уже существующими расписаниями
-            value_ids = [tv.id for tv in t_values]
-            # найти существующие события, у которых есть одно из value_ids и которые пересекаются по времени
-            existing = (
-                db.query(models.Schedule)
-                .join(models.Schedule.tag_values)
-                .filter(
-                    models.TagValue.id.in_(value_ids),
-                    ~(models.Schedule.date_to <= data.dateFrom),
-                    ~(models.Schedule.date_from >= data.dateTo),
-                    models.Schedule.is_canceled == False,
-                )
-                .first()
-            )
-            if existing:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Пересечение с событием \"{existing.title}\" (с {existing.date_from} по {existing.date_to})",
-                )
+    uniq_value_ids = rules.unique_values(value_ids)
+    if uniq_value_ids:
+        # пересечения ищем в индексе занятости ресурсов (в памяти), а не join-запросом
+        conflict_id = resource_index.find_conflict(db, uniq_value_ids, ts_from, ts_to)
+        if conflict_id is not None:
+            _raise_conflict(db, conflict_id)
+        occ = find_occurrence_conflict(db, uniq_value_ids, ts_from, ts_to)
+        if occ is not None:
+            raise HTTPException(status_code=400, detail=_occurrence_conflict_detail(occ))
 
-    sched.tag_values = selected_tag_values
+    if value_ids:
+        sched.tag_values = db.query(models.TagValue).filter(models.TagValue.id.in_(value_ids)).all()
     db.add(sched)
+    version = bump_version(db, SCHEDULES)
+    sched.row_version = version
+    db.flush()
+    add_audit_log(db, user, "CREATE", "schedules", sched.id, details=f"title={sched.title}; from={sched.date_from}; to={sched.date_to}")
     db.commit()
     db.refresh(sched)
-    try:
-        write_audit_log(db, user, "CREATE", "schedules", sched.id, details=f"title={sched.title}; from={sched.date_from}; to={sched.date_to}")
-    except Exception:
-        pass
-    return schemas.ScheduleOut(
-        id=sched.id,
-        title=sched.title,
-        dateFrom=sched.date_from,
-        dateTo=sched.date_to,
-        tagValueIds=[tv.id for tv in sched.tag_values],
-        isCanceled=sched.is_canceled,
-        contact=sched.contact,
+    resource_index.apply(version, [(sched.id, None, _occupancy(sched))])
+    out = _schedule_out(sched)
+    _publish(version, "create", [out])
+    return out
+
+
+@router.post("/bulk", response_model=schemas.ScheduleBulkOut)
+def create_schedules_bulk(data: schemas.ScheduleBulkCreate, db: Session = Depends(get_db), user: str | None = Depends(get_remote_user)):
+    """Пакетное создание событий (копирование, повторы) одной транзакцией.
+
+    Правила required / unique_resource проверяются для каждого элемента — как против БД,
+    так и против предыдущих элементов пакета.
+    """
+    all_value_ids = {i for item in data.items for i in (item.tagValueIds or [])}
+    tag_values_by_id: dict[int, models.TagValue] = {}
+    if all_value_ids:
+        tag_values_by_id = {
+            tv.id: tv for tv in db.query(models.TagValue).filter(models.TagValue.id.in_(all_value_ids)).all()
+        }
+    rules = tag_rules.get(db)
+
+    results: list[schemas.ScheduleBulkItemResult] = []
+    accepted: list[tuple[int, models.Schedule]] = []
+    # Занятость ресурсов уже принятыми элементами пакета (id элемента — отрицательный индекс)
+    batch_trees: dict[int, IntervalIndex] = {}
+    for index, item in enumerate(data.items):
+        try:
+            ts_from = parse_iso_or_400(item.dateFrom, "dateFrom")
+            ts_to = parse_iso_or_400(item.dateTo, "dateTo")
+            if ts_to < ts_from:
+                raise HTTPException(status_code=400, detail="dateTo must be >= dateFrom")
+            value_ids = set(item.tagValueIds or [])
+            if not value_ids <= tag_values_by_id.keys():
+                raise HTTPException(status_code=400, detail="Some tagValueIds not found")
+            selected = [tag_values_by_id[i] for i in value_ids]
+            missing = rules.missing_required(value_ids)
+            if missing:
+                raise HTTPException(status_code=400, detail=f"Missing required tags: {', '.join(missing)}")
+            uniq_value_ids = rules.unique_values(value_ids)
+            conflict_id = resource_index.find_conflict(db, uniq_value_ids, ts_from, ts_to)
+            if conflict_id is not None:
+                raise HTTPException(status_code=400, detail=_conflict_detail(db, conflict_id))
+            occ = find_occurrence_conflict(db, uniq_value_ids, ts_from, ts_to)
+            if occ is not None:
+                raise HTTPException(status_code=400, detail=_occurrence_conflict_detail(occ))
+            for value_id in uniq_value_ids:
+                tree = batch_trees.get(value_id)
+                clash = tree.overlapping(ts_from, ts_to) if tree else []
+                if clash:
+                    raise HTTPException(status_code=400, detail=f"Пересечение с элементом пакета #{-max(clash) - 1}")
+        except HTTPException as e:
+            results.append(schemas.ScheduleBulkItemResult(index=index, status="error", error=e.detail))
+            continue
+        for value_id in uniq_value_ids:
+            batch_trees.setdefault(value_id, IntervalIndex()).add(-index - 1, ts_from, ts_to)
+        sched = models.Schedule(
+            title=item.title,
+            date_from=item.dateFrom,
+            date_to=item.dateTo,
+            ts_from=ts_from,
+            ts_to=ts_to,
+            contact=item.contact,
+            is_canceled=False,
+        )
+        sched.tag_values = selected
+        accepted.append((index, sched))
+        results.append(schemas.ScheduleBulkItemResult(index=index, status="created"))
+
+    failed = len(data.items) - len(accepted)
+    if failed and data.atomic:
+        for r in results:
+            if r.status == "created":
+                r.status = "skipped"
+        return schemas.ScheduleBulkOut(created=0, failed=failed, results=results)
+
+    if accepted:
+        version = bump_version(db, SCHEDULES)
+        for _, sched in accepted:
+            sched.row_version = version
+        db.add_all(sched for _, sched in accepted)
+        db.flush()
+        for _, sched in accepted:
+            add_audit_log(db, user, "CREATE", "schedules", sched.id, details=f"title={sched.title}; from={sched.date_from}; to={sched.date_to}; bulk")
+        by_index = {index: sched for index, sched in accepted}
+        for r in results:
+            sched = by_index.get(r.index)
+            if sched is not None:
+                r.schedule = _schedule_out(sched)
+        changes = [(sched.id, None, _occupancy(sched)) for _, sched in accepted]
+        db.commit()
+        resource_index.apply(version, changes)
+        _publish(version, "create", [r.schedule for r in results if r.schedule is not None])
+    return schemas.ScheduleBulkOut(created=len(accepted), failed=failed, results=results)
+
+
+def _move_out(result: MoveResult, dry_run: bool, applied: bool) -> schemas.ScheduleShiftOut:
+    return schemas.ScheduleShiftOut(
+        dryRun=dry_run,
+        matched=len(result.ids),
+        shifted=len(result.ids) if applied else 0,
+        ids=result.ids,
+        conflicts=[
+            schemas.MoveConflictOut(
+                id=c.schedule_id,
+                tagValueId=c.tag_value_id,
+                dateFrom=epoch_ms_to_iso(c.ts_from),
+                dateTo=epoch_ms_to_iso(c.ts_to),
+                sourceId=result.sources.get(c.schedule_id),
+                conflictId=c.other_id,
+                seriesId=c.series_id,
+            )
+            for c in result.conflicts
+        ],
+    )
+
+
+def _finish_move(db: Session, result: MoveResult, dry_run: bool, user: str | None, action: str, details: str) -> bool:
+    """Закоммитить массовую операцию (с одной сводной записью аудита) или откатить её; True — применена."""
+    if dry_run or (result.conflicts and not result.skipped) or not result.ids:
+        db.rollback()
+        return False
+    add_audit_log(db, user, action, "schedules", None, details=details)
+    db.commit()
+    # Индекс занятости перестроится лениво; подписчики догоняют изменения через /schedules/changes
+    resource_index.invalidate()
+    change_feed.publish({"action": RESYNC, "version": result.version})
+    return True
+
+
+@router.post("/shift", response_model=schemas.ScheduleShiftOut)
+def shift_schedules_range(data: schemas.ScheduleShiftRequest, db: Session = Depends(get_db), user: str | None = Depends(get_remote_user)):
+    """Сдвинуть события окна на offsetMinutes одним UPDATE с проверкой пересечений в той же транзакции.
+
+    При пересечениях уникальных ресурсов ничего не меняется — ответ содержит список пересечений.
+    """
+    window = (parse_iso_or_400(data.dateFrom, "dateFrom"), parse_iso_or_400(data.dateTo, "dateTo"))
+    if window[1] <= window[0]:
+        raise HTTPException(status_code=400, detail="dateTo must be later than dateFrom")
+    if data.offsetMinutes == 0:
+        raise HTTPException(status_code=400, detail="offsetMinutes must not be 0")
+    rules = tag_rules.get(db)
+    if rules.unknown_values(data.tagValueIds):
+        raise HTTPException(status_code=400, detail="Some tagValueIds not found")
+    groups = tag_filter_groups(db, data.tagValueIds) if data.tagValueIds else []
+    result = shift_schedules(db, data.offsetMinutes * 60_000, window, groups, set(rules.unique_values(rules.tag_of_value)))
+    details = (
+        f"shift {data.offsetMinutes:+d} min: {len(result.ids)} events; from={data.dateFrom}; to={data.dateTo}; "
+        f"tag_value_ids={sorted(data.tagValueIds)}; ids={ids_summary(result.ids)}"
+    )
+    applied = _finish_move(db, result, data.dryRun, user, "UPDATE", details)
+    return _move_out(result, data.dryRun, applied)
+
+
+@router.post("/clone-range", response_model=schemas.ScheduleCloneOut)
+def clone_schedule_range(data: schemas.ScheduleCloneRequest, db: Session = Depends(get_db), user: str | None = Depends(get_remote_user)):
+    """Скопировать события окна (шаблонную неделю) на несколько сдвигов вперёд одной транзакцией.
+
+    Копии вставляются INSERT … SELECT вместе со значениями тегов; пересечения уникальных ресурсов
+    проверяются для всех копий сразу. onConflict=skip — пересекающиеся копии не создаются.
+    """
+    window = (parse_iso_or_400(data.dateFrom, "dateFrom"), parse_iso_or_400(data.dateTo, "dateTo"))
+    if window[1] <= window[0]:
+        raise HTTPException(status_code=400, detail="dateTo must be later than dateFrom")
+    if 0 in data.offsetsMinutes or len(set(data.offsetsMinutes)) != len(data.offsetsMinutes):
+        raise HTTPException(status_code=400, detail="offsetsMinutes must be distinct and non-zero")
+    rules = tag_rules.get(db)
+    if rules.unknown_values(data.tagValueIds):
+        raise HTTPException(status_code=400, detail="Some tagValueIds not found")
+    groups = tag_filter_groups(db, data.tagValueIds) if data.tagValueIds else []
+    result = clone_schedules(
+        db,
+        [m * 60_000 for m in data.offsetsMinutes],
+        window,
+        groups,
+        set(rules.unique_values(rules.tag_of_value)),
+        include_canceled=data.includeCanceled,
+        skip_conflicts=data.onConflict == "skip",
+    )
+    details = (
+        f"clone from={data.dateFrom}; to={data.dateTo}; offsets_min={data.offsetsMinutes}; "
+        f"tag_value_ids={sorted(data.tagValueIds)}; created={len(result.ids)}; skipped={len(result.skipped)}; "
+        f"ids={ids_summary(result.ids)}"
+    )
+    applied = _finish_move(db, result, data.dryRun, user, "CREATE", details)
+    return schemas.ScheduleCloneOut(
+        dryRun=data.dryRun,
+        created=len(result.ids) if applied else 0,
+        skipped=len(result.skipped),
+        ids=result.ids if applied or data.dryRun else [],
+        conflicts=_move_out(result, data.dryRun, applied).conflicts,
+    )
+
+
+@router.post("/conflicts", response_model=schemas.ConflictCheckOut)
+def check_conflicts(data: schemas.ConflictCheckRequest, db: Session = Depends(get_db)):
+    """Пред-проверка плана (копирование, перетаскивание): все пересечения уникальных ресурсов
+    для всех кандидатов одним запросом к БД и одним проходом заметающей прямой по каждому ресурсу."""
+    requested_ids = {i for c in data.candidates for i in c.tagValueIds}
+    unique_value_ids = set(tag_rules.get(db).unique_values(requested_ids))
+
+    bounds: list[tuple[int, int]] = []
+    for index, c in enumerate(data.candidates):
+        ts_from = parse_iso_or_400(c.dateFrom, f"candidates[{index}].dateFrom")
+        ts_to = parse_iso_or_400(c.dateTo, f"candidates[{index}].dateTo")
+        if ts_to < ts_from:
+            raise HTTPException(status_code=400, detail=f"candidates[{index}]: dateTo must be >= dateFrom")
+        bounds.append((ts_from, ts_to))
+
+    # Кандидаты и существующие события по ресурсам
+    per_resource_candidates: dict[int, list[tuple[int, int, int]]] = {}
+    for index, c in enumerate(data.candidates):
+        for value_id in set(c.tagValueIds) & unique_value_ids:
+            per_resource_candidates.setdefault(value_id, []).append((*bounds[index], index))
+    per_resource_existing: dict[int, list[tuple[int, int, int]]] = {}
+    events: dict[int, tuple[str, str, str]] = {}
+    occurrences: list[SeriesOccurrence] = []
+    if per_resource_candidates:
+        stv = models.ScheduleTagValue
+        q = (
+            select(
+                stv.tag_value_id,
+                models.Schedule.id,
+                models.Schedule.ts_from,
+                models.Schedule.ts_to,
+                models.Schedule.title,
+                models.Schedule.date_from,
+                models.Schedule.date_to,
+            )
+            .join(stv, stv.schedule_id == models.Schedule.id)
+            .where(
+                stv.tag_value_id.in_(per_resource_candidates.keys()),
+                models.Schedule.is_canceled == False,
+                overlaps(min(b[0] for b in bounds), max(b[1] for b in bounds)),
+            )
+        )
+        if data.excludeScheduleId is not None:
+            q = q.where(models.Schedule.id != data.excludeScheduleId)
+        for value_id, sid, ts_from, ts_to, title, date_from, date_to in db.execute(q):
+            per_resource_existing.setdefault(value_id, []).append((ts_from, ts_to, sid))
+            events[sid] = (title, date_from, date_to)
+        # Вхождения серий — с отрицательными ключами, чтобы не пересекаться с id расписаний
+        occurrences = expand(
+            db,
+            min(b[0] for b in bounds),
+            max(b[1] for b in bounds),
+            tag_value_ids=per_resource_candidates.keys(),
+            include_canceled=False,
+        )
+        for n, occ in enumerate(occurrences):
+            for value_id in occ.tag_value_ids & per_resource_candidates.keys():
+                per_resource_existing.setdefault(value_id, []).append((occ.start, occ.end, -n - 1))
+
+    conflicts: dict[tuple[int, int], list[int]] = {}
+    between: dict[int, set[int]] = {}
+    for value_id, cands in per_resource_candidates.items():
+        with_existing, with_candidates = sweep_overlaps(per_resource_existing.get(value_id, []), cands)
+        for index, sid in with_existing:
+            if data.candidates[index].excludeScheduleId != sid:
+                conflicts.setdefault((index, sid), []).append(value_id)
+        for a, b in with_candidates:
+            between.setdefault(a, set()).add(b)
+            between.setdefault(b, set()).add(a)
+
+    results = [
+        schemas.CandidateConflictsOut(index=index, conflicts=[], candidateIndexes=sorted(between.get(index, ())))
+        for index in range(len(data.candidates))
+    ]
+    for (index, sid), value_ids in sorted(conflicts.items()):
+        if sid < 0:
+            occ = occurrences[-sid - 1]
+            event = schemas.ConflictEventOut(
+                id=None,
+                seriesId=occ.series_id,
+                title=occ.title,
+                dateFrom=epoch_ms_to_iso(occ.start),
+                dateTo=epoch_ms_to_iso(occ.end),
+                tagValueIds=sorted(value_ids),
+            )
+        else:
+            title, date_from, date_to = events[sid]
+            event = schemas.ConflictEventOut(id=sid, title=title, dateFrom=date_from, dateTo=date_to, tagValueIds=sorted(value_ids))
+        results[index].conflicts.append(event)
+    return schemas.ConflictCheckOut(
+        hasConflicts=any(r.conflicts or r.candidateIndexes for r in results),
+        results=results,
     )
 
 
@@ -142,60 +866,51 @@ def update_schedule(id: int, data: schemas.ScheduleUpdate, db: Session = Depends
     old_is_canceled = sched.is_canceled
     old_tag_ids = [tv.id for tv in sched.tag_values]
     old_contact = sched.contact
+    old_occupancy = _occupancy(sched)
     # Сформируем итоговые значения после обновления (не применяя к БД до валидаций)
     new_title = data.title if data.title is not None else sched.title
     new_from = data.dateFrom if data.dateFrom is not None else sched.date_from
     new_to = data.dateTo if data.dateTo is not None else sched.date_to
     new_is_canceled = data.isCanceled if data.isCanceled is not None else sched.is_canceled
     new_contact = data.contact if data.contact is not None else sched.contact
-    if new_to < new_from:
+    new_ts_from = parse_iso_or_400(new_from, "dateFrom")
+    new_ts_to = parse_iso_or_400(new_to, "dateTo")
+    if new_ts_to < new_ts_from:
         raise HTTPException(status_code=400, detail="dateTo must be >= dateFrom")
-    if data.tagValueIds is not None:
-        new_tag_values = db.query(models.TagValue).filter(models.TagValue.id.in_(data.tagValueIds)).all()
-        if len(new_tag_values) != len(set(data.tagValueIds)):
-            raise HTTPException(status_code=400, detail="Some tagValueIds not found")
-    else:
-        new_tag_values = list(sched.tag_values)
+    rules = tag_rules.get(db)
+    new_value_ids = set(data.tagValueIds) if data.tagValueIds is not None else set(old_tag_ids)
+    if rules.unknown_values(new_value_ids):
+        raise HTTPException(status_code=400, detail="Some tagValueIds not found")
 
     # Проверка required тегов
-    required_tags = db.query(models.Tag).filter(models.Tag.required == True).all()
-    if required_tags:
-        tag_ids_present = {tv.tag_id for tv in new_tag_values}
-        missing = [t.name for t in required_tags if t.id not in tag_ids_present]
-        if missing:
-            raise HTTPException(status_code=400, detail=f"Missing required tags: {', '.join(missing)}")
+    missing = rules.missing_required(new_value_ids)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required tags: {', '.join(missing)}")
 
     # Проверка уникальных ресурсов: пересечения по времени с другими событиями
-    unique_tags = db.query(models.Tag).filter(models.Tag.unique_resource == True).all()
-    if unique_tags and new_tag_values and not new_is_canceled:
-        unique_tag_ids = {t.id for t in unique_tags}
+    if not new_is_canceled:
         # значения по уникальным тегам
-        uniq_value_ids = [tv.id for tv in new_tag_values if tv.tag_id in unique_tag_ids]
+        uniq_value_ids = rules.unique_values(new_value_ids)
         if uniq_value_ids:
-            existing = (
-                db.query(models.Schedule)
-                .join(models.Schedule.tag_values)
-                .filter(
-                    models.Schedule.id != sched.id,
-                    models.TagValue.id.in_(uniq_value_ids),
-                    ~(models.Schedule.date_to <= new_from),
-                    ~(models.Schedule.date_from >= new_to),
-                    models.Schedule.is_canceled == False,
-                )
-                .first()
-            )
-            if existing:
-                raise HTTPException(status_code=400, detail=f"Пересечение с событием \"{existing.title}\" (с {existing.date_from} по {existing.date_to})")
+            conflict_id = resource_index.find_conflict(db, uniq_value_ids, new_ts_from, new_ts_to, exclude_id=sched.id)
+            if conflict_id is not None:
+                _raise_conflict(db, conflict_id)
+            occ = find_occurrence_conflict(db, uniq_value_ids, new_ts_from, new_ts_to)
+            if occ is not None:
+                raise HTTPException(status_code=400, detail=_occurrence_conflict_detail(occ))
 
     # Применяем обновления
     sched.title = new_title
     sched.date_from = new_from
     sched.date_to = new_to
-    sched.tag_values = new_tag_values
+    sched.ts_from = new_ts_from
+    sched.ts_to = new_ts_to
+    if data.tagValueIds is not None:
+        sched.tag_values = db.query(models.TagValue).filter(models.TagValue.id.in_(new_value_ids)).all()
     sched.is_canceled = new_is_canceled
     sched.contact = new_contact
-    db.commit()
-    db.refresh(sched)
+    version = bump_version(db, SCHEDULES)
+    sched.row_version = version
     # Сборка только изменившихся полей
     changes: list[str] = []
     if new_title != old_title:
@@ -214,19 +929,18 @@ def update_schedule(id: int, data: schemas.ScheduleUpdate, db: Session = Depends
     if sorted(new_tag_ids) != sorted(old_tag_ids):
         changes.append(f"tag_value_ids: {sorted(old_tag_ids)} -> {sorted(new_tag_ids)}")
     details = "; ".join(changes) if changes else None
-    try:
-        write_audit_log(db, user, "UPDATE", "schedules", sched.id, details=details)
-    except Exception:
-        pass
-    return schemas.ScheduleOut(
-        id=sched.id,
-        title=sched.title,
-        dateFrom=sched.date_from,
-        dateTo=sched.date_to,
-        tagValueIds=[tv.id for tv in sched.tag_values],
-        isCanceled=sched.is_canceled,
-        contact=sched.contact,
+    add_audit_log(db, user, "UPDATE", "schedules", sched.id, details=details)
+    db.commit()
+    db.refresh(sched)
+    resource_index.apply(version, [(sched.id, old_occupancy, _occupancy(sched))])
+    out = _schedule_out(sched)
+    _publish(
+        version,
+        "cancel" if new_is_canceled and not old_is_canceled else "update",
+        [out],
+        removed=[(sched.id, old_from, old_to)],
     )
+    return out
 
 
 @router.delete("/{id}", status_code=204)
@@ -235,12 +949,16 @@ def delete_schedule(id: int, db: Session = Depends(get_db), user: str | None = D
     if not sched:
         raise HTTPException(status_code=404, detail="Schedule not found")
     del_details = f"title={sched.title}; from={sched.date_from}; to={sched.date_to}"
+    old_occupancy = _occupancy(sched)
+    removed = [(id, sched.date_from, sched.date_to)]
     db.delete(sched)
+    version = bump_version(db, SCHEDULES)
+    # Надгробие: клиенты дельта-синхронизации узнают об удалении (GET /schedules/changes)
+    db.merge(models.ScheduleTombstone(schedule_id=id, version=version, date_from=removed[0][1], date_to=removed[0][2]))
+    add_audit_log(db, user, "DELETE", "schedules", id, details=del_details)
     db.commit()
-    try:
-        write_audit_log(db, user, "DELETE", "schedules", id, details=del_details)
-    except Exception:
-        pass
+    resource_index.apply(version, [(id, old_occupancy, None)])
+    _publish(version, "delete", removed=removed)
     return None
 
 
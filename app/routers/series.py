@@ -0,0 +1,247 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from ..db import get_db
+from .. import models, schemas
+from ..change_feed import change_feed
+from ..recurrence import Pattern, find_occurrence_conflict, find_series_conflict, parse_rrule
+from ..resource_index import resource_index
+from ..tag_rules import tag_rules
+from ..versions import SCHEDULES, bump_version
+from ..utils import add_audit_log, conflict_detail, epoch_ms_to_iso, get_remote_user, parse_iso_or_400
+
+
+router = APIRouter(prefix="/series", tags=["series"])
+
+
+def _series_out(series: models.ScheduleSeries) -> schemas.ScheduleSeriesOut:
+    return schemas.ScheduleSeriesOut(
+        id=series.id,
+        title=series.title,
+        dateFrom=series.date_from,
+        dateTo=series.date_to,
+        rrule=series.rrule,
+        tagValueIds=[tv.id for tv in series.tag_values],
+        isCanceled=series.is_canceled,
+        contact=series.contact,
+        exceptions=[
+            schemas.SeriesExceptionOut(occurrence=epoch_ms_to_iso(e.occurrence_ts), kind=e.kind)
+            for e in series.exceptions
+        ],
+    )
+
+
+def _validate(
+    db: Session,
+    date_from: str,
+    date_to: str,
+    rrule: str,
+    tag_value_ids: list[int],
+    is_canceled: bool,
+    exclude_series_id: int | None = None,
+) -> tuple[Pattern, list[models.TagValue]]:
+    ts_from = parse_iso_or_400(date_from, "dateFrom")
+    ts_to = parse_iso_or_400(date_to, "dateTo")
+    if ts_to < ts_from:
+        raise HTTPException(status_code=400, detail="dateTo must be >= dateFrom")
+    try:
+        pattern = Pattern(parse_rrule(rrule), ts_from, ts_to - ts_from)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid rrule: {e}")
+    if not pattern.is_occurrence(ts_from):
+        raise HTTPException(status_code=400, detail="dateFrom must match the rule (BYDAY/UNTIL)")
+
+    rules = tag_rules.get(db)
+    value_ids = set(tag_value_ids)
+    if rules.unknown_values(value_ids):
+        raise HTTPException(status_code=400, detail="Some tagValueIds not found")
+    missing = rules.missing_required(value_ids)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required tags: {', '.join(missing)}")
+
+    # Пересечения уникальных ресурсов — на всём протяжении серии, без материализации вхождений
+    if not is_canceled:
+        conflict = find_series_conflict(db, pattern, rules.unique_values(value_ids), exclude_series_id)
+        if conflict:
+            raise HTTPException(status_code=400, detail=conflict)
+    tag_values: list[models.TagValue] = []
+    if value_ids:
+        tag_values = db.query(models.TagValue).filter(models.TagValue.id.in_(value_ids)).all()
+    return pattern, tag_values
+
+
+def _commit(db: Session, series: models.ScheduleSeries, deleted: bool = False) -> None:
+    # Серии меняют занятость ресурсов и ответы GET /schedules — та же область версий
+    series_id = series.id
+    version = bump_version(db, SCHEDULES)
+    if deleted:
+        db.merge(models.ScheduleSeriesTombstone(series_id=series_id, version=version))
+    else:
+        series.row_version = version
+    db.commit()
+    resource_index.apply(version, [])
+    # Вхождения вычисляемые — подписчики ленты перезапрашивают окно
+    change_feed.publish({"version": version, "action": "series", "seriesId": series_id})
+
+
+@router.get("", response_model=list[schemas.ScheduleSeriesOut])
+def list_series(db: Session = Depends(get_db)):
+    """Список серий повторяющихся событий."""
+    return [_series_out(s) for s in db.query(models.ScheduleSeries).order_by(models.ScheduleSeries.id).all()]
+
+
+@router.get("/{series_id}", response_model=schemas.ScheduleSeriesOut)
+def get_series(series_id: int, db: Session = Depends(get_db)):
+    series = db.get(models.ScheduleSeries, series_id)
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return _series_out(series)
+
+
+@router.post("", response_model=schemas.ScheduleSeriesOut)
+def create_series(data: schemas.ScheduleSeriesCreate, db: Session = Depends(get_db), user: str | None = Depends(get_remote_user)):
+    """Создать серию: первое вхождение [dateFrom, dateTo) + правило повторения."""
+    pattern, tag_values = _validate(db, data.dateFrom, data.dateTo, data.rrule, data.tagValueIds or [], False)
+    series = models.ScheduleSeries(
+        title=data.title,
+        date_from=data.dateFrom,
+        date_to=data.dateTo,
+        ts_from=pattern.start,
+        ts_to=pattern.start + pattern.duration,
+        rrule=data.rrule,
+        until_ts=pattern.end_bound(),
+        is_canceled=False,
+        contact=data.contact,
+    )
+    series.tag_values = tag_values
+    db.add(series)
+    db.flush()
+    add_audit_log(db, user, "CREATE", "schedule_series", series.id,
+                  details=f"title={series.title}; from={series.date_from}; to={series.date_to}; rrule={series.rrule}")
+    _commit(db, series)
+    db.refresh(series)
+    return _series_out(series)
+
+
+@router.put("/{series_id}", response_model=schemas.ScheduleSeriesOut)
+def update_series(series_id: int, data: schemas.ScheduleSeriesUpdate, db: Session = Depends(get_db), user: str | None = Depends(get_remote_user)):
+    """Изменить серию целиком (все вхождения)."""
+    series = db.get(models.ScheduleSeries, series_id)
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found")
+    old = {
+        "title": series.title,
+        "date_from": series.date_from,
+        "date_to": series.date_to,
+        "rrule": series.rrule,
+        "is_canceled": series.is_canceled,
+        "contact": series.contact,
+        "tag_value_ids": sorted(tv.id for tv in series.tag_values),
+    }
+    new_from = data.dateFrom if data.dateFrom is not None else series.date_from
+    new_to = data.dateTo if data.dateTo is not None else series.date_to
+    new_rrule = data.rrule if data.rrule is not None else series.rrule
+    new_is_canceled = data.isCanceled if data.isCanceled is not None else series.is_canceled
+    tag_value_ids = data.tagValueIds if data.tagValueIds is not None else [tv.id for tv in series.tag_values]
+    pattern, tag_values = _validate(db, new_from, new_to, new_rrule, tag_value_ids, new_is_canceled, series.id)
+
+    if data.title is not None:
+        series.title = data.title
+    if data.contact is not None:
+        series.contact = data.contact
+    series.date_from = new_from
+    series.date_to = new_to
+    series.ts_from = pattern.start
+    series.ts_to = pattern.start + pattern.duration
+    series.rrule = new_rrule
+    series.until_ts = pattern.end_bound()
+    series.is_canceled = new_is_canceled
+    series.tag_values = tag_values
+    new = {
+        "title": series.title,
+        "date_from": series.date_from,
+        "date_to": series.date_to,
+        "rrule": series.rrule,
+        "is_canceled": series.is_canceled,
+        "contact": series.contact,
+        "tag_value_ids": sorted(tv.id for tv in series.tag_values),
+    }
+    changes = [f"title: {old['title']}"] + [f"{k}: {old[k]} -> {new[k]}" for k in old if old[k] != new[k]]
+    add_audit_log(db, user, "UPDATE", "schedule_series", series.id, details="; ".join(changes))
+    _commit(db, series)
+    db.refresh(series)
+    return _series_out(series)
+
+
+@router.delete("/{series_id}", status_code=204)
+def delete_series(series_id: int, db: Session = Depends(get_db), user: str | None = Depends(get_remote_user)):
+    series = db.get(models.ScheduleSeries, series_id)
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found")
+    del_details = f"title={series.title}; from={series.date_from}; rrule={series.rrule}"
+    db.delete(series)
+    add_audit_log(db, user, "DELETE", "schedule_series", series_id, details=del_details)
+    _commit(db, series, deleted=True)
+    return None
+
+
+@router.post("/{series_id}/exceptions", response_model=schemas.ScheduleSeriesOut)
+def add_series_exception(
+    series_id: int,
+    data: schemas.SeriesExceptionIn,
+    db: Session = Depends(get_db),
+    user: str | None = Depends(get_remote_user),
+):
+    """Исключить (skip) или отменить (cancel) одно вхождение серии."""
+    series = db.get(models.ScheduleSeries, series_id)
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found")
+    occurrence_ts = parse_iso_or_400(data.occurrence, "occurrence")
+    if not Pattern(parse_rrule(series.rrule), series.ts_from, series.ts_to - series.ts_from).is_occurrence(occurrence_ts):
+        raise HTTPException(status_code=400, detail="occurrence does not belong to the series")
+    exc = db.get(models.ScheduleSeriesException, (series_id, occurrence_ts))
+    if exc is None:
+        series.exceptions.append(models.ScheduleSeriesException(series_id=series_id, occurrence_ts=occurrence_ts, kind=data.kind))
+    else:
+        exc.kind = data.kind
+    add_audit_log(db, user, "UPDATE", "schedule_series", series_id,
+                  details=f"title={series.title}; exception {data.kind}: {epoch_ms_to_iso(occurrence_ts)}")
+    _commit(db, series)
+    db.refresh(series)
+    return _series_out(series)
+
+
+@router.delete("/{series_id}/exceptions", response_model=schemas.ScheduleSeriesOut)
+def remove_series_exception(
+    series_id: int,
+    occurrence: str = Query(..., description="Начало вхождения (ISO-8601)"),
+    db: Session = Depends(get_db),
+    user: str | None = Depends(get_remote_user),
+):
+    """Вернуть вхождение серии (снять skip/cancel) — с проверкой занятости ресурсов."""
+    series = db.get(models.ScheduleSeries, series_id)
+    if not series:
+        raise HTTPException(status_code=404, detail="Series not found")
+    occurrence_ts = parse_iso_or_400(occurrence, "occurrence")
+    exc = db.get(models.ScheduleSeriesException, (series_id, occurrence_ts))
+    if exc is None:
+        raise HTTPException(status_code=404, detail="Exception not found")
+    if not series.is_canceled:
+        uniq_value_ids = tag_rules.get(db).unique_values(tv.id for tv in series.tag_values)
+        occ_to = occurrence_ts + (series.ts_to - series.ts_from)
+        conflict_id = resource_index.find_conflict(db, uniq_value_ids, occurrence_ts, occ_to)
+        if conflict_id is not None:
+            existing = db.get(models.Schedule, conflict_id)
+            raise HTTPException(status_code=400, detail=conflict_detail(existing.title, existing.date_from, existing.date_to))
+        occ = find_occurrence_conflict(db, uniq_value_ids, occurrence_ts, occ_to, exclude_series_id=series_id)
+        if occ is not None:
+            raise HTTPException(
+                status_code=400,
+                detail=conflict_detail(occ.title, epoch_ms_to_iso(occ.start), epoch_ms_to_iso(occ.end), recurring=True),
+            )
+    kind = exc.kind
+    series.exceptions.remove(exc)
+    add_audit_log(db, user, "UPDATE", "schedule_series", series_id,
+                  details=f"title={series.title}; exception removed ({kind}): {epoch_ms_to_iso(occurrence_ts)}")
+    _commit(db, series)
+    db.refresh(series)
+    return _series_out(series)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db import get_db, engine, Base
 from .. import models, schemas
-from ..utils import get_remote_user, write_audit_log
+from ..utils import add_audit_log, get_remote_user
 
 
 router = APIRouter(prefix="/subscription-types", tags=["subscription_types"])
@@ -60,15 +60,12 @@ def create_subscription_type(
         duration_days=data.durationDays
     )
     db.add(sub_type)
+    db.flush()
+    add_audit_log(db, user, "CREATE", "subscription_types", sub_type.id,
+                  details=f"name={sub_type.name}; lessons={sub_type.lessons_count}; days={sub_type.duration_days}")
     db.commit()
     db.refresh(sub_type)
     
-    try:
-        write_audit_log(db, user, "CREATE", "subscription_types", sub_type.id,
-                        details=f"name={sub_type.name}; lessons={sub_type.lessons_count}; days={sub_type.duration_days}")
-    except Exception:
-        pass
-    
     return schemas.SubscriptionTypeOut(
         id=sub_type.id,
         name=sub_type.name,
@@ -107,9 +104,6 @@ def update_subscription_type(
     if data.durationDays is not None:
         sub_type.duration_days = data.durationDays
     
-    db.commit()
-    db.refresh(sub_type)
-    
     changes = []
     if sub_type.name != old_name:
         changes.append(f"name: {old_name} -> {sub_type.name}")
@@ -118,11 +112,10 @@ def update_subscription_type(
     if sub_type.duration_days != old_days:
         changes.append(f"days: {old_days} -> {sub_type.duration_days}")
     
-    try:
-        write_audit_log(db, user, "UPDATE", "subscription_types", sub_type.id,
-                        details="; ".join(changes) if changes else None)
-    except Exception:
-        pass
+    add_audit_log(db, user, "UPDATE", "subscription_types", sub_type.id,
+                  details="; ".join(changes) if changes else None)
+    db.commit()
+    db.refresh(sub_type)
     
     return schemas.SubscriptionTypeOut(
         id=sub_type.id,
@@ -145,12 +138,8 @@ def delete_subscription_type(
     
     del_details = f"name={sub_type.name}; lessons={sub_type.lessons_count}; days={sub_type.duration_days}"
     db.delete(sub_type)
+    add_audit_log(db, user, "DELETE", "subscription_types", type_id, details=del_details)
     db.commit()
     
-    try:
-        write_audit_log(db, user, "DELETE", "subscription_types", type_id, details=del_details)
-    except Exception:
-        pass
-    
     return None
 
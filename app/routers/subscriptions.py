@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from ..db import get_db, engine, Base
-from .. import models, schemas
-from ..utils import get_remote_user, write_audit_log
+from sqlalchemy import func, select, text
+from ..db import get_db, engine, Base, SessionLocal
+from .. import allocation, balances, models, schemas
+from ..pagination import MAX_LIMIT, NEXT_CURSOR_HEADER, keyset_page, order, page_limit
+from ..utils import add_audit_log, get_remote_user, parse_id_list
 
 
 router = APIRouter(prefix="/subscriptions", tags=["subscriptions"])
@@ -13,20 +14,42 @@ router = APIRouter(prefix="/subscriptions", tags=["subscriptions"])
 def _create_subscriptions_tables():
     """Создание таблиц для абонементов при запуске."""
     Base.metadata.create_all(bind=engine)
+    # create_all не добавляет индексы к уже существующим таблицам
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_purchases_client ON subscription_purchases(client_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_expenses_client ON subscription_expenses(client_id)"))
+    allocation.migrate(engine)
+    # Таблица остатков только что создана (её создаёт create_all любого роутера) — заполняем по истории
+    with SessionLocal() as db:
+        if balances.needs_rebuild(db):
+            balances.rebuild(db)
+            db.commit()
 
 
 # ============ Покупки (приходы) ============
 
 @router.get("/purchases", response_model=list[schemas.SubscriptionPurchaseOut])
 def list_purchases(
+    response: Response,
     client_id: int | None = Query(default=None, description="Фильтр по клиенту"),
+    limit: int | None = Query(default=None, ge=1, le=MAX_LIMIT, description="Размер страницы (без него — весь список)"),
+    cursor: str | None = Query(default=None, description="Курсор из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
     """Получить список покупок абонементов."""
     q = db.query(models.SubscriptionPurchase)
     if client_id:
         q = q.filter(models.SubscriptionPurchase.client_id == client_id)
-    purchases = q.order_by(models.SubscriptionPurchase.purchase_date.desc()).all()
+    # Новые сверху; id — для однозначного порядка при равных датах
+    columns = (models.SubscriptionPurchase.purchase_date, models.SubscriptionPurchase.id)
+    limit = page_limit(limit, cursor)
+    if limit is None:
+        purchases = q.order_by(*order(columns, descending=True)).all()
+    else:
+        purchases, next_cursor = keyset_page(q, columns, lambda x: (x.purchase_date, x.id), limit, cursor, descending=True)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    used = allocation.used_counts(db, [p.id for p in purchases])
     return [
         schemas.SubscriptionPurchaseOut(
             id=p.id,
@@ -34,7 +57,8 @@ def list_purchases(
             lessonsCount=p.lessons_count,
             purchaseDate=p.purchase_date,
             expiryDate=p.expiry_date,
-            comment=p.comment
+            comment=p.comment,
+            usedCount=used.get(p.id, 0)
         )
         for p in purchases
     ]
@@ -60,22 +84,23 @@ def create_purchase(
         comment=data.comment
     )
     db.add(purchase)
+    db.flush()
+    balances.purchase_added(db, purchase.client_id, purchase.lessons_count, purchase.expiry_date)
+    # Новая покупка может принять расходы начиная со дня покупки
+    allocation.reallocate(db, purchase.client_id, since=allocation.day(purchase.purchase_date))
+    add_audit_log(db, user, "CREATE", "subscription_purchases", purchase.id,
+                  details=f"client={client.name}; lessons={purchase.lessons_count}; comment={purchase.comment}")
     db.commit()
     db.refresh(purchase)
     
-    try:
-        write_audit_log(db, user, "CREATE", "subscription_purchases", purchase.id,
-                        details=f"client={client.name}; lessons={purchase.lessons_count}; comment={purchase.comment}")
-    except Exception:
-        pass
-    
     return schemas.SubscriptionPurchaseOut(
         id=purchase.id,
         clientId=purchase.client_id,
         lessonsCount=purchase.lessons_count,
         purchaseDate=purchase.purchase_date,
         expiryDate=purchase.expiry_date,
-        comment=purchase.comment
+        comment=purchase.comment,
+        usedCount=allocation.used_counts(db, [purchase.id]).get(purchase.id, 0)
     )
 
 
@@ -92,32 +117,33 @@ def update_purchase(
         raise HTTPException(status_code=404, detail="Purchase not found")
     
     old_values = f"lessons={purchase.lessons_count}; date={purchase.purchase_date}; expiry={purchase.expiry_date}; comment={purchase.comment}"
+    old_lessons, old_expiry, old_date = purchase.lessons_count, purchase.expiry_date, purchase.purchase_date
     
     purchase.lessons_count = data.lessonsCount
     purchase.purchase_date = data.purchaseDate
     purchase.expiry_date = data.expiryDate
     purchase.comment = data.comment
+    balances.purchase_removed(db, purchase.client_id, old_lessons, old_expiry)
+    balances.purchase_added(db, purchase.client_id, purchase.lessons_count, purchase.expiry_date)
+    # Расходы, списанные с покупки, не раньше её старой даты — пересчёт с меньшей из дат
+    allocation.reallocate(db, purchase.client_id, since=allocation.day(min(old_date, purchase.purchase_date)))
     
+    new_values = f"lessons={purchase.lessons_count}; date={purchase.purchase_date}; expiry={purchase.expiry_date}; comment={purchase.comment}"
+    client = db.get(models.Client, purchase.client_id)
+    client_name = client.name if client else "?"
+    add_audit_log(db, user, "UPDATE", "subscription_purchases", purchase_id,
+                  details=f"client={client_name}; old=[{old_values}]; new=[{new_values}]")
     db.commit()
     db.refresh(purchase)
     
-    new_values = f"lessons={purchase.lessons_count}; date={purchase.purchase_date}; expiry={purchase.expiry_date}; comment={purchase.comment}"
-    
-    try:
-        client = db.get(models.Client, purchase.client_id)
-        client_name = client.name if client else "?"
-        write_audit_log(db, user, "UPDATE", "subscription_purchases", purchase_id,
-                        details=f"client={client_name}; old=[{old_values}]; new=[{new_values}]")
-    except Exception:
-        pass
-    
     return schemas.SubscriptionPurchaseOut(
         id=purchase.id,
         clientId=purchase.client_id,
         lessonsCount=purchase.lessons_count,
         purchaseDate=purchase.purchase_date,
         expiryDate=purchase.expiry_date,
-        comment=purchase.comment
+        comment=purchase.comment,
+        usedCount=allocation.used_counts(db, [purchase.id]).get(purchase.id, 0)
     )
 
 
@@ -137,13 +163,11 @@ def delete_purchase(
     del_details = f"client={client_name}; lessons={purchase.lessons_count}; comment={purchase.comment}"
     
     db.delete(purchase)
+    balances.purchase_removed(db, purchase.client_id, purchase.lessons_count, purchase.expiry_date)
+    allocation.reallocate(db, purchase.client_id, since=allocation.day(purchase.purchase_date))
+    add_audit_log(db, user, "DELETE", "subscription_purchases", purchase_id, details=del_details)
     db.commit()
     
-    try:
-        write_audit_log(db, user, "DELETE", "subscription_purchases", purchase_id, details=del_details)
-    except Exception:
-        pass
-    
     return None
 
 
@@ -151,20 +175,32 @@ def delete_purchase(
 
 @router.get("/expenses", response_model=list[schemas.SubscriptionExpenseOut])
 def list_expenses(
+    response: Response,
     client_id: int | None = Query(default=None, description="Фильтр по клиенту"),
+    limit: int | None = Query(default=None, ge=1, le=MAX_LIMIT, description="Размер страницы (без него — весь список)"),
+    cursor: str | None = Query(default=None, description="Курсор из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
     """Получить список расходов."""
     q = db.query(models.SubscriptionExpense)
     if client_id:
         q = q.filter(models.SubscriptionExpense.client_id == client_id)
-    expenses = q.order_by(models.SubscriptionExpense.expense_date.desc()).all()
+    # Новые сверху; id — для однозначного порядка при равных датах
+    columns = (models.SubscriptionExpense.expense_date, models.SubscriptionExpense.id)
+    limit = page_limit(limit, cursor)
+    if limit is None:
+        expenses = q.order_by(*order(columns, descending=True)).all()
+    else:
+        expenses, next_cursor = keyset_page(q, columns, lambda x: (x.expense_date, x.id), limit, cursor, descending=True)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [
         schemas.SubscriptionExpenseOut(
             id=e.id,
             clientId=e.client_id,
             expenseDate=e.expense_date,
-            comment=e.comment
+            comment=e.comment,
+            purchaseId=e.purchase_id
         )
         for e in expenses
     ]
@@ -188,20 +224,20 @@ def create_expense(
         comment=data.comment
     )
     db.add(expense)
+    db.flush()
+    balances.expense_added(db, expense.client_id, expense.expense_date)
+    allocation.reallocate(db, expense.client_id, since=allocation.day(expense.expense_date))
+    add_audit_log(db, user, "CREATE", "subscription_expenses", expense.id,
+                  details=f"client={client.name}; date={expense.expense_date}; comment={expense.comment}")
     db.commit()
     db.refresh(expense)
     
-    try:
-        write_audit_log(db, user, "CREATE", "subscription_expenses", expense.id,
-                        details=f"client={client.name}; date={expense.expense_date}; comment={expense.comment}")
-    except Exception:
-        pass
-    
     return schemas.SubscriptionExpenseOut(
         id=expense.id,
         clientId=expense.client_id,
         expenseDate=expense.expense_date,
-        comment=expense.comment
+        comment=expense.comment,
+        purchaseId=expense.purchase_id
     )
 
 
@@ -221,18 +257,67 @@ def delete_expense(
     del_details = f"client={client_name}; date={expense.expense_date}; comment={expense.comment}"
     
     db.delete(expense)
+    balances.expense_removed(db, expense.client_id, expense.expense_date)
+    allocation.reallocate(db, expense.client_id, since=allocation.day(expense.expense_date))
+    add_audit_log(db, user, "DELETE", "subscription_expenses", expense_id, details=del_details)
     db.commit()
     
-    try:
-        write_audit_log(db, user, "DELETE", "subscription_expenses", expense_id, details=del_details)
-    except Exception:
-        pass
-    
     return None
 
 
 # ============ Баланс клиента ============
 
+@router.get("/balances", response_model=list[schemas.ClientBalanceSummaryOut])
+def list_balances(
+    client_ids: str | None = Query(None, description="ID клиентов через запятую (без него — все клиенты)"),
+    max_balance: int | None = Query(None, description="Только клиенты с остатком не больше N"),
+    min_balance: int | None = Query(None, description="Только клиенты с остатком не меньше N"),
+    with_purchases: bool = Query(False, description="Только клиенты, у которых были покупки"),
+    sort: str = Query("balance", pattern="^-?(balance|name)$", description="balance | -balance | name | -name"),
+    limit: int | None = Query(None, ge=1, le=MAX_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """Остатки занятий клиентов одним запросом: clients LEFT JOIN client_balances (app/balances.py).
+
+    Клиент без покупок и расходов (строки в client_balances нет) — с нулевым остатком.
+    """
+    c = models.Client
+    b = models.ClientBalance
+    ids = parse_id_list(client_ids)
+    total_purchased = func.coalesce(b.total_purchased, 0)
+    total_spent = func.coalesce(b.total_spent, 0)
+    balance = (total_purchased - total_spent).label("balance")
+    q = (
+        select(c.id, c.name, total_purchased, total_spent, balance, b.last_expiry_date, b.last_expense_date)
+        .outerjoin(b, b.client_id == c.id)
+    )
+    if ids:
+        q = q.where(c.id.in_(ids))
+    if with_purchases:
+        q = q.where(b.last_expiry_date.is_not(None))
+    if max_balance is not None:
+        q = q.where(balance <= max_balance)
+    if min_balance is not None:
+        q = q.where(balance >= min_balance)
+    descending = sort.startswith("-")
+    key = balance if sort.lstrip("-") == "balance" else c.name
+    q = q.order_by(key.desc() if descending else key, c.name, c.id)
+    if limit is not None:
+        q = q.limit(limit)
+    return [
+        schemas.ClientBalanceSummaryOut(
+            clientId=row[0],
+            clientName=row[1],
+            totalPurchased=int(row[2]),
+            totalSpent=int(row[3]),
+            balance=int(row[4]),
+            lastExpiryDate=row[5],
+            lastExpenseDate=row[6],
+        )
+        for row in db.execute(q)
+    ]
+
+
 @router.get("/balance/{client_id}", response_model=schemas.ClientBalanceOut)
 def get_client_balance(client_id: int, db: Session = Depends(get_db)):
     """Получить баланс клиента (остаток занятий)."""
@@ -240,15 +325,10 @@ def get_client_balance(client_id: int, db: Session = Depends(get_db)):
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Сумма всех купленных занятий
-    total_purchased = db.query(func.coalesce(func.sum(models.SubscriptionPurchase.lessons_count), 0)).filter(
-        models.SubscriptionPurchase.client_id == client_id
-    ).scalar()
-    
-    # Количество расходов (каждый = 1 занятие)
-    total_spent = db.query(func.count(models.SubscriptionExpense.id)).filter(
-        models.SubscriptionExpense.client_id == client_id
-    ).scalar()
+    # Остаток — одна строка client_balances по первичному ключу
+    row = db.get(models.ClientBalance, client_id)
+    total_purchased = row.total_purchased if row else 0
+    total_spent = row.total_spent if row else 0
     
     # Список покупок
     purchases = db.query(models.SubscriptionPurchase).filter(
@@ -260,12 +340,29 @@ def get_client_balance(client_id: int, db: Session = Depends(get_db)):
         models.SubscriptionExpense.client_id == client_id
     ).order_by(models.SubscriptionExpense.expense_date.desc()).all()
     
+    # Списания по покупкам (app/allocation.py): остаток действующих и просроченных покупок отдельно
+    used: dict[int, int] = {}
+    for e in expenses:
+        if e.purchase_id is not None:
+            used[e.purchase_id] = used.get(e.purchase_id, 0) + 1
+    today = allocation.today()
+    available = expired = 0
+    for p in purchases:
+        left = p.lessons_count - used.get(p.id, 0)
+        if allocation.day(p.expiry_date) >= today:
+            available += left
+        else:
+            expired += left
+    
     return schemas.ClientBalanceOut(
         clientId=client.id,
         clientName=client.name,
         totalPurchased=int(total_purchased),
         totalSpent=int(total_spent),
         balance=int(total_purchased) - int(total_spent),
+        availableLessons=available,
+        expiredLessons=expired,
+        unallocatedExpenses=sum(1 for e in expenses if e.purchase_id is None),
         purchases=[
             schemas.SubscriptionPurchaseOut(
                 id=p.id,
@@ -273,7 +370,8 @@ def get_client_balance(client_id: int, db: Session = Depends(get_db)):
                 lessonsCount=p.lessons_count,
                 purchaseDate=p.purchase_date,
                 expiryDate=p.expiry_date,
-                comment=p.comment
+                comment=p.comment,
+                usedCount=used.get(p.id, 0)
             )
             for p in purchases
         ],
@@ -282,7 +380,8 @@ def get_client_balance(client_id: int, db: Session = Depends(get_db)):
                 id=e.id,
                 clientId=e.client_id,
                 expenseDate=e.expense_date,
-                comment=e.comment
+                comment=e.comment,
+                purchaseId=e.purchase_id
             )
             for e in expenses
         ]
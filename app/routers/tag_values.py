@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db import get_db
 from .. import models, schemas
-from ..utils import get_remote_user, write_audit_log
+from ..versions import TAGS, bump_version, touch_schedules_with_values
+from ..utils import add_audit_log, get_remote_user
 
 
 router = APIRouter(prefix="/tags", tags=["tag_values"])
@@ -30,12 +31,11 @@ def create_tag_value(tag_id: int, data: schemas.TagValueCreate, db: Session = De
         raise HTTPException(status_code=400, detail="Value already exists for this tag")
     tv = models.TagValue(tag_id=tag_id, value=data.value, color=data.color)
     db.add(tv)
+    bump_version(db, TAGS)
+    db.flush()
+    add_audit_log(db, user, "CREATE", "tag_values", tv.id, details=f"tag_id={tag_id}; value={tv.value}; color={tv.color}")
     db.commit()
     db.refresh(tv)
-    try:
-        write_audit_log(db, user, "CREATE", "tag_values", tv.id, details=f"tag_id={tag_id}; value={tv.value}; color={tv.color}")
-    except Exception:
-        pass
     return tv
 
 
@@ -57,18 +57,16 @@ def update_tag_value(id: int, data: schemas.TagValueUpdate, db: Session = Depend
         tv.value = data.value
     if data.color is not None:
         tv.color = data.color
-    db.commit()
-    db.refresh(tv)
+    bump_version(db, TAGS)
     changes: list[str] = []
     if tv.value != old_value:
         changes.append(f"value: {old_value} -> {tv.value}")
     if tv.color != old_color:
         changes.append(f"color: {old_color} -> {tv.color}")
     details = "; ".join(changes) if changes else None
-    try:
-        write_audit_log(db, user, "UPDATE", "tag_values", tv.id, details=details)
-    except Exception:
-        pass
+    add_audit_log(db, user, "UPDATE", "tag_values", tv.id, details=details)
+    db.commit()
+    db.refresh(tv)
     return tv
 
 
@@ -78,12 +76,12 @@ def delete_tag_value(id: int, db: Session = Depends(get_db), user: str | None =
     if not tv:
         raise HTTPException(status_code=404, detail="Tag value not found")
     del_details = f"tag_id={tv.tag_id}; value={tv.value}; color={tv.color}"
+    # Расписания теряют это значение — для дельта-синхронизации они считаются изменёнными
+    touch_schedules_with_values(db, [id])
     db.delete(tv)
+    bump_version(db, TAGS)
+    add_audit_log(db, user, "DELETE", "tag_values", id, details=del_details)
     db.commit()
-    try:
-        write_audit_log(db, user, "DELETE", "tag_values", id, details=del_details)
-    except Exception:
-        pass
     return None
 
 
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db import get_db, engine, Base
-from sqlalchemy import text
+from sqlalchemy import select, text
 from .. import models, schemas
-from ..utils import get_remote_user, write_audit_log
+from ..versions import TAGS, bump_version, touch_schedules_with_values
+from ..utils import add_audit_log, get_remote_user
 
 
 router = APIRouter(prefix="/tags", tags=["tags"])
@@ -55,12 +56,11 @@ def create_tag(data: schemas.TagCreate, db: Session = Depends(get_db), user: str
         raise HTTPException(status_code=400, detail="Tag with this name already exists")
     tag = models.Tag(name=data.name, required=data.required, unique_resource=data.unique_resource)
     db.add(tag)
+    bump_version(db, TAGS)
+    db.flush()
+    add_audit_log(db, user, "CREATE", "tags", tag.id, details=f"name={tag.name}; required={tag.required}; unique_resource={tag.unique_resource}")
     db.commit()
     db.refresh(tag)
-    try:
-        write_audit_log(db, user, "CREATE", "tags", tag.id, details=f"name={tag.name}; required={tag.required}; unique_resource={tag.unique_resource}")
-    except Exception:
-        pass
     return tag
 
 
@@ -82,8 +82,7 @@ def update_tag(tag_id: int, data: schemas.TagUpdate, db: Session = Depends(get_d
         tag.required = data.required
     if hasattr(data, "unique_resource") and data.unique_resource is not None:
         tag.unique_resource = data.unique_resource
-    db.commit()
-    db.refresh(tag)
+    bump_version(db, TAGS)
     changes: list[str] = []
     if tag.name != old_name:
         changes.append(f"name: {old_name} -> {tag.name}")
@@ -92,10 +91,9 @@ def update_tag(tag_id: int, data: schemas.TagUpdate, db: Session = Depends(get_d
     if tag.unique_resource != old_unique:
         changes.append(f"unique_resource: {old_unique} -> {tag.unique_resource}")
     details = "; ".join(changes) if changes else None
-    try:
-        write_audit_log(db, user, "UPDATE", "tags", tag.id, details=details)
-    except Exception:
-        pass
+    add_audit_log(db, user, "UPDATE", "tags", tag.id, details=details)
+    db.commit()
+    db.refresh(tag)
     return tag
 
 
@@ -105,12 +103,12 @@ def delete_tag(tag_id: int, db: Session = Depends(get_db), user: str | None = De
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     del_details = f"name={tag.name}; required={tag.required}; unique_resource={tag.unique_resource}"
+    # Расписания теряют значения этого тега — для дельта-синхронизации они считаются изменёнными
+    touch_schedules_with_values(db, select(models.TagValue.id).where(models.TagValue.tag_id == tag_id))
     db.delete(tag)
+    bump_version(db, TAGS)
+    add_audit_log(db, user, "DELETE", "tags", tag_id, details=del_details)
     db.commit()
-    try:
-        write_audit_log(db, user, "DELETE", "tags", tag_id, details=del_details)
-    except Exception:
-        pass
     return None
 
 
@@ -0,0 +1,224 @@
+"""Массовые операции над расписаниями set-based SQL (сдвиг по времени, клонирование окна).
+
+Используются роутером (POST /api/schedules/shift) и скриптами из scripts/. Функции не коммитят:
+вызывающий код по результату проверки пересечений либо коммитит, либо откатывает транзакцию.
+Затронутые строки помечаются новой версией `schedules` (row_version) — по ней же их находит
+проверка пересечений и GET /api/schedules/changes.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from sqlalchemy import and_, case, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session, aliased
+from . import models
+from .intervals import sweep_overlaps
+from .recurrence import expand
+from .versions import SCHEDULES, bump_version
+
+
+@dataclass(frozen=True)
+class MoveConflict:
+    schedule_id: int  # перенесённое событие или копия
+    tag_value_id: int
+    ts_from: int  # новое положение
+    ts_to: int
+    other_id: int | None = None  # событие, с которым пересеклось
+    series_id: int | None = None  # или серия
+
+
+@dataclass
+class MoveResult:
+    version: int
+    ids: list[int] = field(default_factory=list)
+    conflicts: list[MoveConflict] = field(default_factory=list)
+    skipped: list[int] = field(default_factory=list)  # клонирование: не созданные из-за пересечений
+    sources: dict[int, int] = field(default_factory=dict)  # клонирование: id копии → id исходного события
+
+
+def _iso_from_ms(column, source):
+    """ISO-8601 UTC в SQL, без округлений float, в виде исходной строки source.
+
+    Доли секунды (.000, как epoch_ms_to_iso) — только если они были в source или время их требует:
+    после сдвига «…T10:00:00Z» остаётся «…T11:00:00Z», и GET /schedules не смешивает форматы.
+    """
+    seconds = func.strftime("%Y-%m-%dT%H:%M:%S", column // 1000, "unixepoch")
+    return case(
+        (and_(func.instr(source, ".") == 0, column % 1000 == 0), seconds + "Z"),
+        else_=seconds + "." + func.printf("%03d", column % 1000) + "Z",
+    )
+
+
+def filter_conditions(window: tuple[int, int], groups: list[list[int]]) -> list:
+    """События, начинающиеся в [window), с фильтром значений тегов как в GET /schedules."""
+    s = models.Schedule
+    stv = models.ScheduleTagValue
+    conditions = [s.ts_from >= window[0], s.ts_from < window[1]]
+    for value_ids in groups:
+        conditions.append(s.id.in_(select(stv.schedule_id).where(stv.tag_value_id.in_(value_ids))))
+    return conditions
+
+
+def find_move_conflicts(db: Session, version: int, unique_value_ids: set[int]) -> list[MoveConflict]:
+    """Пересечения уникальных ресурсов у строк с row_version = version (неотменённых) с остальными событиями и сериями."""
+    if not unique_value_ids:
+        return []
+    s = models.Schedule
+    stv = models.ScheduleTagValue
+    other = aliased(models.Schedule)
+    other_stv = aliased(models.ScheduleTagValue)
+    moved_filter = (s.row_version == version, s.is_canceled == False, stv.tag_value_id.in_(unique_value_ids))
+    conflicts: dict[frozenset[int], MoveConflict] = {}
+    rows = db.execute(
+        select(s.id, stv.tag_value_id, s.ts_from, s.ts_to, other.id)
+        .join(stv, stv.schedule_id == s.id)
+        .join(other_stv, (other_stv.tag_value_id == stv.tag_value_id) & (other_stv.schedule_id != s.id))
+        .join(other, other.id == other_stv.schedule_id)
+        .where(*moved_filter, other.is_canceled == False, other.ts_from < s.ts_to, other.ts_to > s.ts_from)
+        .order_by(s.id, other.id)
+    )
+    for sid, value_id, ts_from, ts_to, other_id in rows:
+        # Пара перенесённых событий находится дважды — оставляем одну
+        conflicts.setdefault(frozenset((sid, other_id)), MoveConflict(sid, value_id, ts_from, ts_to, other_id=other_id))
+    result = list(conflicts.values())
+
+    # Вхождения серий — по каждому ресурсу один проход заметающей прямой
+    moved = db.execute(select(stv.tag_value_id, s.ts_from, s.ts_to, s.id).join(stv, stv.schedule_id == s.id).where(*moved_filter)).all()
+    if moved:
+        per_resource: dict[int, list[tuple[int, int, int]]] = {}
+        bounds: dict[int, tuple[int, int]] = {}
+        for value_id, ts_from, ts_to, sid in moved:
+            per_resource.setdefault(value_id, []).append((ts_from, ts_to, sid))
+            bounds[sid] = (ts_from, ts_to)
+        occurrences = expand(
+            db,
+            min(r[1] for r in moved),
+            max(max(r[2] for r in moved), min(r[1] for r in moved) + 1),
+            tag_value_ids=per_resource.keys(),
+            include_canceled=False,
+        )
+        existing: dict[int, list[tuple[int, int, int]]] = {}
+        for n, occ in enumerate(occurrences):
+            for value_id in occ.tag_value_ids & per_resource.keys():
+                existing.setdefault(value_id, []).append((occ.start, occ.end, n))
+        for value_id, candidates in per_resource.items():
+            with_existing, _ = sweep_overlaps(existing.get(value_id, []), candidates)
+            for sid, n in with_existing:
+                result.append(MoveConflict(sid, value_id, *bounds[sid], series_id=occurrences[n].series_id))
+    result.sort(key=lambda c: (c.schedule_id, c.tag_value_id))
+    return result
+
+
+def ids_summary(ids: list[int], limit: int = 100) -> str:
+    """Список id для сводной записи аудита: не больше limit первых, остальные — числом."""
+    head = ",".join(map(str, ids[:limit]))
+    return f"[{head},…+{len(ids) - limit}]" if len(ids) > limit else f"[{head}]"
+
+
+def shift_schedules(
+    db: Session,
+    offset_ms: int,
+    window: tuple[int, int],
+    groups: list[list[int]],
+    unique_value_ids: set[int],
+) -> MoveResult:
+    """Сдвинуть события, начинающиеся в окне, на offset_ms одним UPDATE и проверить пересечения.
+
+    unique_value_ids — значения уникальных тегов (tag_rules). Транзакция остаётся открытой.
+    """
+    s = models.Schedule
+    version = bump_version(db, SCHEDULES)
+    db.execute(
+        update(s)
+        .where(*filter_conditions(window, groups))
+        .values(
+            ts_from=s.ts_from + offset_ms,
+            ts_to=s.ts_to + offset_ms,
+            date_from=_iso_from_ms(s.ts_from + offset_ms, s.date_from),
+            date_to=_iso_from_ms(s.ts_to + offset_ms, s.date_to),
+            row_version=version,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    ids = list(db.execute(select(s.id).where(s.row_version == version).order_by(s.id)).scalars())
+    return MoveResult(version=version, ids=ids, conflicts=find_move_conflicts(db, version, unique_value_ids))
+
+
+def clone_schedules(
+    db: Session,
+    offsets_ms: list[int],
+    window: tuple[int, int],
+    groups: list[list[int]],
+    unique_value_ids: set[int],
+    include_canceled: bool = False,
+    skip_conflicts: bool = False,
+) -> MoveResult:
+    """Скопировать события, начинающиеся в окне, со значениями тегов на каждый сдвиг из offsets_ms.
+
+    Копии создаются INSERT … SELECT (по два оператора на сдвиг) и проверяются на пересечения все сразу.
+    skip_conflicts=True — копии, пересекающиеся с существующими событиями и сериями, удаляются; из
+    пересекающихся между собой копий удаляется та, что пересекается с уже оставленной (по порядку id).
+    Иначе результат содержит пересечения, и вызывающий код откатывает транзакцию.
+    """
+    s = models.Schedule
+    stv = models.ScheduleTagValue
+    version = bump_version(db, SCHEDULES)
+    # Уже созданные копии (row_version = version) источником не считаются
+    conditions = filter_conditions(window, groups) + [or_(s.row_version.is_(None), s.row_version != version)]
+    if not include_canceled:
+        conditions.append(s.is_canceled == False)
+    sources: dict[int, int] = {}
+    for offset in offsets_ms:
+        # id копии = base + номер источника по порядку id: соответствие источник → копия без обратного чтения
+        base = db.scalar(select(func.coalesce(func.max(s.id), 0)))
+        src = select(s.id, func.row_number().over(order_by=s.id).label("rn")).where(*conditions).subquery()
+        sources.update((copy_id, src_id) for copy_id, src_id in db.execute(select(src.c.rn + base, src.c.id)))
+        db.execute(
+            insert(s).from_select(
+                ["id", "title", "date_from", "date_to", "is_canceled", "contact", "ts_from", "ts_to", "row_version"],
+                select(
+                    src.c.rn + base,
+                    s.title,
+                    _iso_from_ms(s.ts_from + offset, s.date_from),
+                    _iso_from_ms(s.ts_to + offset, s.date_to),
+                    s.is_canceled,
+                    s.contact,
+                    s.ts_from + offset,
+                    s.ts_to + offset,
+                    version,
+                ).join(src, src.c.id == s.id),
+            )
+        )
+        db.execute(
+            insert(stv).from_select(
+                ["schedule_id", "tag_value_id"],
+                select(src.c.rn + base, stv.tag_value_id).join(src, src.c.id == stv.schedule_id),
+            )
+        )
+    ids = list(db.execute(select(s.id).where(s.row_version == version).order_by(s.id)).scalars())
+    result = MoveResult(version=version, ids=ids, conflicts=find_move_conflicts(db, version, unique_value_ids), sources=sources)
+    if skip_conflicts and result.conflicts:
+        created = set(ids)
+        blocked: set[int] = set()  # пересекаются с существующим событием или серией
+        paired: dict[int, set[int]] = {}  # пересекающиеся копии
+        for c in result.conflicts:
+            if c.other_id in created:
+                paired.setdefault(c.schedule_id, set()).add(c.other_id)
+                paired.setdefault(c.other_id, set()).add(c.schedule_id)
+            else:
+                blocked.add(c.schedule_id)
+        # Обход в порядке id: копия не создаётся, только если пересекается с уже оставленной
+        # (в цепочке A↔B↔C остаются A и C)
+        kept: set[int] = set()
+        skipped: set[int] = set()
+        for i in sorted(blocked | paired.keys()):
+            if i in blocked or paired.get(i, set()) & kept:
+                skipped.add(i)
+            else:
+                kept.add(i)
+        db.execute(delete(stv).where(stv.schedule_id.in_(skipped)))
+        db.execute(delete(s).where(s.id.in_(skipped)))
+        result.skipped = sorted(skipped)
+        result.ids = [i for i in ids if i not in skipped]
+    return result
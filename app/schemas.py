@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 
 class TagBase(BaseModel):
@@ -68,18 +68,181 @@ class ScheduleUpdate(BaseModel):
 
 
 class ScheduleOut(BaseModel):
-    id: int
+    id: Optional[int]  # None — вхождение серии (см. seriesId)
     title: str
     dateFrom: str
     dateTo: str
     tagValueIds: List[int]
     isCanceled: bool
     contact: Optional[str] = None
+    seriesId: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class ScheduleSeriesBase(BaseModel):
+    title: str
+    dateFrom: str  # начало первого вхождения
+    dateTo: str  # окончание первого вхождения
+    rrule: str  # FREQ=DAILY|WEEKLY;INTERVAL=n;BYDAY=MO,WE;COUNT=n | UNTIL=...
+    tagValueIds: Optional[List[int]] = None
+    contact: Optional[str] = None
+
+
+class ScheduleSeriesCreate(ScheduleSeriesBase):
+    pass
+
+
+class ScheduleSeriesUpdate(BaseModel):
+    title: Optional[str] = None
+    dateFrom: Optional[str] = None
+    dateTo: Optional[str] = None
+    rrule: Optional[str] = None
+    tagValueIds: Optional[List[int]] = None
+    isCanceled: Optional[bool] = None
+    contact: Optional[str] = None
+
+
+class SeriesExceptionIn(BaseModel):
+    occurrence: str  # начало вхождения по правилу (dateFrom вхождения)
+    kind: str = Field(pattern="^(skip|cancel)$")
+
+
+class SeriesExceptionOut(BaseModel):
+    occurrence: str
+    kind: str
+
+
+class ScheduleSeriesOut(BaseModel):
+    id: int
+    title: str
+    dateFrom: str
+    dateTo: str
+    rrule: str
+    tagValueIds: List[int]
+    isCanceled: bool
+    contact: Optional[str] = None
+    exceptions: List[SeriesExceptionOut] = []
+
+
+class ScheduleBulkCreate(BaseModel):
+    items: List[ScheduleCreate] = Field(min_length=1, max_length=1000)
+    # True — при ошибке хотя бы в одном элементе ничего не создаётся
+    atomic: bool = True
+
+
+class ScheduleBulkItemResult(BaseModel):
+    index: int
+    status: str  # created / error / skipped
+    schedule: Optional[ScheduleOut] = None
+    error: Optional[str] = None
+
+
+class ScheduleBulkOut(BaseModel):
+    created: int
+    failed: int
+    results: List[ScheduleBulkItemResult]
+
+
+class ScheduleDeletedOut(BaseModel):
+    id: int
+    dateFrom: str
+    dateTo: str
+    version: int
+
+
+class ScheduleChangesOut(BaseModel):
+    version: int  # текущая версия расписаний — следующий since
+    resync: bool = False  # изменений слишком много или since неизвестен — перезапросить окно целиком
+    schedules: List[ScheduleOut] = []  # созданные и изменённые после since
+    deleted: List[ScheduleDeletedOut] = []
+    seriesChanged: bool = False  # менялись серии — вхождения нужно перезапросить для окна
+
+
+class ScheduleShiftRequest(BaseModel):
+    # Сдвигаются события, начинающиеся в [dateFrom, dateTo)
+    dateFrom: str
+    dateTo: str
+    # Фильтр как в GET /schedules: И между тегами, ИЛИ внутри тега
+    tagValueIds: List[int] = []
+    offsetMinutes: int
+    # True — только посчитать затронутые события и пересечения, ничего не меняя
+    dryRun: bool = False
+
+
+class MoveConflictOut(BaseModel):
+    id: int  # перенесённое событие или копия (у несозданной копии id условный)
+    tagValueId: int
+    dateFrom: str  # положение после переноса / копирования
+    dateTo: str
+    sourceId: Optional[int] = None  # для копии — исходное событие
+    conflictId: Optional[int] = None  # событие, с которым пересеклось
+    seriesId: Optional[int] = None  # или серия
+
+
+class ScheduleShiftOut(BaseModel):
+    dryRun: bool
+    matched: int
+    shifted: int  # 0 при dryRun или при пересечениях
+    ids: List[int]
+    conflicts: List[MoveConflictOut]
+
+
+class ScheduleCloneRequest(BaseModel):
+    # Копируются события, начинающиеся в [dateFrom, dateTo)
+    dateFrom: str
+    dateTo: str
+    tagValueIds: List[int] = []
+    # Сдвиги копий относительно исходного окна, минуты (неделя — 10080)
+    offsetsMinutes: List[int] = Field(min_length=1, max_length=104)
+    includeCanceled: bool = False
+    # abort — при любом пересечении ничего не создаётся; skip — пересекающиеся копии пропускаются
+    onConflict: Literal["abort", "skip"] = "abort"
+    dryRun: bool = False
+
+
+class ScheduleCloneOut(BaseModel):
+    dryRun: bool
+    created: int  # 0 при dryRun или при пересечениях в режиме abort
+    skipped: int
+    ids: List[int]  # id созданных (при dryRun — которые были бы созданы) копий
+    conflicts: List[MoveConflictOut]
+
+
+class ConflictCandidate(BaseModel):
+    dateFrom: str
+    dateTo: str
+    tagValueIds: List[int] = []
+    # Событие, которое переносится/редактируется — с самим собой не конфликтует
+    excludeScheduleId: Optional[int] = None
+
+
+class ConflictCheckRequest(BaseModel):
+    candidates: List[ConflictCandidate] = Field(min_length=1, max_length=1000)
+    excludeScheduleId: Optional[int] = None
+
+
+class ConflictEventOut(BaseModel):
+    id: Optional[int]  # None — вхождение серии
+    title: str
+    dateFrom: str
+    dateTo: str
+    tagValueIds: List[int]  # общие с кандидатом уникальные ресурсы
+    seriesId: Optional[int] = None
+
+
+class CandidateConflictsOut(BaseModel):
+    index: int
+    conflicts: List[ConflictEventOut]
+    candidateIndexes: List[int]  # пересечения с другими кандидатами того же запроса
+
+
+class ConflictCheckOut(BaseModel):
+    hasConflicts: bool
+    results: List[CandidateConflictsOut]
+
+
 class AuditEntryOut(BaseModel):
     id: int
     ts: str
@@ -109,6 +272,21 @@ class ClientOut(ClientBase):
         from_attributes = True
 
 
+class ClientBulkCreate(BaseModel):
+    names: List[str] = Field(min_length=1, max_length=10000)
+    dryRun: bool = False
+
+
+class ClientBulkOut(BaseModel):
+    dryRun: bool
+    received: int
+    created: int
+    skipped: int
+    # Пропущены: уже есть в базе (имена как в запросе) и повторы внутри запроса
+    existing: List[str] = []
+    duplicates: List[str] = []
+
+
 # ============ Типы абонементов (шаблоны) ============
 
 class SubscriptionTypeBase(BaseModel):
@@ -165,6 +343,7 @@ class SubscriptionPurchaseOut(BaseModel):
     purchaseDate: str
     expiryDate: str
     comment: Optional[str] = None
+    usedCount: int = 0  # Списано занятий (FIFO по сроку действия)
 
     class Config:
         from_attributes = True
@@ -187,6 +366,7 @@ class SubscriptionExpenseOut(BaseModel):
     clientId: int
     expenseDate: str
     comment: Optional[str] = None
+    purchaseId: Optional[int] = None  # Покупка, с которой списано занятие; null — долг
 
     class Config:
         from_attributes = True
@@ -200,6 +380,50 @@ class ClientBalanceOut(BaseModel):
     totalPurchased: int  # Сумма всех купленных занятий
     totalSpent: int  # Сумма всех расходов
     balance: int  # Остаток занятий
+    availableLessons: int  # Неиспользованные занятия действующих (не просроченных) покупок
+    expiredLessons: int  # Неиспользованные занятия просроченных покупок
+    unallocatedExpenses: int  # Расходы без подходящей покупки (долг)
     purchases: List[SubscriptionPurchaseOut]
     expenses: List[SubscriptionExpenseOut]
 
+
+class ClientBalanceSummaryOut(BaseModel):
+    clientId: int
+    clientName: str
+    totalPurchased: int
+    totalSpent: int
+    balance: int
+    lastExpiryDate: Optional[str] = None  # Самая поздняя дата завершения среди покупок
+    lastExpenseDate: Optional[str] = None  # Дата последнего расхода
+
+
+
+# ============ Отчёты ============
+
+class UtilizationOut(BaseModel):
+    bin: str  # hourOfWeek | hour | day
+    from_: str = Field(alias="from")
+    to: str
+    binCount: int
+    tagValueIds: List[int]  # порядок строк occupiedMinutes
+    capacityMinutes: List[int]  # длительность окна, попавшая в каждую корзину
+    occupiedMinutes: List[List[int]]  # [ресурс][корзина] — занятые минуты (пересечения событий ресурса объединены)
+
+
+class AvailabilitySlotOut(BaseModel):
+    dateFrom: str
+    dateTo: str
+
+
+class AvailabilityOut(BaseModel):
+    tagValueIds: List[int]
+    duration: int  # минимальная длина слота, минуты
+    slots: List[AvailabilitySlotOut]  # максимальные свободные промежутки по возрастанию
+
+
+class ReportSummaryOut(BaseModel):
+    groupBy: List[str]  # измерения в порядке колонок: day, week, tag, tagValue
+    columns: List[str]  # имена колонок строк rows: измерения + count, hours
+    rows: List[List[object]]  # компактные строки агрегата (без повторения имён полей)
+    totalCount: int  # число событий в окне (каждое учтено один раз)
+    totalHours: float
@@ -0,0 +1,72 @@
+"""Кэш правил тегов (required / unique_resource) и соответствия значение → тег.
+
+Правила меняются редко, а читаются каждой записью расписаний. Снимок строится из БД целиком и
+помечается версией области `tags` (versions.py), которую увеличивают роутеры тегов и их значений.
+Перед использованием снимка версия сверяется одним чтением строки data_versions — так изменения,
+сделанные другим воркером uvicorn, замечаются на следующем же запросе.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import models
+from .versions import TAGS, get_version
+
+
+@dataclass(frozen=True)
+class TagRules:
+    """Неизменяемый снимок правил тегов одной версии."""
+    version: int
+    required: tuple[tuple[int, str], ...] = ()  # (tag_id, name) обязательных тегов
+    unique_tag_ids: frozenset[int] = frozenset()
+    tag_of_value: dict[int, int] = field(default_factory=dict)
+
+    def unknown_values(self, value_ids: Iterable[int]) -> list[int]:
+        return [i for i in value_ids if i not in self.tag_of_value]
+
+    def missing_required(self, value_ids: Iterable[int]) -> list[str]:
+        present = {self.tag_of_value.get(i) for i in value_ids}
+        return [name for tag_id, name in self.required if tag_id not in present]
+
+    def unique_values(self, value_ids: Iterable[int]) -> list[int]:
+        """Значения уникальных ресурсов (залы, тренеры) среди value_ids."""
+        return [i for i in value_ids if self.tag_of_value.get(i) in self.unique_tag_ids]
+
+
+class TagRulesCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules: TagRules | None = None
+
+    def _load(self, db: Session, version: int) -> TagRules:
+        tags = db.execute(
+            select(models.Tag.id, models.Tag.name, models.Tag.required, models.Tag.unique_resource).order_by(models.Tag.id)
+        ).all()
+        return TagRules(
+            version=version,
+            required=tuple((tag_id, name) for tag_id, name, required, _ in tags if required),
+            unique_tag_ids=frozenset(tag_id for tag_id, _, _, unique in tags if unique),
+            tag_of_value=dict(db.execute(select(models.TagValue.id, models.TagValue.tag_id)).all()),
+        )
+
+    def get(self, db: Session) -> TagRules:
+        version = get_version(db, TAGS)
+        rules = self._rules
+        if rules is not None and rules.version == version:
+            return rules
+        with self._lock:
+            if self._rules is None or self._rules.version != version:
+                self._rules = self._load(db, version)
+            return self._rules
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._rules = None
+
+
+tag_rules = TagRulesCache()
@@ -0,0 +1,189 @@
+"""Загрузка ресурсов по временным корзинам (GET /api/reports/utilization).
+
+Интервалы неотменённых событий и вхождений серий раскладываются по корзинам фиксированной длины
+(час недели, час, день) для каждого значения тега. Счётчики — плоские массивы `array('q')`
+по корзинам ресурса, одна выборка из БД на весь запрос; пересекающиеся события одного ресурса
+сначала объединяются, чтобы занятость не превышала длительность корзины.
+
+Интервал добавляется за O(1) независимо от числа накрытых корзин: в разностный массив пишутся только
+две неполные крайние корзины и диапазон полных (для часа недели — ещё число полных недель), итог
+по корзинам — один проход префиксных сумм в конце.
+
+Результаты кэшируются в памяти процесса по (окно, корзина, набор ресурсов) и помечаются версиями
+областей `schedules` и `tags` (versions.py): любая запись расписаний делает кэш устаревшим.
+"""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import accumulate, islice
+from typing import Hashable, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from . import models
+from .intervals import overlaps
+from .recurrence import expand
+
+
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 24 * MS_PER_HOUR
+_HOURS_PER_WEEK = 168
+# 1970-01-01 — четверг: сдвиг, чтобы час 0 недели приходился на понедельник 00:00
+_EPOCH_HOUR_OF_WEEK = 3 * 24
+
+BINS = ("hourOfWeek", "hour", "day")
+MAX_BINS = 10_000
+
+
+@dataclass(frozen=True)
+class Binning:
+    """Отображение времени в номер корзины."""
+    kind: str
+    window_from: int
+    window_to: int
+
+    @property
+    def width(self) -> int:
+        return MS_PER_DAY if self.kind == "day" else MS_PER_HOUR
+
+    @property
+    def origin(self) -> int:
+        # Линейные корзины выровнены по началу часа/дня, в котором начинается окно
+        return self.window_from - self.window_from % self.width
+
+    @property
+    def size(self) -> int:
+        if self.kind == "hourOfWeek":
+            return _HOURS_PER_WEEK
+        return -(-(self.window_to - self.origin) // self.width)
+
+    def index(self, slot: int) -> int:
+        """Номер корзины для slot — номера часа/дня от эпохи."""
+        if self.kind == "hourOfWeek":
+            return (slot + _EPOCH_HOUR_OF_WEEK) % _HOURS_PER_WEEK
+        return slot - self.origin // self.width
+
+    def empty(self) -> array:
+        """Разностный массив корзин (size + 1 счётчик) для add; итог — totals."""
+        return array("q", bytes(8 * (self.size + 1)))
+
+    def _span(self, diff: array, slot: int, count: int, amount: int) -> None:
+        # amount в каждую из корзин слотов [slot, slot + count)
+        first = self.index(slot)
+        if self.kind == "hourOfWeek":
+            weeks, count = divmod(count, _HOURS_PER_WEEK)
+            if weeks:
+                diff[0] += weeks * amount
+                diff[_HOURS_PER_WEEK] -= weeks * amount
+            if first + count > _HOURS_PER_WEEK:
+                # Остаток переходит через конец недели
+                diff[first] += amount
+                diff[_HOURS_PER_WEEK] -= amount
+                first, count = 0, first + count - _HOURS_PER_WEEK
+        if count:
+            diff[first] += amount
+            diff[first + count] -= amount
+
+    def add(self, diff: array, start: int, end: int) -> None:
+        """Добавить в разностный массив пересечение [start, end) с окном, разложенное по корзинам."""
+        start, end = max(start, self.window_from), min(end, self.window_to)
+        if start >= end:
+            return
+        width = self.width
+        first, last = start // width, (end - 1) // width
+        if first == last:
+            self._span(diff, first, 1, end - start)
+            return
+        self._span(diff, first, 1, (first + 1) * width - start)
+        self._span(diff, first + 1, last - first - 1, width)
+        self._span(diff, last, 1, end - last * width)
+
+    def totals(self, diff: array) -> array:
+        """Счётчики корзин из разностного массива — один проход префиксных сумм."""
+        return array("q", islice(accumulate(diff), self.size))
+
+
+def _merged(spans: list[tuple[int, int]]) -> Iterable[tuple[int, int]]:
+    spans.sort()
+    cur_from, cur_to = None, None
+    for start, end in spans:
+        if cur_to is not None and start <= cur_to:
+            cur_to = max(cur_to, end)
+            continue
+        if cur_to is not None:
+            yield cur_from, cur_to
+        cur_from, cur_to = start, end
+    if cur_to is not None:
+        yield cur_from, cur_to
+
+
+def compute(db: Session, binning: Binning, tag_value_ids: list[int]) -> tuple[array, dict[int, array]]:
+    """Ёмкость корзин и занятость каждого ресурса (мс) в окне binning."""
+    capacity = binning.empty()
+    binning.add(capacity, binning.window_from, binning.window_to)
+
+    spans: dict[int, list[tuple[int, int]]] = {value_id: [] for value_id in tag_value_ids}
+    if tag_value_ids:
+        s = models.Schedule
+        stv = models.ScheduleTagValue
+        rows = db.execute(
+            select(stv.tag_value_id, s.ts_from, s.ts_to)
+            .join(stv, stv.schedule_id == s.id)
+            .where(
+                stv.tag_value_id.in_(tag_value_ids),
+                s.is_canceled == False,
+                overlaps(binning.window_from, binning.window_to),
+            )
+        )
+        for value_id, ts_from, ts_to in rows:
+            spans[value_id].append((ts_from, ts_to))
+        for occ in expand(db, binning.window_from, binning.window_to, tag_value_ids=tag_value_ids, include_canceled=False):
+            for value_id in occ.tag_value_ids:
+                if value_id in spans:
+                    spans[value_id].append((occ.start, occ.end))
+
+    occupied: dict[int, array] = {}
+    for value_id, items in spans.items():
+        diff = binning.empty()
+        for start, end in _merged(items):
+            binning.add(diff, start, end)
+        occupied[value_id] = binning.totals(diff)
+    return binning.totals(capacity), occupied
+
+
+class UtilizationCache:
+    """LRU результатов одной пары версий (schedules, tags); смена версий сбрасывает кэш целиком."""
+
+    def __init__(self, max_entries: int = 64):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._versions: tuple[int, int] | None = None
+        self._entries: OrderedDict[Hashable, object] = OrderedDict()
+
+    def get(self, versions: tuple[int, int], key: Hashable):
+        with self._lock:
+            if versions != self._versions:
+                return None
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, versions: tuple[int, int], key: Hashable, value) -> None:
+        with self._lock:
+            if versions != self._versions:
+                if self._versions is not None and all(a <= b for a, b in zip(versions, self._versions)):
+                    # Посчитано по уже устаревшим данным — не вытесняем свежие результаты
+                    return
+                self._entries.clear()
+                self._versions = versions
+            self._entries[key] = value
+            if len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+utilization_cache = UtilizationCache()
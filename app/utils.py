@@ -1,29 +1,105 @@
 from __future__ import annotations
 
-from datetime import datetime, timezone
-from fastapi import Header
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from fastapi import Header, HTTPException
+from fastapi.responses import Response
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from . import models
+from .audit_writer import audit_writer
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 def get_remote_user(x_remote_user: str | None = Header(default=None)) -> str | None:
     return x_remote_user
 
 
+def json_response(payload: Any, status_code: int = 200, headers: dict[str, str] | None = None) -> Response:
+    # Готовый JSON без повторной валидации через response_model (для горячих read-путей)
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def make_etag(*parts: Any) -> str:
+    """Сильный ETag из значимых частей ответа (версии данных, параметры запроса)."""
+    digest = hashlib.sha1("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # If-None-Match: "a", W/"b" или * (слабое сравнение, RFC 9110)
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
 def _utc_now_iso() -> str:
     # ISO without microseconds, UTC with 'Z'
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
-def write_audit_log(
-    db: Session,
+def iso_to_epoch_ms(value: str) -> int:
+    """ISO-8601 (с 'Z', смещением или без пояса — считаем UTC) → миллисекунды epoch.
+
+    Бросает ValueError при некорректной строке.
+    """
+    s = value.strip()
+    if s.endswith("Z") or s.endswith("z"):
+        s = s[:-1] + "+00:00"
+    dt = datetime.fromisoformat(s)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+
+def parse_iso_or_400(value: str, field: str) -> int:
+    """iso_to_epoch_ms для данных запроса: некорректная строка — HTTP 400 с именем поля."""
+    try:
+        return iso_to_epoch_ms(value)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid ISO-8601 datetime in {field}: {value}")
+
+
+def conflict_detail(title: str, date_from: str, date_to: str, recurring: bool = False) -> str:
+    """Текст ошибки пересечения уникального ресурса с событием (recurring — с вхождением серии)."""
+    other = "повторяющимся событием" if recurring else "событием"
+    return f"Пересечение с {other} \"{title}\" (с {date_from} по {date_to})"
+
+
+def parse_id_list(raw: str | None) -> list[int]:
+    if not raw:
+        return []
+    return [int(x) for x in raw.split(",") if x]
+
+
+def tag_filter_groups(db: Session, ids: list[int]) -> list[list[int]]:
+    # Группируем выбранные значения по тегу: И между группами, ИЛИ внутри группы
+    rows = db.execute(
+        select(models.TagValue.id, models.TagValue.tag_id).where(models.TagValue.id.in_(ids))
+    ).all()
+    tag_id_to_value_ids: dict[int, list[int]] = {}
+    for value_id, tag_id in rows:
+        tag_id_to_value_ids.setdefault(tag_id, []).append(value_id)
+    return list(tag_id_to_value_ids.values())
+
+
+def make_audit_log(
     username: str | None,
     action: str,
     entity: str,
     entity_id: int | None = None,
     details: str | None = None,
-) -> None:
-    log = models.AuditLog(
+) -> models.AuditLog:
+    return models.AuditLog(
         ts=_utc_now_iso(),
         username=username,
         action=action,
@@ -31,7 +107,21 @@ def write_audit_log(
         entity_id=entity_id,
         details=details,
     )
-    db.add(log)
-    db.commit()
 
 
+def epoch_ms_to_iso(ms: int) -> str:
+    """Миллисекунды epoch → ISO UTC в формате Date.toISOString() (2025-01-15T10:00:00.000Z)."""
+    dt = _EPOCH + timedelta(milliseconds=ms)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def add_audit_log(
+    db: Session,
+    username: str | None,
+    action: str,
+    entity: str,
+    entity_id: int | None = None,
+    details: str | None = None,
+) -> None:
+    """Запись аудита в составе текущей транзакции — вызывать до db.commit() изменения (см. audit_writer.py)."""
+    audit_writer.add(db, make_audit_log(username, action, entity, entity_id, details))
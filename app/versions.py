@@ -0,0 +1,67 @@
+"""Версии данных (таблица data_versions).
+
+Каждая пишущая транзакция увеличивает версию своей области в той же транзакции, что и само изменение.
+По версии процессы (в т.ч. другие воркеры uvicorn) дёшево узнают, что их кэши устарели.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import bindparam, select, text, update
+from sqlalchemy.orm import Session
+from . import models
+
+
+SCHEDULES = "schedules"
+TAGS = "tags"  # теги и их значения (влияют на фильтры и tagValueIds в ответах расписаний)
+
+
+def bump_version(db: Session, scope: str) -> int:
+    """Увеличить версию области в текущей транзакции и вернуть новое значение."""
+    return db.execute(
+        text(
+            "INSERT INTO data_versions (scope, version) VALUES (:scope, 1) "
+            "ON CONFLICT (scope) DO UPDATE SET version = version + 1 "
+            "RETURNING version"
+        ),
+        {"scope": scope},
+    ).scalar_one()
+
+
+def get_version(db: Session, scope: str) -> int:
+    version = db.execute(
+        text("SELECT version FROM data_versions WHERE scope = :scope"), {"scope": scope}
+    ).scalar()
+    return version or 0
+
+
+def get_versions(db: Session, scopes: list[str]) -> dict[str, int]:
+    """Версии нескольких областей одним запросом (отсутствующие — 0)."""
+    rows = db.execute(
+        text("SELECT scope, version FROM data_versions WHERE scope IN :scopes").bindparams(
+            bindparam("scopes", expanding=True)
+        ),
+        {"scopes": scopes},
+    ).all()
+    found = dict(rows)
+    return {scope: found.get(scope, 0) for scope in scopes}
+
+
+def touch_schedules_with_values(db: Session, tag_value_ids) -> int:
+    """Отметить новой версией расписания и серии, у которых меняется набор значений тегов (удаление значения/тега).
+
+    tag_value_ids — список или подзапрос id значений. Возвращает новую версию schedules.
+    """
+    version = bump_version(db, SCHEDULES)
+    stv = models.ScheduleTagValue
+    db.execute(
+        update(models.Schedule)
+        .where(models.Schedule.id.in_(select(stv.schedule_id).where(stv.tag_value_id.in_(tag_value_ids))))
+        .values(row_version=version)
+    )
+    sstv = models.ScheduleSeriesTagValue
+    db.execute(
+        update(models.ScheduleSeries)
+        .where(models.ScheduleSeries.id.in_(select(sstv.series_id).where(sstv.tag_value_id.in_(tag_value_ids))))
+        .values(row_version=version)
+    )
+    return version
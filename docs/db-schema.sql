@@ -49,9 +49,54 @@ CREATE TABLE IF NOT EXISTS schedules (
   is_canceled BOOLEAN NOT NULL DEFAULT 0,
   -- Контактная информация (телефон, email и т.д.)
   contact TEXT NULL,
+  -- Нормализованные границы интервала: epoch в миллисекундах UTC (заполняет приложение,
+  -- для старых строк — бэкфилл при старте). Все сравнения по времени идут по ним, а не по строкам.
+  ts_from INTEGER NULL,
+  ts_to INTEGER NULL,
+  -- Версия schedules (data_versions), в которой строка создана или изменена последний раз;
+  -- по ней GET /api/schedules/changes отдаёт дельту. NULL — строка не менялась с момента миграции.
+  row_version INTEGER NULL,
   CONSTRAINT ck_schedule_range CHECK (date_to >= date_from)
 );
 
+-- Надгробия удалённых расписаний — удаления для дельта-синхронизации
+CREATE TABLE IF NOT EXISTS schedule_tombstones (
+  schedule_id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL,
+  date_from TEXT NOT NULL,
+  date_to TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_schedule_tombstones_version ON schedule_tombstones(version);
+
+-- ============================================================================
+-- Интервальный индекс расписаний (R*Tree)
+-- Поиск пересечений [from, to) за логарифмическое время. Координаты float32 округляются
+-- наружу, поэтому R*Tree даёт надмножество — точная проверка по ts_from/ts_to в запросе.
+-- Синхронизируется триггерами при любой записи в schedules.
+-- ============================================================================
+CREATE VIRTUAL TABLE IF NOT EXISTS schedules_rtree USING rtree(id, ts_from, ts_to);
+
+CREATE TRIGGER IF NOT EXISTS trg_schedules_rtree_insert AFTER INSERT ON schedules
+WHEN NEW.ts_from IS NOT NULL AND NEW.ts_to IS NOT NULL
+BEGIN
+  INSERT OR REPLACE INTO schedules_rtree (id, ts_from, ts_to)
+  VALUES (NEW.id, MIN(NEW.ts_from, NEW.ts_to), MAX(NEW.ts_from, NEW.ts_to));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_schedules_rtree_update AFTER UPDATE OF ts_from, ts_to ON schedules
+BEGIN
+  DELETE FROM schedules_rtree WHERE id = OLD.id;
+  INSERT INTO schedules_rtree (id, ts_from, ts_to)
+  SELECT NEW.id, MIN(NEW.ts_from, NEW.ts_to), MAX(NEW.ts_from, NEW.ts_to)
+  WHERE NEW.ts_from IS NOT NULL AND NEW.ts_to IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_schedules_rtree_delete AFTER DELETE ON schedules
+BEGIN
+  DELETE FROM schedules_rtree WHERE id = OLD.id;
+END;
+
 -- ============================================================================
 -- Связующая таблица N—M: расписания ↔ значения тегов
 -- Позволяет назначать событию несколько значений тегов
@@ -70,6 +115,65 @@ CREATE TABLE IF NOT EXISTS schedule_tag_values (
     ON DELETE CASCADE
 );
 
+-- ============================================================================
+-- Повторяющиеся события (серии)
+-- Первое вхождение + правило повторения (подмножество RRULE); вхождения не хранятся,
+-- а вычисляются для запрошенного окна
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS schedule_series (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  title TEXT NOT NULL,
+  date_from TEXT NOT NULL,
+  date_to TEXT NOT NULL,
+  -- Границы первого вхождения, epoch мс UTC
+  ts_from INTEGER NOT NULL,
+  ts_to INTEGER NOT NULL,
+  -- Например: FREQ=WEEKLY;BYDAY=MO,WE;COUNT=10
+  rrule TEXT NOT NULL,
+  -- Окончание последнего вхождения (по COUNT/UNTIL), NULL — серия бесконечна
+  until_ts INTEGER NULL,
+  is_canceled BOOLEAN NOT NULL DEFAULT 0,
+  contact TEXT NULL,
+  -- Версия schedules последнего изменения серии (включая исключения)
+  row_version INTEGER NULL
+);
+
+CREATE TABLE IF NOT EXISTS schedule_series_tombstones (
+  series_id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_schedule_series_tombstones_version ON schedule_series_tombstones(version);
+
+CREATE TABLE IF NOT EXISTS schedule_series_tag_values (
+  series_id INTEGER NOT NULL,
+  tag_value_id INTEGER NOT NULL,
+  PRIMARY KEY (series_id, tag_value_id),
+  FOREIGN KEY (series_id) REFERENCES schedule_series(id) ON DELETE CASCADE,
+  FOREIGN KEY (tag_value_id) REFERENCES tag_values(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS ix_schedule_series_tag_values_tag_value_id ON schedule_series_tag_values(tag_value_id);
+
+-- Исключения для отдельных вхождений: skip — вхождения нет, cancel — отменено
+CREATE TABLE IF NOT EXISTS schedule_series_exceptions (
+  series_id INTEGER NOT NULL,
+  occurrence_ts INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  PRIMARY KEY (series_id, occurrence_ts),
+  FOREIGN KEY (series_id) REFERENCES schedule_series(id) ON DELETE CASCADE
+);
+
+-- ============================================================================
+-- Версии данных
+-- Монотонный счётчик по области (schedules, tags): увеличивается в той же транзакции,
+-- что и изменение; по нему процессы определяют, что их кэши устарели
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS data_versions (
+  scope TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+);
+
 -- ============================================================================
 -- Журнал аудита
 -- Фиксирует все изменения данных (CREATE/UPDATE/DELETE)
@@ -100,15 +204,17 @@ CREATE INDEX IF NOT EXISTS idx_tag_values_tag_id ON tag_values(tag_id);
 -- Фильтрация расписаний по датам
 CREATE INDEX IF NOT EXISTS idx_schedules_from ON schedules(date_from);
 CREATE INDEX IF NOT EXISTS idx_schedules_to ON schedules(date_to);
+CREATE INDEX IF NOT EXISTS ix_schedules_ts ON schedules(ts_from, ts_to);
+CREATE INDEX IF NOT EXISTS ix_schedules_row_version ON schedules(row_version);
 
 -- Поиск событий по значениям тегов
 CREATE INDEX IF NOT EXISTS idx_stv_tag_value_id ON schedule_tag_values(tag_value_id);
 
--- Фильтрация аудита по времени
-CREATE INDEX IF NOT EXISTS idx_audit_logs_ts ON audit_logs(ts);
+-- Лента аудита по времени (новые сверху, keyset-пагинация по ts, id)
+CREATE INDEX IF NOT EXISTS ix_audit_logs_ts_id ON audit_logs(ts, id);
 
--- Фильтрация аудита по сущности
-CREATE INDEX IF NOT EXISTS idx_audit_logs_entity ON audit_logs(entity);
+-- История одной записи: фильтр по сущности и ID в порядке ленты
+CREATE INDEX IF NOT EXISTS ix_audit_logs_entity ON audit_logs(entity, entity_id, ts, id);
 
 -- ============================================================================
 -- Клиенты
@@ -116,12 +222,21 @@ CREATE INDEX IF NOT EXISTS idx_audit_logs_entity ON audit_logs(entity);
 -- ============================================================================
 CREATE TABLE IF NOT EXISTS clients (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
-  name TEXT NOT NULL
+  name TEXT NOT NULL,
+  -- Имя для поиска: casefold, ё→е, одиночные пробелы (заполняет приложение, app/client_search.py)
+  name_search TEXT NULL
 );
 
 -- Индекс для поиска клиентов по имени
 CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name);
 
+-- Порядок и keyset-пагинация GET /api/clients по (name, id)
+CREATE INDEX IF NOT EXISTS ix_clients_name_id ON clients(name, id);
+
+-- Поиск по началу имени; подстроки — FTS5-таблица clients_fts (trigram) с триггерами,
+-- её создаёт приложение при запуске
+CREATE INDEX IF NOT EXISTS ix_clients_name_search ON clients(name_search);
+
 -- ============================================================================
 -- Типы абонементов (шаблоны)
 -- Предустановленные типы абонементов для быстрого добавления
@@ -171,13 +286,42 @@ CREATE TABLE IF NOT EXISTS subscription_expenses (
   expense_date TEXT NOT NULL,
   -- Комментарий (название занятия, тренер и т.д.)
   comment TEXT NULL,
+  -- Покупка, с которой списано занятие (FIFO по сроку действия, app/allocation.py); NULL — долг
+  purchase_id INTEGER NULL,
   CONSTRAINT fk_expense_client
     FOREIGN KEY (client_id)
     REFERENCES clients(id)
-    ON DELETE CASCADE
+    ON DELETE CASCADE,
+  CONSTRAINT fk_expense_purchase
+    FOREIGN KEY (purchase_id)
+    REFERENCES subscription_purchases(id)
+    ON DELETE SET NULL
 );
 
 -- Индексы для расходов
 CREATE INDEX IF NOT EXISTS idx_expenses_client ON subscription_expenses(client_id);
 CREATE INDEX IF NOT EXISTS idx_expenses_date ON subscription_expenses(expense_date);
+CREATE INDEX IF NOT EXISTS idx_expenses_client_date ON subscription_expenses(client_id, expense_date);
+CREATE INDEX IF NOT EXISTS idx_expenses_purchase ON subscription_expenses(purchase_id);
+
+-- ============================================================================
+-- Остатки занятий клиентов
+-- Обновляются вместе с покупками и расходами (app/balances.py); пересчёт и проверка —
+-- scripts/rebuild_balances.py. Нет строки — нет ни покупок, ни расходов (остаток 0).
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS client_balances (
+  client_id INTEGER PRIMARY KEY,
+  -- Сумма купленных занятий
+  total_purchased INTEGER NOT NULL DEFAULT 0,
+  -- Количество расходов
+  total_spent INTEGER NOT NULL DEFAULT 0,
+  -- Самая поздняя дата завершения среди покупок (ISO-8601)
+  last_expiry_date TEXT NULL,
+  -- Дата последнего расхода (ISO-8601)
+  last_expense_date TEXT NULL,
+  CONSTRAINT fk_balance_client
+    FOREIGN KEY (client_id)
+    REFERENCES clients(id)
+    ON DELETE CASCADE
+);
 
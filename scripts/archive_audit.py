@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Перенос старых записей журнала аудита из БД в архив (gzip NDJSON по месяцам, см. app/audit_archive.py).
+
+Записи старше --older-than-days (по умолчанию AUDIT_RETENTION_DAYS или 365) переносятся пачками по
+--batch-size: пачка дописывается в var/audit_archive/audit-YYYY-MM.ndjson.gz (рядом с БД) и удаляется
+из БД короткой транзакцией. Сервис можно не останавливать — GET /api/audit читает архив сам.
+--vacuum после переноса возвращает освободившееся место файлу БД (VACUUM блокирует БД на время работы).
+
+Примеры (из корня репозитория, например по cron раз в сутки):
+  python3 scripts/archive_audit.py var/data.sqlite --dry-run
+  python3 scripts/archive_audit.py var/data.sqlite --older-than-days 180 --vacuum
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import models  # noqa: E402
+from app.audit_archive import archive_before  # noqa: E402
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="move audit_logs rows older than N days to monthly gzip NDJSON archives")
+    p.add_argument("db", help="path to SQLite file (e.g. var/data.sqlite)")
+    p.add_argument("--older-than-days", type=int, default=int(os.environ.get("AUDIT_RETENTION_DAYS", 365)),
+                   help="срок хранения в БД, дней (по умолчанию AUDIT_RETENTION_DAYS или 365)")
+    p.add_argument("--archive-dir", default=None, help="каталог архива (по умолчанию audit_archive рядом с БД)")
+    p.add_argument("--batch-size", type=int, default=5000, help="записей в одной транзакции удаления")
+    p.add_argument("--pause-ms", type=int, default=50, help="пауза между пачками, мс")
+    p.add_argument("--vacuum", action="store_true", help="выполнить VACUUM после переноса")
+    p.add_argument("--dry-run", action="store_true", help="только посчитать записи к переносу")
+    args = p.parse_args()
+
+    if args.older_than_days < 1 or args.batch_size < 1:
+        print("--older-than-days and --batch-size must be positive", file=sys.stderr)
+        return 2
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=args.older_than_days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    archive_dir = args.archive_dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), "audit_archive")
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        if args.dry_run:
+            count = db.scalar(select(func.count()).select_from(models.AuditLog).where(models.AuditLog.ts < cutoff))
+            print(f"Would archive {count} audit row(s) older than {cutoff} to {archive_dir}.")
+            return 0
+        moved = archive_before(db, cutoff, archive_dir, batch_size=args.batch_size, pause=args.pause_ms / 1000)
+    for month, count in sorted(moved.items()):
+        print(f"{month}: {count}")
+    print(f"Archived {sum(moved.values())} audit row(s) older than {cutoff} to {archive_dir}.")
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print("VACUUM done.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк GET /api/schedules: прежний ORM-путь (ленивая загрузка tag_values + ScheduleOut + response_model)
+против агрегирующего запроса с прямой сериализацией в JSON.
+
+Запуск (из корня репозитория):
+  python3 scripts/bench_list_schedules.py --events 3000 --repeat 20
+
+Работает на временной SQLite-БД, рабочие данные не затрагиваются.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from app import models, schemas  # noqa: E402
+from app.db import Base  # noqa: E402
+from app.intervals import setup_interval_index  # noqa: E402
+from app.routers import schedules  # noqa: E402
+from app.utils import iso_to_epoch_ms, json_response  # noqa: E402
+
+
+def legacy_list_schedules(db: Session, from_: str | None, to: str | None) -> bytes:
+    """Копия прежней реализации list_schedules (для сравнения)."""
+    q = db.query(models.Schedule)
+    if from_ and to:
+        q = q.filter(~(models.Schedule.date_to <= from_), ~(models.Schedule.date_from >= to))
+    result = [
+        schemas.ScheduleOut(
+            id=s.id,
+            title=s.title,
+            dateFrom=s.date_from,
+            dateTo=s.date_to,
+            tagValueIds=[tv.id for tv in s.tag_values],
+            isCanceled=s.is_canceled,
+            contact=s.contact,
+        )
+        for s in q.all()
+    ]
+    # Повторный проход FastAPI через response_model
+    adapter = TypeAdapter(list[schemas.ScheduleOut])
+    return adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+
+
+def new_list_schedules(db: Session, from_: str | None, to: str | None) -> bytes:
+    # Тело ответа маршрута: та же выборка и сериализация, без разбора параметров и ETag
+    window = (iso_to_epoch_ms(from_), iso_to_epoch_ms(to)) if from_ and to else None
+    rows, _ = schedules.schedule_page(db, window, [])
+    return json_response(rows).body
+
+
+def to_iso_z(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def populate(db: Session, events: int) -> tuple[str, str]:
+    rnd = random.Random(42)
+    halls = models.Tag(name="зал", required=True, unique_resource=True)
+    trainers = models.Tag(name="тренер")
+    db.add_all([halls, trainers])
+    db.flush()
+    hall_values = [models.TagValue(tag_id=halls.id, value=f"зал{i}") for i in range(1, 5)]
+    trainer_values = [models.TagValue(tag_id=trainers.id, value=f"тренер{i}") for i in range(1, 9)]
+    db.add_all(hall_values + trainer_values)
+    db.flush()
+    start = datetime(2025, 1, 1, 8, tzinfo=timezone.utc)
+    for i in range(events):
+        dt_from = start + timedelta(hours=i // 4 * 2)
+        date_from, date_to = to_iso_z(dt_from), to_iso_z(dt_from + timedelta(hours=1))
+        db.add(
+            models.Schedule(
+                title=f"Событие {i}",
+                date_from=date_from,
+                date_to=date_to,
+                ts_from=iso_to_epoch_ms(date_from),
+                ts_to=iso_to_epoch_ms(date_to),
+                contact=None,
+                tag_values=[hall_values[i % 4], rnd.choice(trainer_values)],
+            )
+        )
+    db.commit()
+    # Окно «месяц» в середине данных
+    window_from = start + timedelta(hours=events // 8)
+    return to_iso_z(window_from), to_iso_z(window_from + timedelta(days=30))
+
+
+def measure(name: str, fn, SessionLocal, engine, from_: str, to: str, repeat: int) -> bytes:
+    statements = 0
+
+    def _count(*_args, **_kwargs):
+        nonlocal statements
+        statements += 1
+
+    timings: list[float] = []
+    body = b""
+    event.listen(engine, "before_cursor_execute", _count)
+    try:
+        for _ in range(repeat):
+            with SessionLocal() as db:
+                t0 = time.perf_counter()
+                body = fn(db, from_, to)
+                timings.append((time.perf_counter() - t0) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", _count)
+    print(
+        f"{name:>8}: {statements / repeat:7.1f} SQL/запрос   "
+        f"median {statistics.median(timings):8.2f} ms   max {max(timings):8.2f} ms   {len(body)} байт"
+    )
+    return body
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="benchmark GET /api/schedules read path")
+    p.add_argument("--events", type=int, default=3000, help="сколько событий создать")
+    p.add_argument("--repeat", type=int, default=20, help="сколько раз повторить запрос")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        Base.metadata.create_all(bind=engine)
+        setup_interval_index(engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        with SessionLocal() as db:
+            from_, to = populate(db, args.events)
+
+        print(f"Событий в БД: {args.events}; окно {from_} .. {to}")
+        old = measure("before", legacy_list_schedules, SessionLocal, engine, from_, to, args.repeat)
+        new = measure("after", new_list_schedules, SessionLocal, engine, from_, to, args.repeat)
+
+        old_rows = TypeAdapter(list[schemas.ScheduleOut]).validate_json(old)
+        new_rows = TypeAdapter(list[schemas.ScheduleOut]).validate_json(new)
+        key = lambda r: r.id  # noqa: E731
+        same = [(r.id, sorted(r.tagValueIds)) for r in sorted(old_rows, key=key)] == [
+            (r.id, sorted(r.tagValueIds)) for r in sorted(new_rows, key=key)
+        ]
+        print(f"Ответы совпадают: {'да' if same else 'НЕТ'} ({len(new_rows)} событий в окне)")
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
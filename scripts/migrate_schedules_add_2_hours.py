@@ -6,6 +6,7 @@
   python3 scripts/migrate_schedules_add_2_hours.py var/data.sqlite
 
 Сделайте копию БД перед запуском. После миграции включите новую логику отображения на фронте (UTC-метки студии).
+Для других сдвигов (неделя, один зал, смена смещения) используйте scripts/shift_schedules.py.
 """
 
 from __future__ import annotations
@@ -69,6 +70,27 @@ def main() -> int:
                 "UPDATE schedules SET date_from = ?, date_to = ? WHERE id = ?",
                 (nf, nt, sid),
             )
+        # Нормализованные границы (ts_from/ts_to, epoch мс) должны совпадать с новыми строками дат
+        columns = {row[1] for row in cur.execute("PRAGMA table_info(schedules)")}
+        if {"ts_from", "ts_to"} <= columns:
+            cur.execute(
+                "UPDATE schedules SET "
+                "ts_from = CAST(ROUND((julianday(date_from) - 2440587.5) * 86400000) AS INTEGER), "
+                "ts_to = CAST(ROUND((julianday(date_to) - 2440587.5) * 86400000) AS INTEGER)"
+            )
+        # Сигнал работающим процессам, что их индексы занятости устарели
+        tables = {row[0] for row in cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "data_versions" in tables:
+            (version,) = cur.execute(
+                "INSERT INTO data_versions (scope, version) VALUES ('schedules', 1) "
+                "ON CONFLICT (scope) DO UPDATE SET version = version + 1 RETURNING version"
+            ).fetchone()
+            # Сдвинутые строки — изменения для клиентов дельта-синхронизации (GET /api/schedules/changes)
+            if "row_version" in columns:
+                cur.executemany(
+                    "UPDATE schedules SET row_version = ? WHERE id = ?",
+                    [(version, sid) for _, _, sid in updates],
+                )
         conn.commit()
         print(f"Updated {len(updates)} schedule row(s).")
     finally:
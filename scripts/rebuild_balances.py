@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Проверка и пересчёт таблицы остатков занятий client_balances (см. app/balances.py).
+
+Сервис поддерживает client_balances вместе с покупками и расходами; расхождение возможно только после
+правки БД в обход API (ручной SQL, восстановление части таблиц из резервной копии).
+--verify только сравнивает таблицу с пересчётом по покупкам и расходам и печатает расхождения
+(код выхода 1, если они есть); без него таблица пересчитывается целиком одной транзакцией.
+
+Примеры (из корня репозитория):
+  python3 scripts/rebuild_balances.py var/data.sqlite --verify
+  python3 scripts/rebuild_balances.py var/data.sqlite
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app import balances, models  # noqa: E402
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="verify or rebuild client_balances from purchases and expenses")
+    p.add_argument("db", help="path to SQLite file (e.g. var/data.sqlite)")
+    p.add_argument("--verify", action="store_true", help="только найти расхождения, ничего не менять")
+    args = p.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    models.ClientBalance.__table__.create(bind=engine, checkfirst=True)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        drift = balances.verify(db)
+        for d in drift:
+            print(f"client {d.client_id}: stored={d.stored} expected={d.expected}")
+        if args.verify:
+            print(f"{len(drift)} client(s) with drift.")
+            return 1 if drift else 0
+        rows = balances.rebuild(db)
+        db.commit()
+    print(f"Rebuilt client_balances: {rows} row(s), {len(drift)} client(s) corrected.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Сдвиг расписаний по времени одним UPDATE (то же, что POST /api/schedules/shift).
+
+Сдвигаются события, начинающиеся в [--from, --to), при необходимости только с указанными значениями
+тегов (И между тегами, ИЛИ внутри тега). Пересечения уникальных ресурсов проверяются в той же
+транзакции; при пересечениях ничего не меняется. В журнал аудита пишется одна сводная запись.
+
+Примеры (из корня репозитория):
+  python3 scripts/shift_schedules.py var/data.sqlite --from 2025-01-13T00:00:00Z --to 2025-01-20T00:00:00Z --minutes 10080 --dry-run
+  python3 scripts/shift_schedules.py var/data.sqlite --from 2025-01-15T00:00:00Z --to 2025-01-16T00:00:00Z --tag-value-ids 3 --minutes -60
+
+Работающий сервис подхватывает изменения сам: версия `schedules` увеличивается, индексы занятости
+перестраиваются, открытые календари получают resync.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.schedule_ops import ids_summary, shift_schedules  # noqa: E402
+from app.tag_rules import tag_rules  # noqa: E402
+from app.utils import iso_to_epoch_ms, make_audit_log, parse_id_list, tag_filter_groups  # noqa: E402
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="shift schedules starting in [from, to) by N minutes")
+    p.add_argument("db", help="path to SQLite file (e.g. var/data.sqlite)")
+    p.add_argument("--from", dest="date_from", required=True, help="ISO-8601, начало окна (включительно)")
+    p.add_argument("--to", dest="date_to", required=True, help="ISO-8601, конец окна (не включительно)")
+    p.add_argument("--minutes", type=int, required=True, help="сдвиг в минутах (может быть отрицательным)")
+    p.add_argument("--tag-value-ids", default=None, help="фильтр: id значений тегов через запятую")
+    p.add_argument("--user", default="script", help="имя пользователя для журнала аудита")
+    p.add_argument("--dry-run", action="store_true", help="только показать затронутые события и пересечения")
+    args = p.parse_args()
+
+    window = (iso_to_epoch_ms(args.date_from), iso_to_epoch_ms(args.date_to))
+    if window[1] <= window[0] or args.minutes == 0:
+        print("--to must be later than --from and --minutes must not be 0", file=sys.stderr)
+        return 2
+    value_ids = parse_id_list(args.tag_value_ids)
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        rules = tag_rules.get(db)
+        unknown = rules.unknown_values(value_ids)
+        if unknown:
+            print(f"Unknown tag value ids: {unknown}", file=sys.stderr)
+            return 2
+        groups = tag_filter_groups(db, value_ids) if value_ids else []
+        result = shift_schedules(db, args.minutes * 60_000, window, groups, set(rules.unique_values(rules.tag_of_value)))
+        for c in result.conflicts:
+            other = f"schedule id={c.other_id}" if c.other_id is not None else f"series id={c.series_id}"
+            print(f"conflict: id={c.schedule_id} tag_value_id={c.tag_value_id} with {other}")
+        if args.dry_run or result.conflicts or not result.ids:
+            db.rollback()
+            verb = "Would shift" if args.dry_run and not result.conflicts else "Not shifted"
+            print(f"{verb}: {len(result.ids)} schedule(s) by {args.minutes:+d} min.")
+            return 1 if result.conflicts else 0
+        db.add(make_audit_log(
+            args.user, "UPDATE", "schedules", None,
+            details=f"shift {args.minutes:+d} min: {len(result.ids)} events; from={args.date_from}; to={args.date_to}; "
+                    f"tag_value_ids={sorted(value_ids)}; ids={ids_summary(result.ids)}; script",
+        ))
+        db.commit()
+        print(f"Shifted {len(result.ids)} schedule(s) by {args.minutes:+d} min (version {result.version}).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
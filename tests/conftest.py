@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.db import Base
+from app.intervals import setup_interval_index
+from app.resource_index import resource_index
+from app.tag_rules import tag_rules
+
+
+@pytest.fixture
+def db():
+    """Сессия на отдельной БД в памяти со схемой и интервальным индексом, как после запуска сервиса."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    setup_interval_index(engine)
+    # Кэши процесса привязаны к версиям прошлой БД
+    resource_index.invalidate()
+    tag_rules.invalidate()
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def client(db):
+    """Клиент для тестов абонементов."""
+    client = models.Client(name="Анна")
+    db.add(client)
+    db.commit()
+    return client
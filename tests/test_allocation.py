@@ -0,0 +1,64 @@
+from app import allocation, models
+from app.routers import subscriptions
+
+from .test_balances import _expense, _purchase
+
+
+def _allocated(db, client):
+    db.expire_all()
+    e = models.SubscriptionExpense
+    return [
+        (x.expense_date, x.purchase_id)
+        for x in db.query(e).filter(e.client_id == client.id).order_by(e.expense_date, e.id)
+    ]
+
+
+def test_expenses_go_to_earliest_expiring_valid_purchase(db, client):
+    long = _purchase(db, client, 2, "2030-01-01", "2030-03-01")
+    short = _purchase(db, client, 1, "2030-01-05", "2030-02-01")
+    for day in ("2030-01-03", "2030-01-06", "2030-01-07T18:30:00", "2030-01-08", "2030-02-02"):
+        _expense(db, client, day)
+
+    assert _allocated(db, client) == [
+        ("2030-01-03", long.id),  # короткая ещё не куплена
+        ("2030-01-06", short.id),  # обе действуют — раньше истекает короткая
+        ("2030-01-07T18:30:00", long.id),
+        ("2030-01-08", None),  # занятия кончились — долг
+        ("2030-02-02", None),
+    ]
+    balance = subscriptions.get_client_balance(client.id, db)
+    assert balance.unallocatedExpenses == 2
+
+
+def test_expense_after_expiry_day_is_not_allocated(db, client):
+    purchase = _purchase(db, client, 5, "2030-01-01", "2030-01-31T23:59:59")
+    _expense(db, client, "2030-01-31T20:00:00")
+    _expense(db, client, "2030-02-01")
+    assert _allocated(db, client) == [("2030-01-31T20:00:00", purchase.id), ("2030-02-01", None)]
+
+
+def test_delete_in_the_middle_recomputes_only_the_suffix(db, client):
+    long = _purchase(db, client, 2, "2030-01-01", "2030-03-01")
+    short = _purchase(db, client, 1, "2030-01-05", "2030-02-01")
+    early = _expense(db, client, "2030-01-03")
+    for day in ("2030-01-06", "2030-01-07", "2030-01-08"):
+        _expense(db, client, day)
+
+    subscriptions.delete_purchase(short.id, db, None)
+    assert _allocated(db, client) == [
+        ("2030-01-03", long.id), ("2030-01-06", long.id), ("2030-01-07", None), ("2030-01-08", None),
+    ]
+    subscriptions.delete_expense(early.id, db, None)
+    assert _allocated(db, client) == [("2030-01-06", long.id), ("2030-01-07", long.id), ("2030-01-08", None)]
+    # Пересчёт всей истории ничего не меняет: суффикс посчитан так же
+    assert allocation.reallocate(db, client.id) == 0
+
+
+def test_reallocate_since_touches_only_changed_rows(db, client):
+    long = _purchase(db, client, 3, "2030-01-01", "2030-03-01")
+    for day in ("2030-01-02", "2030-01-03", "2030-01-04"):
+        _expense(db, client, day)
+    # Новая покупка с более ранним сроком перехватывает расходы с её дня
+    short = _purchase(db, client, 1, "2030-01-03", "2030-01-10")
+    assert [pid for _, pid in _allocated(db, client)] == [long.id, short.id, long.id]
+    assert allocation.reallocate(db, client.id, since="2030-01-03") == 0
@@ -0,0 +1,77 @@
+import gzip
+
+from sqlalchemy import select
+
+from app import audit_archive, models
+
+
+def _log(db, n, ts):
+    db.add(models.AuditLog(id=n, ts=ts, username="u", action="UPDATE", entity="schedules", entity_id=n, details=f"#{n}"))
+
+
+def _feed(db, archive_dir, limit=None):
+    # Как GET /api/audit для периода, заходящего в архив: БД и архив, слитые по (ts, id)
+    key = lambda r: (r["ts"], r["id"])
+    live = [
+        {"id": r.id, "ts": r.ts} for r in db.query(models.AuditLog).order_by(models.AuditLog.ts.desc(), models.AuditLog.id.desc())
+    ]
+    archived = audit_archive.read(limit=limit, archive_dir=archive_dir)
+    return [r["id"] for r in audit_archive.merge(live, archived, key=key, limit=limit)]
+
+
+def test_merge_drops_rows_left_live_after_interrupted_archive(db, tmp_path):
+    for n, ts in enumerate(["2024-01-05T10:00:00Z", "2024-02-01T10:00:00Z", "2024-03-01T10:00:00Z"], start=1):
+        _log(db, n, ts)
+    db.commit()
+    audit_archive.archive_before(db, "2024-03-01T00:00:00Z", archive_dir=str(tmp_path))
+    # Сбой до удаления пачки: записи остались в БД, файл уже дописан
+    _log(db, 1, "2024-01-05T10:00:00Z")
+    _log(db, 2, "2024-02-01T10:00:00Z")
+    db.commit()
+
+    assert _feed(db, str(tmp_path)) == [3, 2, 1]
+    assert _feed(db, str(tmp_path), limit=2) == [3, 2]
+
+
+def _archive_three_months(db, archive_dir):
+    rows = [
+        (1, "2024-01-05T10:00:00Z", "u1"), (2, "2024-01-20T10:00:00Z", "u2"),
+        (3, "2024-02-01T10:00:00Z", "u1"), (4, "2024-02-01T10:00:00Z", "u2"),
+        (5, "2024-03-10T10:00:00Z", "u1"), (6, "2024-04-01T10:00:00Z", "u1"),
+    ]
+    for n, ts, user in rows:
+        db.add(models.AuditLog(id=n, ts=ts, username=user, action="UPDATE", entity="clients", entity_id=n))
+    db.commit()
+    return audit_archive.archive_before(db, "2024-04-01T00:00:00Z", archive_dir=archive_dir, batch_size=2)
+
+
+def test_archive_moves_old_rows_by_month_in_batches(db, tmp_path):
+    moved = _archive_three_months(db, str(tmp_path))
+
+    assert moved == {"2024-01": 2, "2024-02": 2, "2024-03": 1}
+    assert audit_archive.archived_months(str(tmp_path)) == ["2024-01", "2024-02", "2024-03"]
+    assert db.scalars(select(models.AuditLog.id)).all() == [6]
+    assert audit_archive.covers("2024-03-31T00:00:00Z", str(tmp_path))
+    assert not audit_archive.covers("2024-04-01T00:00:00Z", str(tmp_path))
+
+
+def test_archive_read_filters_pages_and_stops_at_limit(db, tmp_path):
+    _archive_three_months(db, str(tmp_path))
+    read = lambda **kw: [r["id"] for r in audit_archive.read(archive_dir=str(tmp_path), **kw)]
+
+    assert read() == [5, 4, 3, 2, 1]
+    assert read(ts_from="2024-01-20T10:00:00Z", ts_to="2024-03-10T10:00:00Z") == [4, 3, 2]
+    assert read(filters={"username": "u1", "entity_id": None}) == [5, 3, 1]
+    # Keyset-курсор (ts, id): записи с тем же ts и меньшим id идут следующими
+    assert read(before=("2024-02-01T10:00:00Z", 4)) == [3, 2, 1]
+    assert read(limit=2) == [5, 4]
+
+
+def test_archive_read_ignores_truncated_last_member(db, tmp_path):
+    _archive_three_months(db, str(tmp_path))
+    path = tmp_path / "audit-2024-02.ndjson.gz"
+    intact = path.read_bytes()
+    # Перенос пишет следующий gzip-член прямо сейчас
+    path.write_bytes(intact + gzip.compress(b'{"id": 99}\n')[:10])
+
+    assert [r["id"] for r in audit_archive.read(archive_dir=str(tmp_path))] == [5, 4, 3, 2, 1]
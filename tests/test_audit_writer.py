@@ -0,0 +1,91 @@
+import json
+import threading
+
+from sqlalchemy import func, insert, select
+
+from app import models
+from app.audit_writer import BACKGROUND, INLINE, AuditWriter
+from app.utils import add_audit_log
+
+
+def _row(n):
+    return {"ts": "2030-01-01T00:00:00Z", "username": "u", "action": "UPDATE", "entity": "schedules", "entity_id": n, "details": None}
+
+
+def _writer(db, tmp_path, mode=INLINE, fail=False, **kwargs):
+    writer = AuditWriter(mode=mode, spool_path=str(tmp_path / "audit_spool.ndjson"), **kwargs)
+
+    def write(rows):
+        if fail:
+            raise RuntimeError("database is locked")
+        db.execute(insert(models.AuditLog), rows)
+        db.commit()
+
+    writer._write = write
+    return writer
+
+
+def _count(db):
+    return db.scalar(select(func.count()).select_from(models.AuditLog))
+
+
+def test_inline_audit_commits_and_rolls_back_with_the_change(db):
+    add_audit_log(db, "u", "CREATE", "clients", 1)
+    db.rollback()
+    assert _count(db) == 0
+    add_audit_log(db, "u", "CREATE", "clients", 2)
+    db.commit()
+    assert db.scalars(select(models.AuditLog.entity_id)).all() == [2]
+
+
+def test_background_writer_flushes_queue_in_batches(db, tmp_path):
+    writer = _writer(db, tmp_path, mode=BACKGROUND, batch_size=3, flush_interval_ms=10)
+    writer.enqueue([_row(n) for n in range(7)])
+    writer.stop()
+
+    stats = writer.stats()
+    assert _count(db) == 7
+    assert (stats["written"], stats["batches"], stats["queueDepth"], stats["spooled"]) == (7, 3, 0, 0)
+
+
+def test_failed_batches_are_spooled_and_replayed_on_start(db, tmp_path):
+    failing = _writer(db, tmp_path, mode=BACKGROUND, fail=True, retry_limit=2, flush_interval_ms=10)
+    failing._flush([_row(1), _row(2)])
+    spool = tmp_path / "audit_spool.ndjson"
+    assert [json.loads(line)["entity_id"] for line in spool.read_text().splitlines()] == [1, 2]
+    assert failing.stats()["failedAttempts"] == 2
+
+    # Перенос и в режиме inline; нет файлов — не ошибка
+    writer = _writer(db, tmp_path)
+    writer.start()
+    assert _count(db) == 2
+    assert not spool.exists() and not (tmp_path / "audit_spool.ndjson.replay").exists()
+    writer.start()
+
+
+def test_rows_that_fail_to_replay_stay_in_replay_file(db, tmp_path):
+    writer = _writer(db, tmp_path)
+    writer._spool([_row(1)])
+    _writer(db, tmp_path, fail=True, retry_limit=1).start()
+    replay = tmp_path / "audit_spool.ndjson.replay"
+    assert len(replay.read_text().splitlines()) == 1
+
+    # Следующий запуск дописывает новый спул к прерванному переносу
+    writer._spool([_row(2)])
+    writer.start()
+    assert sorted(db.scalars(select(models.AuditLog.entity_id))) == [1, 2]
+    assert not replay.exists()
+
+
+def test_spooling_during_replay_loses_nothing(db, tmp_path):
+    writer = _writer(db, tmp_path, batch_size=10)
+    writer._spool([_row(n) for n in range(500)])
+    other = _writer(db, tmp_path, batch_size=10)  # второй процесс со своим открытием lock-файла
+    replay = threading.Thread(target=other._replay_spool)
+    replay.start()
+    for n in range(500, 600):
+        writer._spool([_row(n)])
+    replay.join()
+    writer.start()
+
+    assert sorted(db.scalars(select(models.AuditLog.entity_id))) == list(range(600))
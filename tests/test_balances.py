@@ -0,0 +1,79 @@
+from sqlalchemy import text
+
+from app import balances, models, schemas
+from app.routers import subscriptions
+
+
+def _purchase(db, client, lessons, date, expiry):
+    return subscriptions.create_purchase(schemas.SubscriptionPurchaseCreate(
+        clientId=client.id, lessonsCount=lessons, purchaseDate=date, expiryDate=expiry,
+    ), db, None)
+
+
+def _expense(db, client, date):
+    return subscriptions.create_expense(schemas.SubscriptionExpenseCreate(clientId=client.id, expenseDate=date), db, None)
+
+
+def _stored(db, client):
+    db.expire_all()
+    row = db.get(models.ClientBalance, client.id)
+    return row and (row.total_purchased, row.total_spent, row.last_expiry_date, row.last_expense_date)
+
+
+def test_balance_row_follows_purchases_and_expenses(db, client):
+    assert _stored(db, client) is None
+    first = _purchase(db, client, 10, "2030-01-01", "2030-03-01")
+    second = _purchase(db, client, 4, "2030-01-10", "2030-02-01")
+    _expense(db, client, "2030-01-05")
+    last = _expense(db, client, "2030-01-20")
+    assert _stored(db, client) == (14, 2, "2030-03-01", "2030-01-20")
+
+    subscriptions.update_purchase(first.id, schemas.SubscriptionPurchaseUpdate(
+        lessonsCount=8, purchaseDate="2030-01-01", expiryDate="2030-02-15",
+    ), db, None)
+    # Удалена последняя дата — пересчитывается по оставшимся
+    subscriptions.delete_expense(last.id, db, None)
+    assert _stored(db, client) == (12, 1, "2030-02-15", "2030-01-05")
+    subscriptions.delete_purchase(second.id, db, None)
+    assert _stored(db, client) == (8, 1, "2030-02-15", "2030-01-05")
+
+    balance = subscriptions.get_client_balance(client.id, db)
+    assert (balance.totalPurchased, balance.totalSpent, balance.balance) == (8, 1, 7)
+    assert balances.verify(db) == []
+
+
+def test_verify_finds_drift_and_rebuild_fixes_it(db, client):
+    _purchase(db, client, 10, "2030-01-01", "2030-03-01")
+    _expense(db, client, "2030-01-05")
+    other = models.Client(name="Борис")
+    db.add(other)
+    db.commit()
+    # Правка в обход API: лишнее занятие и строка клиента без истории
+    db.execute(text("UPDATE client_balances SET total_spent = 5"))
+    db.add(models.ClientBalance(client_id=other.id, total_purchased=3, total_spent=0))
+    db.commit()
+
+    drift = balances.verify(db)
+    assert [(d.client_id, d.stored, d.expected) for d in drift] == [
+        (client.id, (10, 5, "2030-03-01", "2030-01-05"), (10, 1, "2030-03-01", "2030-01-05")),
+        (other.id, (3, 0, None, None), None),
+    ]
+    assert balances.rebuild(db) == 1
+    db.commit()
+    assert balances.verify(db) == []
+    assert _stored(db, client) == (10, 1, "2030-03-01", "2030-01-05")
+
+
+def test_needs_rebuild_only_for_empty_table_with_history(db, client):
+    assert not balances.needs_rebuild(db)
+    _purchase(db, client, 10, "2030-01-01", "2030-03-01")
+    assert not balances.needs_rebuild(db)
+    db.execute(text("DELETE FROM client_balances"))
+    assert balances.needs_rebuild(db)
+
+
+def test_zero_row_after_whole_history_is_deleted_is_not_drift(db, client):
+    purchase = _purchase(db, client, 10, "2030-01-01", "2030-03-01")
+    subscriptions.delete_purchase(purchase.id, db, None)
+    assert _stored(db, client) == (0, 0, None, None)
+    assert balances.verify(db) == []
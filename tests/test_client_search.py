@@ -0,0 +1,46 @@
+import pytest
+
+from app import client_search, models
+
+
+@pytest.fixture
+def clients(db):
+    client_search.migrate(db.get_bind())
+    assert client_search.fts_available()
+    names = ["Сопетрова Ольга", "Анна  Пётрова", "ПЕТРОВ Иван", "Иван Петров", "Маша Сидорова"]
+    rows = [models.Client(name=name) for name in names]
+    db.add_all(rows)
+    db.commit()
+    return {row.name: row for row in rows}
+
+
+def _names(db, query, limit=None):
+    return [c.name for c in client_search.search(db, query, limit)]
+
+
+def test_normalize_folds_case_yo_and_spaces():
+    assert client_search.normalize("  ЁЖИК Петров ") == "ежик петров"
+    assert client_search.normalize(None) == ""
+
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_search_ranks_name_start_then_word_start_then_inner(db, clients, monkeypatch, fts):
+    monkeypatch.setattr(client_search, "_fts", fts)
+    assert _names(db, "петр") == ["ПЕТРОВ Иван", "Анна  Пётрова", "Иван Петров", "Сопетрова Ольга"]
+    assert _names(db, "ПЁТР", limit=2) == ["ПЕТРОВ Иван", "Анна  Пётрова"]
+    assert _names(db, "  ") == []
+
+
+def test_short_query_uses_index_scan_stages(db, clients):
+    # Короче триграммы — без FTS: с начала имени, с начала слова, затем внутри слова по имени
+    assert _names(db, "ив") == ["Иван Петров", "ПЕТРОВ Иван"]
+    assert _names(db, "ов") == ["Анна  Пётрова", "Иван Петров", "Маша Сидорова", "ПЕТРОВ Иван", "Сопетрова Ольга"]
+
+
+def test_fts_index_follows_rename_and_delete(db, clients):
+    clients["Сопетрова Ольга"].name = "Ольга Смирнова"
+    db.delete(clients["Иван Петров"])
+    db.commit()
+
+    assert _names(db, "петр") == ["ПЕТРОВ Иван", "Анна  Пётрова"]
+    assert _names(db, "смирн") == ["Ольга Смирнова"]
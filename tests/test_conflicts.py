@@ -0,0 +1,60 @@
+from app import models, schemas
+from app.routers import schedules, series as series_router
+
+from .test_recurrence import _book, _hall
+
+
+def _candidate(day, start, end, value, exclude=None):
+    return schemas.ConflictCandidate(
+        dateFrom=f"{day}T{start}:00Z", dateTo=f"{day}T{end}:00Z", tagValueIds=[value.id], excludeScheduleId=exclude,
+    )
+
+
+def test_conflicts_report_every_event_series_and_candidate_pair(db):
+    value = _hall(db)
+    trainer = models.Tag(name="тренер")
+    db.add(trainer)
+    db.flush()
+    shared = models.TagValue(tag_id=trainer.id, value="Иван")
+    db.add(shared)
+    db.commit()
+    event = _book(db, value, "2030-01-14")
+    weekly = series_router.create_series(schemas.ScheduleSeriesCreate(
+        title="Йога", dateFrom="2030-01-07T12:00:00Z", dateTo="2030-01-07T13:00:00Z",
+        rrule="FREQ=WEEKLY", tagValueIds=[value.id],
+    ), db, None)
+
+    out = schedules.check_conflicts(schemas.ConflictCheckRequest(candidates=[
+        _candidate("2030-01-14", "10:30", "12:30", value),  # событие и вхождение серии
+        _candidate("2030-01-14", "11:00", "11:30", value),  # внутри первого; событие до 11:00 только касается
+        _candidate("2030-01-14", "13:00", "14:00", value),  # касание границей — не пересечение
+        schemas.ConflictCandidate(dateFrom="2030-01-14T10:00:00Z", dateTo="2030-01-14T11:00:00Z", tagValueIds=[shared.id]),
+    ]), db)
+
+    assert out.hasConflicts
+    first, second, third, not_unique = out.results
+    assert {(c.id, c.seriesId, c.dateFrom) for c in first.conflicts} == {
+        (event.id, None, "2030-01-14T10:00:00Z"),
+        (None, weekly.id, "2030-01-14T12:00:00.000Z"),
+    }
+    assert first.candidateIndexes == [1]
+    assert second.conflicts == []
+    assert second.candidateIndexes == [0]
+    assert third.conflicts == [] and third.candidateIndexes == []
+    # Значения неуникальных тегов не проверяются
+    assert not_unique.conflicts == []
+
+
+def test_conflicts_skip_the_schedule_being_moved(db):
+    value = _hall(db)
+    event = _book(db, value, "2030-01-14")
+
+    per_candidate = schedules.check_conflicts(schemas.ConflictCheckRequest(
+        candidates=[_candidate("2030-01-14", "10:30", "11:30", value, exclude=event.id)],
+    ), db)
+    whole_plan = schedules.check_conflicts(schemas.ConflictCheckRequest(
+        candidates=[_candidate("2030-01-14", "10:30", "11:30", value)], excludeScheduleId=event.id,
+    ), db)
+
+    assert not per_candidate.hasConflicts
+    assert not whole_plan.hasConflicts
@@ -0,0 +1,151 @@
+import pytest
+from fastapi import HTTPException
+
+from app import models, schemas
+from app.recurrence import DAY_MS, Pattern, expand, find_series_conflict, parse_rrule, patterns_overlap
+from app.routers import schedules, series as series_router
+from app.utils import epoch_ms_to_iso, iso_to_epoch_ms
+
+HOUR_MS = 3_600_000
+
+
+def _hall(db):
+    hall = models.Tag(name="зал", required=True, unique_resource=True)
+    db.add(hall)
+    db.flush()
+    value = models.TagValue(tag_id=hall.id, value="зал1")
+    db.add(value)
+    db.commit()
+    return value
+
+
+def _weekly(db, value, rrule="FREQ=WEEKLY"):
+    return series_router.create_series(schemas.ScheduleSeriesCreate(
+        title="Йога", dateFrom="2030-01-07T10:00:00Z", dateTo="2030-01-07T11:00:00Z",
+        rrule=rrule, tagValueIds=[value.id],
+    ), db, None)
+
+
+def _book(db, value, day):
+    return schedules.create_schedule(schemas.ScheduleCreate(
+        title="Разовое", dateFrom=f"{day}T10:00:00Z", dateTo=f"{day}T11:00:00Z", tagValueIds=[value.id],
+    ), db, None)
+
+
+@pytest.mark.parametrize("kind", ["skip", "cancel"])
+def test_series_stays_editable_after_freed_slot_is_rebooked(db, kind):
+    value = _hall(db)
+    created = _weekly(db, value)
+    series_router.add_series_exception(created.id, schemas.SeriesExceptionIn(occurrence="2030-01-14T10:00:00Z", kind=kind), db, None)
+    _book(db, value, "2030-01-14")
+
+    updated = series_router.update_series(created.id, schemas.ScheduleSeriesUpdate(title="Йога утром"), db, None)
+
+    assert updated.title == "Йога утром"
+    # Перенос серии на вторники, где занятый слот без исключения, — по-прежнему конфликт
+    _book(db, value, "2030-01-15")
+    with pytest.raises(HTTPException) as e:
+        series_router.update_series(created.id, schemas.ScheduleSeriesUpdate(
+            dateFrom="2030-01-08T10:00:00Z", dateTo="2030-01-08T11:00:00Z",
+        ), db, None)
+    assert e.value.status_code == 400
+
+
+def test_series_overlap_skips_excepted_pairs(db):
+    value = _hall(db)
+    first = _weekly(db, value, "FREQ=WEEKLY;COUNT=2")
+    series_router.add_series_exception(first.id, schemas.SeriesExceptionIn(occurrence="2030-01-14T10:00:00Z", kind="skip"), db, None)
+    # Вторая серия начинается в освобождённом слоте
+    second = series_router.create_series(schemas.ScheduleSeriesCreate(
+        title="Пилатес", dateFrom="2030-01-14T10:30:00Z", dateTo="2030-01-14T11:30:00Z",
+        rrule="FREQ=WEEKLY", tagValueIds=[value.id],
+    ), db, None)
+
+    series_router.update_series(first.id, schemas.ScheduleSeriesUpdate(title="Йога утром"), db, None)
+    series_router.update_series(second.id, schemas.ScheduleSeriesUpdate(title="Пилатес утром"), db, None)
+
+
+def test_patterns_overlap_walks_past_excepted_occurrences():
+    start = iso_to_epoch_ms("2030-01-07T10:00:00Z")
+    a = Pattern(parse_rrule("FREQ=WEEKLY"), start, HOUR_MS)
+    b = Pattern(parse_rrule("FREQ=DAILY;INTERVAL=2"), start + 30 * 60_000, HOUR_MS)
+    first = patterns_overlap(a, b)
+    assert first == (start, start + 30 * 60_000)
+    # Пары повторяются через НОК(7, 2) = 14 дней
+    assert patterns_overlap(a, b, a_excepted={start}) == (start + 14 * DAY_MS, start + 14 * DAY_MS + 30 * 60_000)
+    finite = Pattern(parse_rrule("FREQ=WEEKLY;COUNT=2"), start, HOUR_MS)
+    assert patterns_overlap(finite, b, a_excepted={start}) is None
+
+
+def test_open_ended_series_check_finds_far_conflict_only_on_grid(db):
+    value = _hall(db)
+    start = iso_to_epoch_ms("2030-01-07T10:00:00Z")
+    pattern = Pattern(parse_rrule("FREQ=WEEKLY;BYDAY=MO,TH"), start, HOUR_MS)
+    # Вторники за несколько лет — мимо сетки; одно событие через три года — в четверг 10:30
+    for week in range(160):
+        _book(db, value, epoch_ms_to_iso(start + week * 7 * DAY_MS + DAY_MS)[:10])
+    assert find_series_conflict(db, pattern, [value.id]) is None
+    far = start + 156 * 7 * DAY_MS + 3 * DAY_MS + 30 * 60_000
+    db.add(models.Schedule(
+        title="Далеко", date_from=epoch_ms_to_iso(far), date_to=epoch_ms_to_iso(far + HOUR_MS),
+        ts_from=far, ts_to=far + HOUR_MS, tag_values=[value],
+    ))
+    db.flush()
+    assert find_series_conflict(db, pattern, [value.id]).startswith("Пересечение с событием \"Далеко\"")
+
+
+@pytest.mark.parametrize("rrule", [
+    "FREQ=MONTHLY",
+    "FREQ=DAILY;BYDAY=MO",
+    "FREQ=WEEKLY;INTERVAL=0",
+    "FREQ=WEEKLY;COUNT=2;UNTIL=20300201",
+    "FREQ=WEEKLY;BYDAY=XX",
+    "FREQ=WEEKLY;BYMONTH=1",
+    "FREQ=WEEKLY;COUNT",
+])
+def test_parse_rrule_rejects_unsupported_rules(rrule):
+    with pytest.raises(ValueError):
+        parse_rrule(rrule)
+
+
+def test_weekly_byday_interval_count_arithmetic():
+    # Со среды 2030-01-09: пн и ср через неделю, 5 вхождений
+    start = iso_to_epoch_ms("2030-01-09T18:00:00Z")
+    pattern = Pattern(parse_rrule("RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=WE,MO;COUNT=5"), start, HOUR_MS)
+    expected = [start + d * DAY_MS for d in (0, 12, 14, 26, 28)]
+
+    assert list(pattern.occurrences(start - 30 * DAY_MS, start + 365 * DAY_MS)) == expected
+    assert pattern.last_start() == expected[-1]
+    assert pattern.end_bound() == expected[-1] + HOUR_MS
+    # Окно внутри серии и полуоткрытые границы: вхождение, закончившееся в момент from, не попадает
+    assert list(pattern.occurrences(expected[1] + HOUR_MS, expected[3] + 1)) == [expected[2], expected[3]]
+    assert all(pattern.is_occurrence(s) for s in expected)
+    assert not pattern.is_occurrence(start - 2 * DAY_MS)  # понедельник до начала серии
+    assert not pattern.is_occurrence(start + 7 * DAY_MS)  # неделя вне INTERVAL
+    assert not pattern.is_occurrence(start + 40 * DAY_MS)  # после COUNT
+
+
+def test_until_and_open_ended_bounds():
+    start = iso_to_epoch_ms("2030-01-07T10:00:00Z")
+    until = Pattern(parse_rrule("FREQ=DAILY;INTERVAL=3;UNTIL=20300117T000000Z"), start, HOUR_MS)
+    assert until.last_start() == start + 9 * DAY_MS
+    assert list(until.occurrences(start, start + 30 * DAY_MS))[-1] == start + 9 * DAY_MS
+    assert Pattern(parse_rrule("FREQ=DAILY"), start, HOUR_MS).end_bound() is None
+
+
+def test_expand_applies_skip_and_cancel_exceptions(db):
+    value = _hall(db)
+    created = _weekly(db, value, "FREQ=WEEKLY;COUNT=3")
+    for occurrence, kind in (("2030-01-14T10:00:00Z", "skip"), ("2030-01-21T10:00:00Z", "cancel")):
+        series_router.add_series_exception(created.id, schemas.SeriesExceptionIn(occurrence=occurrence, kind=kind), db, None)
+    window = (iso_to_epoch_ms("2030-01-01T00:00:00Z"), iso_to_epoch_ms("2030-02-01T00:00:00Z"))
+
+    shown = expand(db, *window)
+    busy = expand(db, *window, include_canceled=False)
+
+    assert [(epoch_ms_to_iso(o.start), o.is_canceled) for o in shown] == [
+        ("2030-01-07T10:00:00.000Z", False),
+        ("2030-01-21T10:00:00.000Z", True),
+    ]
+    assert [epoch_ms_to_iso(o.start) for o in busy] == ["2030-01-07T10:00:00.000Z"]
+    assert busy[0].tag_value_ids == {value.id}
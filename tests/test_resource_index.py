@@ -0,0 +1,56 @@
+from app import models, schemas
+from app.resource_index import IntervalIndex, ResourceIndex, resource_index
+from app.routers import schedules
+from app.schedule_ops import shift_schedules
+from app.utils import iso_to_epoch_ms
+
+from .test_recurrence import HOUR_MS, _book, _hall
+
+
+def test_interval_index_is_half_open_and_idempotent_per_id():
+    index = IntervalIndex([(0, 10, 1), (20, 30, 2), (0, 10, 1)])
+    assert len(index) == 2
+    assert index.overlapping(10, 20) == []  # касание границами — не пересечение
+    assert index.overlapping(5, 25) == [1, 2]
+    assert index.overlapping(5, 25, exclude_id=1) == [2]
+
+    index.add(1, 40, 100)  # перенос: старая запись заменяется
+    index.add(1, 40, 100)
+    assert index.snapshot() == [(20, 30, 2), (40, 100, 1)]
+    assert index.overlapping(0, 10) == []
+    # Длинный интервал находится и из середины (max_len)
+    assert index.overlapping(90, 91) == [1]
+
+    index.remove(1)
+    index.remove(1)
+    assert index.snapshot() == [(20, 30, 2)]
+
+
+def test_index_follows_router_changes(db):
+    value = _hall(db)
+    first = _book(db, value, "2030-01-14")
+    second = _book(db, value, "2030-01-15")
+    monday = iso_to_epoch_ms("2030-01-14T10:00:00Z")
+    assert resource_index.find_conflict(db, [value.id], monday, monday + HOUR_MS) == first.id
+
+    schedules.update_schedule(first.id, schemas.ScheduleUpdate(isCanceled=True), db, None)
+    assert resource_index.find_conflict(db, [value.id], monday, monday + HOUR_MS) is None
+    schedules.delete_schedule(second.id, db, None)
+    assert resource_index.find_conflict(db, [value.id], monday + 24 * HOUR_MS, monday + 25 * HOUR_MS) is None
+    assert resource_index.check_consistency(db) == []
+
+
+def test_index_rebuilds_after_change_it_did_not_see(db):
+    value = _hall(db)
+    booked = _book(db, value, "2030-01-14")
+    index = ResourceIndex()
+    monday = iso_to_epoch_ms("2030-01-14T10:00:00Z")
+    assert index.find_conflict(db, [value.id], monday, monday + HOUR_MS) == booked.id
+
+    # Сдвиг set-based операцией (как из другого воркера): версия ушла вперёд без apply
+    shift_schedules(db, 2 * HOUR_MS, (monday, monday + 1), [], {value.id})
+    db.commit()
+
+    assert index.find_conflict(db, [value.id], monday, monday + HOUR_MS) is None
+    assert index.find_conflict(db, [value.id], monday + 2 * HOUR_MS, monday + 3 * HOUR_MS) == booked.id
+    assert db.get(models.Schedule, booked.id).date_from == "2030-01-14T12:00:00Z"
@@ -0,0 +1,50 @@
+from app import models
+from app.schedule_ops import clone_schedules, ids_summary, shift_schedules
+from app.utils import iso_to_epoch_ms
+
+from .test_schedules import _schedule
+
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+
+
+def test_clone_skip_keeps_ends_of_conflict_chain(db):
+    hall = models.Tag(name="зал", required=True, unique_resource=True)
+    db.add(hall)
+    db.flush()
+    value = models.TagValue(tag_id=hall.id, value="зал1")
+    db.add(value)
+    _schedule(db, "Йога", "2025-01-06T10:00:00.000Z", "2025-01-06T11:00:00.000Z", [value])
+    window = (iso_to_epoch_ms("2025-01-06T00:00:00.000Z"), iso_to_epoch_ms("2025-01-07T00:00:00.000Z"))
+    # Копии 10:00–11:00, 10:40–11:40, 11:20–12:20: первая пересекается со второй, вторая — с третьей
+    offsets = [DAY_MS, DAY_MS + 40 * 60_000, DAY_MS + 80 * 60_000]
+
+    result = clone_schedules(db, offsets, window, [], {value.id}, skip_conflicts=True)
+
+    assert len(result.conflicts) == 2
+    first, second, third = sorted(result.sources)
+    assert result.skipped == [second]
+    assert result.ids == [first, third]
+    kept = db.query(models.Schedule).filter(models.Schedule.id.in_([first, second, third])).all()
+    assert sorted((s.date_from, s.date_to) for s in kept) == [
+        ("2025-01-07T10:00:00.000Z", "2025-01-07T11:00:00.000Z"),
+        ("2025-01-07T11:20:00.000Z", "2025-01-07T12:20:00.000Z"),
+    ]
+
+
+def test_ids_summary_caps_long_lists():
+    assert ids_summary([3, 1, 2]) == "[3,1,2]"
+    assert ids_summary(list(range(1, 8)), limit=3) == "[1,2,3,…+4]"
+
+
+def test_shift_keeps_source_date_format(db):
+    plain = _schedule(db, "Йога", "2025-01-06T10:00:00Z", "2025-01-06T11:00:00Z")
+    millis = _schedule(db, "Пилатес", "2025-01-06T12:00:00.000Z", "2025-01-06T13:00:00.250Z")
+    window = (iso_to_epoch_ms("2025-01-06T00:00:00Z"), iso_to_epoch_ms("2025-01-07T00:00:00Z"))
+
+    shift_schedules(db, HOUR_MS, window, [], set())
+    db.expire_all()
+
+    assert (plain.date_from, plain.date_to) == ("2025-01-06T11:00:00Z", "2025-01-06T12:00:00Z")
+    assert (millis.date_from, millis.date_to) == ("2025-01-06T13:00:00.000Z", "2025-01-06T14:00:00.250Z")
+    assert (plain.ts_from, millis.ts_to) == (iso_to_epoch_ms("2025-01-06T11:00:00Z"), iso_to_epoch_ms("2025-01-06T14:00:00.250Z"))
@@ -0,0 +1,83 @@
+from app import models, schemas
+from app.routers.schedules import (
+    _FIRST_PAGE,
+    _decode_list_cursor,
+    _occurrence_rows,
+    _schedule_out,
+    _schedule_rows,
+    schedule_page,
+)
+from app.utils import iso_to_epoch_ms
+
+
+def _schedule(db, title, date_from, date_to, tag_values=()):
+    sched = models.Schedule(
+        title=title,
+        date_from=date_from,
+        date_to=date_to,
+        ts_from=iso_to_epoch_ms(date_from),
+        ts_to=iso_to_epoch_ms(date_to),
+        tag_values=list(tag_values),
+    )
+    db.add(sched)
+    db.flush()
+    return sched
+
+
+def test_list_rows_have_same_shape_as_create_response(db):
+    hall = models.Tag(name="зал", required=True, unique_resource=True)
+    db.add(hall)
+    db.flush()
+    value = models.TagValue(tag_id=hall.id, value="зал1")
+    db.add(value)
+    sched = _schedule(db, "Йога", "2025-01-06T10:00:00.000Z", "2025-01-06T11:00:00.000Z", [value])
+    db.add(models.ScheduleSeries(
+        title="Пилатес",
+        date_from="2025-01-06T12:00:00.000Z",
+        date_to="2025-01-06T13:00:00.000Z",
+        ts_from=iso_to_epoch_ms("2025-01-06T12:00:00.000Z"),
+        ts_to=iso_to_epoch_ms("2025-01-06T13:00:00.000Z"),
+        rrule="FREQ=DAILY;COUNT=2",
+        tag_values=[value],
+    ))
+    db.commit()
+    window = (iso_to_epoch_ms("2025-01-06T00:00:00.000Z"), iso_to_epoch_ms("2025-01-08T00:00:00.000Z"))
+
+    created = _schedule_out(sched).model_dump()
+    [row] = _schedule_rows(db, window, [])
+    occurrences = _occurrence_rows(db, window, [])
+
+    assert row == created
+    assert row["seriesId"] is None
+    assert len(occurrences) == 2
+    assert all(set(o) == set(schemas.ScheduleOut.model_fields) for o in occurrences)
+    assert set(row) == set(schemas.ScheduleOut.model_fields)
+
+
+def test_pages_include_series_occurrences_within_limit(db):
+    for day in (6, 7, 8):
+        _schedule(db, f"Событие {day}", f"2025-01-0{day}T10:00:00.000Z", f"2025-01-0{day}T11:00:00.000Z")
+    for title, rrule in (("Пилатес", "FREQ=DAILY;COUNT=4"), ("Бокс", "FREQ=DAILY;COUNT=3")):
+        db.add(models.ScheduleSeries(
+            title=title,
+            date_from="2025-01-06T12:00:00.000Z",
+            date_to="2025-01-06T13:00:00.000Z",
+            ts_from=iso_to_epoch_ms("2025-01-06T12:00:00.000Z"),
+            ts_to=iso_to_epoch_ms("2025-01-06T13:00:00.000Z"),
+            rrule=rrule,
+        ))
+    db.commit()
+    window = (iso_to_epoch_ms("2025-01-01T00:00:00.000Z"), iso_to_epoch_ms("2025-02-01T00:00:00.000Z"))
+    everything, cursor = schedule_page(db, window, [])
+    assert cursor is None and len(everything) == 3 + 4 + 3
+
+    pages = []
+    after = _FIRST_PAGE
+    while True:
+        rows, cursor = schedule_page(db, window, [], limit=2, after=after)
+        pages.append(rows)
+        if cursor is None:
+            break
+        after = _decode_list_cursor(cursor)
+    assert all(len(page) <= 2 for page in pages)
+    assert [r for page in pages for r in page] == everything
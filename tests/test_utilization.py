@@ -0,0 +1,30 @@
+from app.utilization import MS_PER_DAY, MS_PER_HOUR, Binning
+from app.utils import iso_to_epoch_ms
+
+
+def _totals(binning, *spans):
+    diff = binning.empty()
+    for start, end in spans:
+        binning.add(diff, start, end)
+    return list(binning.totals(diff))
+
+
+def test_linear_bins_split_partial_edges_and_full_span():
+    monday = iso_to_epoch_ms("2030-01-07T00:00:00Z")
+    binning = Binning("hour", monday, monday + 6 * MS_PER_HOUR)
+    # 00:30–04:15: половина первой корзины, три полных, четверть последней; вне окна — отрезано
+    assert _totals(binning, (monday + MS_PER_HOUR // 2, monday + 4 * MS_PER_HOUR + MS_PER_HOUR // 4)) == [
+        MS_PER_HOUR // 2, MS_PER_HOUR, MS_PER_HOUR, MS_PER_HOUR, MS_PER_HOUR // 4, 0,
+    ]
+    assert _totals(binning, (monday - MS_PER_DAY, monday + MS_PER_DAY)) == [MS_PER_HOUR] * 6
+    assert _totals(binning, (monday + 10, monday + 20), (monday + 10, monday + 10)) == [10, 0, 0, 0, 0, 0]
+
+
+def test_hour_of_week_wraps_and_counts_whole_weeks():
+    sunday_22 = iso_to_epoch_ms("2030-01-13T22:00:00Z")
+    binning = Binning("hourOfWeek", sunday_22, sunday_22 + 30 * MS_PER_DAY)
+    # Две недели и четыре часа с воскресенья 22:00: по две недели во все корзины и ещё по часу в 22–01
+    totals = _totals(binning, (sunday_22, sunday_22 + 14 * MS_PER_DAY + 4 * MS_PER_HOUR))
+    assert totals[166:] == [3 * MS_PER_HOUR] * 2
+    assert totals[:2] == [3 * MS_PER_HOUR] * 2
+    assert totals[2:166] == [2 * MS_PER_HOUR] * 164
@@ -0,0 +1,17 @@
+import pytest
+from fastapi import HTTPException
+
+from app.utils import conflict_detail, parse_iso_or_400
+
+
+def test_parse_iso_or_400_names_the_field():
+    assert parse_iso_or_400("1970-01-01T00:00:01Z", "from") == 1000
+    with pytest.raises(HTTPException) as e:
+        parse_iso_or_400("завтра", "dateTo")
+    assert e.value.status_code == 400
+    assert e.value.detail == "Invalid ISO-8601 datetime in dateTo: завтра"
+
+
+def test_conflict_detail_wording():
+    assert conflict_detail("Йога", "a", "b") == "Пересечение с событием \"Йога\" (с a по b)"
+    assert conflict_detail("Йога", "a", "b", recurring=True) == "Пересечение с повторяющимся событием \"Йога\" (с a по b)"